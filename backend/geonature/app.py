@@ -115,6 +115,13 @@ def create_app(with_external_mods=True):
     # set logging config
     config_loggers(app.config)
 
+    if config["PERMISSIONS_CACHE"]["BACKEND"] == "memory":
+        logging.warning(
+            "The permissions cache uses the 'memory' backend, which is local to each process: "
+            "in multi-process deployments, permissions changes are seen by other processes "
+            "only after PERMISSIONS_CACHE.TTL seconds, use the 'redis' backend instead."
+        )
+
     db.init_app(app)
     migrate.init_app(app, DB, directory=BACKEND_DIR / "geonature" / "migrations")
     MA.init_app(app)
@@ -8,7 +8,7 @@ from collections import defaultdict
 
 from flask import current_app
 from sqlalchemy import ForeignKey, text
-from sqlalchemy.orm import relationship, aliased
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import select, func
 from sqlalchemy.dialects.postgresql import UUID
 from geoalchemy2 import Geometry
@@ -67,13 +67,6 @@ class CorModuleDataset(DB.Model):
     )
 
 
-# see https://docs.sqlalchemy.org/en/14/orm/basic_relationships.html#late-evaluation-of-relationship-arguments
-def _resolve_import_cor_object_module():
-    from geonature.core.gn_permissions.models import cor_object_module
-
-    return cor_object_module
-
-
 @serializable
 class TModules(DB.Model):
     __tablename__ = "t_modules"
@@ -114,10 +107,7 @@ class TModules(DB.Model):
     meta_create_date = DB.Column(DB.DateTime)
     meta_update_date = DB.Column(DB.DateTime)
 
-    objects = DB.relationship(
-        "PermObject", secondary=lambda: _resolve_import_cor_object_module(), backref="modules"
-    )
-    # relationship datasets add via backref
+    # relationships objects and datasets add via backref
 
     def __str__(self):
         return self.module_label.capitalize()
@@ -252,13 +242,18 @@ class TValidations(DB.Model):
         DB.session.commit()
 
 
-last_validation_query = (
-    select(TValidations)
-    .order_by(TValidations.validation_date.desc())
-    .limit(1)
-    .alias("last_validation")
-)
-last_validation = aliased(TValidations, last_validation_query)
+class TLastValidations(DB.Model):
+    """
+    Last validation of each validated row, maintained by triggers on t_validations.
+    Use `geonature gn_commons refresh-last-validations` to rebuild it.
+    """
+
+    __tablename__ = "t_last_validations"
+    __table_args__ = {"schema": "gn_commons"}
+    uuid_attached_row = DB.Column(UUID(as_uuid=True), primary_key=True)
+    id_validation = DB.Column(DB.Integer, ForeignKey(TValidations.id_validation), nullable=False)
+    validation_date = DB.Column(DB.TIMESTAMP)
+    validation = relationship(TValidations)
 
 
 @serializable
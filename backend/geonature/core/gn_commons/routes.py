@@ -22,9 +22,9 @@ from geonature.utils.env import db
 from geonature.utils.config import config_frontend, config
 from geonature.core.gn_permissions.decorators import login_required
 from geonature.core.gn_permissions.tools import (
-    get_scope,
     get_user_permissions,
     get_permissions,
+    get_scopes_by_module_object,
     has_any_permissions,
 )
 from geonature.core.gn_commons.schemas import TAdditionalFieldsSchema
@@ -74,6 +74,9 @@ def list_modules():
     )
     modules = db.session.scalars(query).unique().all()
 
+    scopes = get_scopes_by_module_object()
+    # Users allowed to manage modules can see all of them
+    is_modules_admin = has_any_permissions("R", module_code="ADMIN", object_code="MODULES")
     allowed_modules = []
     for module in modules:
         module_allowed = False
@@ -82,10 +85,7 @@ def list_modules():
             module_allowed = True
         module_dict = module.as_dict(fields=["objects", "destination.code"])
         # TODO : use has_any_permissions instead - must refactor the front
-        module_dict["cruved"] = {
-            action: get_scope(action, module_code=module.module_code, bypass_warning=True)
-            for action in "CRUVED"
-        }
+        module_dict["cruved"] = dict(scopes[(module.module_code, "ALL")])
         if any(module_dict["cruved"].values()):
             module_allowed = True
         module_dict["module_external_url"] = (
@@ -101,19 +101,11 @@ def list_modules():
         # get cruved for each object
         for obj_dict in module_dict["objects"]:
             obj_code = obj_dict["code_object"]
-            obj_dict["cruved"] = {
-                action: get_scope(
-                    action,
-                    module_code=module.module_code,
-                    object_code=obj_code,
-                    bypass_warning=True,
-                )
-                for action in "CRUVED"
-            }
+            obj_dict["cruved"] = dict(scopes[(module.module_code, obj_code)])
             if any(obj_dict["cruved"].values()):
                 module_allowed = True
             module_dict["module_objects"][obj_code] = obj_dict
-        if has_any_permissions("R", module_code="ADMIN", object_code="MODULES"):
+        if is_modules_admin:
             module_allowed = True
         if version := get_module_version(module.module_code):
             module_dict["version"] = version
@@ -312,3 +304,12 @@ def delete_place(id_place):
 
 
 ##############################
+
+
+@routes.cli.command()
+def refresh_last_validations():
+    """
+    Reconstruit la table des dernières validations de chaque observation
+    """
+    db.session.execute(func.gn_commons.fct_refresh_last_validations())
+    db.session.commit()
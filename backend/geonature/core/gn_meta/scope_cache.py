@@ -0,0 +1,103 @@
+"""
+Per-process cache of the datasets a user can access for a given scope.
+
+Resolving the datasets allowed for a scope requires a query over datasets,
+acquisition frameworks and their actors. As this result rarely changes, it may be
+kept in memory for ``PERMISSIONS.DATASETS_SCOPE_CACHE_TTL`` seconds (disabled by default).
+It is invalidated as soon as a dataset, an acquisition framework, one of their
+actors or the organism of a user is modified through the ORM in the current process;
+the TTL bounds the staleness when the modification occurs in another process.
+"""
+
+import time
+from threading import Lock
+
+from flask import current_app, g
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from geonature.utils.env import db
+from pypnusershub.db.models import User
+from geonature.core.gn_meta.models import (
+    TDatasets,
+    TAcquisitionFramework,
+    CorDatasetActor,
+    CorAcquisitionFrameworkActor,
+)
+
+
+_METADATA_MODELS = (
+    TDatasets,
+    TAcquisitionFramework,
+    CorDatasetActor,
+    CorAcquisitionFrameworkActor,
+)
+
+# (id_role, scope) → (expiration timestamp, list of id_dataset)
+_allowed_datasets = {}
+_lock = Lock()
+
+
+def get_allowed_datasets_ids(scope, user=None):
+    """
+    Return the list of id_dataset of the datasets the user can access with the given scope.
+
+    Parameters
+    ----------
+    scope : int
+        scope of the permission (0, 1, 2 or 3)
+    user : User, optional
+        user whose datasets are returned, default to g.current_user
+
+    Returns
+    -------
+    list of int
+    """
+    if user is None:
+        user = g.current_user
+    query = TDatasets.filter_by_scope(scope, user=user, query=sa.select(TDatasets.id_dataset))
+    ttl = current_app.config["PERMISSIONS"]["DATASETS_SCOPE_CACHE_TTL"]
+    if ttl <= 0:
+        return db.session.scalars(query).all()
+    key = (user.id_role, scope)
+    now = time.monotonic()
+    cached = _allowed_datasets.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    ids = db.session.scalars(query).all()
+    with _lock:
+        _allowed_datasets[key] = (now + ttl, ids)
+    return ids
+
+
+def clear_allowed_datasets_cache():
+    """
+    Forget every cached list of allowed datasets.
+    """
+    with _lock:
+        _allowed_datasets.clear()
+
+
+def _modifies_allowed_datasets(obj):
+    if isinstance(obj, _METADATA_MODELS):
+        return True
+    # Datasets allowed with scope 2 depend on the organism of the user
+    return isinstance(obj, User) and sa.inspect(obj).attrs.id_organisme.history.has_changes()
+
+
+@sa.event.listens_for(Session, "after_flush")
+def _invalidate_on_metadata_change(session, flush_context):
+    if any(
+        _modifies_allowed_datasets(obj) for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        clear_allowed_datasets_cache()
+        # Lists computed within this transaction must be forgotten when it ends (commit or rollback)
+        session.info["metadata_modified"] = True
+
+
+@sa.event.listens_for(Session, "after_transaction_end")
+def _invalidate_on_transaction_end(session, transaction):
+    if session.info.get("metadata_modified"):
+        clear_allowed_datasets_cache()
+        if transaction.parent is None:
+            del session.info["metadata_modified"]
@@ -0,0 +1,235 @@
+"""
+Cache of the permissions of each user, shared across requests.
+
+Permissions are stored as plain JSON values (identifiers, filters and codes used to check
+permissions), keyed by id_role and tagged with a permissions version. The version is bumped
+each time a permission or a role (including its groups membership) is modified through the
+ORM, which makes every cached entry stale. With the "redis" backend, both the version and the
+entries are shared by all processes, and fetched together in a single round trip; with the
+"memory" backend, they are local to the process, which is only suitable for single-process
+deployments: the TTL bounds the staleness of changes made by other processes. Changes made
+outside of GeoNature (e.g. groups membership in UsersHub) are not detected, the cache must then
+be invalidated with the `geonature permissions invalidate-cache` command.
+"""
+
+import json
+import time
+from datetime import datetime
+from collections import OrderedDict
+from threading import Lock
+
+from flask import current_app, has_app_context
+import sqlalchemy as sa
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from geonature.core.gn_commons.models import TModules
+from geonature.core.gn_permissions.models import PermAction, PermObject, Permission
+from pypnusershub.db.models import User
+from apptax.taxonomie.models import Taxref, TaxrefTree
+from ref_geo.models import LAreas
+
+
+VERSION_KEY = "geonature:permissions:version"
+ENTRY_KEY = "geonature:permissions:{id_role}"
+
+
+def _detached(instance):
+    """
+    Mark a transient instance as loaded from the database, its missing attributes
+    are loaded on access.
+    """
+    make_transient_to_detached(instance)
+    return instance
+
+
+def dump_permission(permission):
+    """
+    Return the values of a permission needed to check permissions, as a JSON value.
+    """
+    return [
+        permission.id_permission,
+        permission.id_role,
+        [permission.id_module, permission.module.type, permission.module.module_code],
+        [permission.id_object, permission.object.code_object],
+        [permission.id_action, permission.action.code_action],
+        permission.scope_value,
+        permission.sensitivity_filter,
+        [area.id_area for area in permission.areas_filter],
+        [[taxon.cd_nom, taxon.cd_ref, taxon.tree.path] for taxon in permission.taxons_filter],
+        permission.expire_on.isoformat() if permission.expire_on is not None else None,
+    ]
+
+
+def load_permission(value):
+    """
+    Build a permission from a value returned by dump_permission, with the related objects
+    needed to check permissions. The permission must be merged into a session with
+    load=False, then other attributes (e.g. area geometries) are loaded on access.
+    """
+    (
+        id_permission,
+        id_role,
+        (id_module, module_type, module_code),
+        (id_object, code_object),
+        (id_action, code_action),
+        scope_value,
+        sensitivity_filter,
+        areas,
+        taxons,
+        expire_on,
+    ) = value
+    taxons_filter = []
+    for cd_nom, cd_ref, path in taxons:
+        tree = TaxrefTree(cd_nom=cd_nom, path=path)
+        # The backref modifies the tree, which is detached afterwards
+        taxons_filter.append(_detached(Taxref(cd_nom=cd_nom, cd_ref=cd_ref, tree=tree)))
+        _detached(tree)
+    return _detached(
+        Permission(
+            id_permission=id_permission,
+            id_role=id_role,
+            id_module=id_module,
+            module=_detached(
+                # The polymorphic subclass of the module
+                TModules.__mapper__.polymorphic_map[module_type].class_(
+                    id_module=id_module, type=module_type, module_code=module_code
+                )
+            ),
+            id_object=id_object,
+            object=_detached(PermObject(id_object=id_object, code_object=code_object)),
+            id_action=id_action,
+            action=_detached(PermAction(id_action=id_action, code_action=code_action)),
+            scope_value=scope_value,
+            sensitivity_filter=sensitivity_filter,
+            areas_filter=[_detached(LAreas(id_area=id_area)) for id_area in areas],
+            taxons_filter=taxons_filter,
+            expire_on=datetime.fromisoformat(expire_on) if expire_on is not None else None,
+            validated=True,
+        )
+    )
+
+
+class PermissionsCache:
+    def __init__(self):
+        # id_role → (version, expiration timestamp, dumped permissions)
+        self._entries = OrderedDict()
+        self._local_version = 0
+        self._lock = Lock()
+        self._redis = None
+
+    @property
+    def config(self):
+        return current_app.config["PERMISSIONS_CACHE"]
+
+    @property
+    def enabled(self):
+        return self.config["BACKEND"] is not None
+
+    @property
+    def redis(self):
+        if self.config["BACKEND"] != "redis":
+            return None
+        if self._redis is None:
+            import redis
+
+            url = self.config["REDIS_URL"] or current_app.config["CELERY"]["broker_url"]
+            self._redis = redis.Redis.from_url(url)
+        return self._redis
+
+    def get(self, id_role):
+        """
+        Return the current permissions version and the cached permissions of a role,
+        or None if they are not cached. Returned permissions are built with load_permission.
+        The version must be given to set() when caching permissions loaded after this call.
+        """
+        if self.redis is not None:
+            version, data = self.redis.mget(VERSION_KEY, ENTRY_KEY.format(id_role=id_role))
+            version = int(version or 0)
+            if data is not None:
+                data = json.loads(data)
+                if data["version"] != version:
+                    data = None
+            return version, None if data is None else data["permissions"]
+        with self._lock:
+            version = self._local_version
+            entry = self._entries.get(id_role)
+            if entry is None or entry[0] != version or entry[1] <= time.monotonic():
+                return version, None
+            self._entries.move_to_end(id_role)
+        return version, entry[2]
+
+    def set(self, id_role, version, permissions):
+        permissions = [dump_permission(permission) for permission in permissions]
+        if self.redis is not None:
+            self.redis.set(
+                ENTRY_KEY.format(id_role=id_role),
+                json.dumps({"version": version, "permissions": permissions}),
+                ex=self.config["TTL"],
+            )
+            return
+        with self._lock:
+            if version != self._local_version:
+                return  # permissions were modified while loading them
+            self._entries[id_role] = (version, time.monotonic() + self.config["TTL"], permissions)
+            self._entries.move_to_end(id_role)
+            while len(self._entries) > self.config["SIZE"]:
+                self._entries.popitem(last=False)
+
+    def bump_version(self):
+        """
+        Invalidate the permissions of every role.
+        """
+        with self._lock:
+            self._local_version += 1
+            self._entries.clear()
+        if self.redis is not None:
+            self.redis.incr(VERSION_KEY)
+
+
+permissions_cache = PermissionsCache()
+
+
+def bump_permissions_version():
+    """
+    Invalidate cached permissions, to be called after permissions or roles
+    have been modified outside of the ORM (e.g. with raw SQL).
+    """
+    if permissions_cache.enabled:
+        permissions_cache.bump_version()
+
+
+def _modifies_permissions(session, obj):
+    if isinstance(obj, Permission):
+        return True
+    if isinstance(obj, User):
+        if obj in session.new or obj in session.deleted:
+            return True
+        # Only groups membership changes affect permissions
+        state = sa.inspect(obj)
+        return any(
+            state.attrs[attr].history.has_changes()
+            for attr in ("members", "groups")
+            if attr in state.attrs
+        )
+    return False
+
+
+@sa.event.listens_for(Session, "after_flush")
+def _invalidate_on_permissions_change(session, flush_context):
+    if not has_app_context():
+        return
+    if any(
+        _modifies_permissions(session, obj)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        bump_permissions_version()
+        # Permissions loaded within this transaction must be forgotten when it ends
+        session.info["permissions_modified"] = True
+
+
+@sa.event.listens_for(Session, "after_transaction_end")
+def _invalidate_on_transaction_end(session, transaction):
+    if has_app_context() and session.info.get("permissions_modified"):
+        bump_permissions_version()
+        if transaction.parent is None:
+            del session.info["permissions_modified"]
@@ -1,5 +1,6 @@
 import click
 from click import UsageError
+from flask import current_app
 import sqlalchemy as sa
 from sqlalchemy.orm import contains_eager, joinedload
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
@@ -9,6 +10,7 @@ from pypnusershub.db.models import User
 
 from geonature.utils.env import db
 from geonature.core.gn_permissions.models import Permission, PermissionAvailable
+from geonature.core.gn_permissions.cache import bump_permissions_version
 
 
 @click.command(
@@ -87,3 +89,22 @@ def supergrant(skip_existing, dry_run, yes, **filters):
             db.session.add(Permission(availability=ap, role=role))
     if not dry_run:
         db.session.commit()
+
+
+@click.command(
+    "invalidate-cache",
+    help="Invalider le cache des permissions, après une modification des permissions "
+    "ou des groupes hors de GeoNature (par exemple dans UsersHub).",
+)
+def invalidate_cache():
+    backend = current_app.config["PERMISSIONS_CACHE"]["BACKEND"]
+    if backend is None:
+        click.echo("Le cache des permissions est désactivé.")
+    elif backend == "memory":
+        click.echo(
+            "Le cache des permissions est propre à chaque processus, "
+            "redémarrez GeoNature pour l’invalider."
+        )
+    else:
+        bump_permissions_version()
+        click.echo("Le cache des permissions a été invalidé.")
@@ -85,6 +85,7 @@ class PermObject(db.Model):
     id_object = db.Column(db.Integer, primary_key=True)
     code_object = db.Column(db.Unicode)
     description_object = db.Column(db.Unicode)
+    modules = db.relationship(TModules, secondary=cor_object_module, backref="objects")
 
     def __str__(self):
         return f"{self.code_object} ({self.description_object})"
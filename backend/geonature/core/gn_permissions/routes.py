@@ -14,7 +14,7 @@ from sqlalchemy.orm import joinedload
 from geonature.core.gn_permissions.models import PermAction, PermissionAvailable, TObjects
 from geonature.core.gn_permissions.schemas import PermissionAvailableSchema
 from geonature.core.gn_permissions.decorators import login_required
-from geonature.core.gn_permissions.commands import supergrant
+from geonature.core.gn_permissions.commands import invalidate_cache, supergrant
 from werkzeug.exceptions import NotFound
 
 
@@ -23,6 +23,7 @@ routes = Blueprint(
 )
 
 routes.cli.add_command(supergrant)
+routes.cli.add_command(invalidate_cache)
 
 
 # @TODO delete
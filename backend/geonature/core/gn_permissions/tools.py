@@ -1,6 +1,7 @@
 import logging
 
-from itertools import groupby, permutations
+from collections import defaultdict
+from itertools import chain, groupby
 
 import sqlalchemy as sa
 from sqlalchemy.orm import joinedload, selectinload
@@ -16,6 +17,7 @@ from geonature.core.gn_permissions.models import (
     cor_permission_area,
     cor_permission_taxref,
 )
+from geonature.core.gn_permissions.cache import load_permission, permissions_cache
 from geonature.utils.env import db
 
 from pypnusershub.db.models import User
@@ -85,15 +87,33 @@ def _get_user_permissions(id_role):
     return db.session.scalars(query).all()
 
 
+def _get_cached_user_permissions(id_role):
+    if not permissions_cache.enabled:
+        return _get_user_permissions(id_role)
+    version, permissions = permissions_cache.get(id_role)
+    if permissions is None:
+        permissions = _get_user_permissions(id_role)
+        permissions_cache.set(id_role, version, permissions)
+        return permissions
+    # Attach cached permissions (and their related objects) to the session without any query,
+    # permissions which expired since they were cached are dropped
+    permissions = [load_permission(permission) for permission in permissions]
+    return [
+        db.session.merge(permission, load=False)
+        for permission in permissions
+        if permission.is_active
+    ]
+
+
 def get_user_permissions(id_role=None):
     if id_role is None:
         id_role = g.current_user.id_role
     if has_request_context():
         if id_role not in g._permissions_by_user:
-            g._permissions_by_user[id_role] = _get_user_permissions(id_role)
+            g._permissions_by_user[id_role] = _get_cached_user_permissions(id_role)
         return g._permissions_by_user[id_role]
     else:
-        return _get_user_permissions(id_role)
+        return _get_cached_user_permissions(id_role)
 
 
 def _get_permissions(id_role, module_code, object_code, action_code):
@@ -105,14 +125,71 @@ def _get_permissions(id_role, module_code, object_code, action_code):
         and p.action.code_action == action_code
     }
 
-    # Remove all permissions supersed by another permission
-    # /!\ if p1 == p2, both will be removed!
-    # Ensure to eliminate all duplicates when querying permissions
-    for p1, p2 in permutations(permissions, 2):
-        if p1 in permissions and p1 <= p2:
-            permissions.remove(p1)
+    return _remove_superseded_permissions(permissions)
+
+
+def _permission_sort_key(permission):
+    """
+    Sort key such that if a permission supersedes another one, its key is lower
+    or equal to the key of the other permission.
+    """
+    areas_filter = permission.areas_filter
+    return (
+        -(4 if permission.scope_value is None else permission.scope_value),
+        permission.sensitivity_filter,
+        bool(areas_filter),
+        -len(areas_filter),
+        bool(permission.taxons_filter),
+    )
+
+
+def _remove_superseded_permissions(permissions):
+    """
+    Return the permissions which are not supersed by another permission.
+
+    Permissions with the same filters are deduplicated, then permissions are processed from
+    the most to the least permissive (see _permission_sort_key), so that each permission only
+    has to be compared with already kept permissions which can supersede it:
+    - permissions without geographic filter or sharing one of its areas ;
+    - permissions with the same sort key and areas, which are the only ones it can supersede.
+    """
+    unique_permissions = {}
+    for permission in permissions:
+        signature = tuple(
+            frozenset(value) if isinstance(value, list) else value
+            for value in (
+                getattr(permission, field) for field in Permission.filters_fields.values()
+            )
+        )
+        unique_permissions.setdefault(signature, permission)
+
+    kept_without_areas = set()
+    kept_by_area = defaultdict(set)
+    kept_by_key = defaultdict(set)
+    for permission in sorted(unique_permissions.values(), key=_permission_sort_key):
+        candidates = kept_without_areas
+        if permission.areas_filter:
+            candidates = chain(
+                candidates,
+                min((kept_by_area[area] for area in permission.areas_filter), key=len),
+            )
+        if any(permission <= kept for kept in candidates):
+            continue
+        # Same sort key and same areas: only their taxonomic filters may differ
+        key = (_permission_sort_key(permission), frozenset(permission.areas_filter))
+        for superseded in [kept for kept in kept_by_key[key] if kept <= permission]:
+            kept_by_key[key].remove(superseded)
+            kept_without_areas.discard(superseded)
+            for area in superseded.areas_filter:
+                kept_by_area[area].discard(superseded)
+        kept_by_key[key].add(permission)
+        if permission.areas_filter:
+            for area in permission.areas_filter:
+                kept_by_area[area].add(permission)
+        else:
+            kept_without_areas.add(permission)
 
-    return permissions
+    return set().union(*kept_by_key.values())
 
 
 def get_permissions(action_code, id_role=None, module_code=None, object_code=None):
@@ -181,6 +258,28 @@ def get_scopes_by_action(id_role=None, module_code=None, object_code=None):
     }
 
 
+def get_scopes_by_module_object(id_role=None):
+    """
+    This function gets the scopes permissions for each one of the 6 actions in "CRUVED",
+    for every module and object, in a single pass over the permissions of the role.
+    The scope is the same as returned by get_scope: as a superseded permission never has a
+    greater scope than its superseding one, superseded permissions need not be removed.
+
+    :returns : (dict) A dict with (module_code, object_code) as key and as value a dict of the
+        scope for each one of the 6 actions (the char in "CRUVED"). Missing keys are set to
+        a dict with only 0 scopes.
+    """
+    scopes = defaultdict(lambda: dict.fromkeys("CRUVED", 0))
+    for permission in get_user_permissions(id_role):
+        action_code = permission.action.code_action
+        if action_code not in "CRUVED":
+            continue
+        cruved = scopes[(permission.module.module_code, permission.object.code_object)]
+        scope = 3 if permission.scope_value is None else permission.scope_value
+        cruved[action_code] = max(cruved[action_code], scope)
+    return scopes
+
+
 def has_any_permissions(action_code, id_role=None, module_code=None, object_code=None) -> bool:
     """
     This function return the scope for an action, a module and an object as a Boolean
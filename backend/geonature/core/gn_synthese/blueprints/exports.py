@@ -1,12 +1,14 @@
 import datetime
 import json
 import re
+import tempfile
 from collections import OrderedDict
 
 from flask import (
     Blueprint,
     current_app,
     g,
+    jsonify,
     render_template,
     request,
     send_from_directory,
@@ -16,20 +18,27 @@ from geojson import Feature, FeatureCollection
 from geonature.core.gn_permissions.decorators import permissions_required
 from geonature.core.gn_synthese.models import (
     CorAreaSynthese,
-    Synthese,
+    TExportJob,
     VSyntheseForWebApp,
 )
 from geonature.core.gn_synthese.synthese_config import MANDATORY_COLUMNS
-from geonature.core.gn_synthese.utils.blurring import (
-    build_allowed_geom_cte,
-    build_blurred_precise_geom_queries,
-    split_blurring_precise_permissions,
+from geonature.core.gn_synthese.utils.exports import (
+    DEFAULT_EXPORT_VIEW,
+    ObservationsExport,
+    get_synthese_changes,
 )
 from geonature.core.gn_synthese.utils.query_select_sqla import SyntheseQuery
+from geonature.core.gn_synthese.tasks import export_observations
 from geonature.utils import filemanager
 from geonature.utils.env import DB, db
 from geonature.utils.errors import GeonatureApiError
-from geonature.utils.utilsgeometrytools import export_as_geo_file
+from geonature.utils.pagination import decode_cursor, encode_cursor
+from geonature.utils.utilscsv import stream_csv_resp
+from geonature.utils.utilsgeometrytools import (
+    EXPORT_STREAM_OPTIONS,
+    export_as_geo_file,
+    send_geo_file,
+)
 
 from apptax.taxonomie.models import (
     Taxref,
@@ -42,10 +51,9 @@ from apptax.taxonomie.models import (
 )
 
 from sqlalchemy import distinct, func, select
-from utils_flask_sqla.generic import GenericTable, serializeQuery
+from utils_flask_sqla.generic import GenericTable
 from utils_flask_sqla.response import to_csv_resp, to_json_resp
-from utils_flask_sqla_geo.generic import GenericTableGeo
-from werkzeug.exceptions import BadRequest, Forbidden
+from werkzeug.exceptions import BadRequest, Conflict, Forbidden
 
 export_routes = Blueprint("exports", __name__)
 
@@ -117,9 +125,10 @@ def export_taxon_web(permissions):
         subq, subq.c.cd_ref == columns.cd_ref
     )
 
-    return to_csv_resp(
+    results = db.session.execute(query, execution_options=EXPORT_STREAM_OPTIONS)
+    return stream_csv_resp(
         datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S"),
-        data=serializeQuery(db.session.execute(query).all(), query.column_descriptions),
+        rows=(row._mapping for row in results),
         separator=";",
         columns=[db_col.key for db_col in columns] + ["nb_obs", "date_min", "date_max"],
     )
@@ -137,170 +146,45 @@ def export_observations_web(permissions):
 
     POST parameters: Use a list of id_synthese (in POST parameters) to filter the v_synthese_for_export_view
 
-    :query str export_format: str<'csv', 'geojson', 'shapefiles', 'gpkg'>
-    :query str export_format: str<'csv', 'geojson', 'shapefiles', 'gpkg'>
+    :query str export_format: str<'csv', 'geojson', 'shapefiles', 'gpkg', 'parquet'>
+    :query str export_format: str<'csv', 'geojson', 'shapefiles', 'gpkg', 'parquet'>
 
     """
     params = request.args
     # set default to csv
     export_format = params.get("export_format", "csv")
-    view_name_param = params.get("view_name", "gn_synthese.v_synthese_for_export")
+    view_name_param = params.get("view_name", DEFAULT_EXPORT_VIEW)
     # Test export_format
     if export_format not in current_app.config["SYNTHESE"]["EXPORT_FORMAT"]:
         raise BadRequest("Unsupported format")
-    config_view = {
-        "view_name": "gn_synthese.v_synthese_for_web_app",
-        "geojson_4326_field": "geojson_4326",
-        "geojson_local_field": "geojson_local",
-    }
-    # Test export view name is config params for security reason
-    if view_name_param != "gn_synthese.v_synthese_for_export":
-        try:
-            config_view = next(
-                _view
-                for _view in current_app.config["SYNTHESE"]["EXPORT_OBSERVATIONS_CUSTOM_VIEWS"]
-                if _view["view_name"] == view_name_param
-            )
-        except StopIteration:
-            raise Forbidden("This view is not available for export")
-
-    geojson_4326_field = config_view["geojson_4326_field"]
-    geojson_local_field = config_view["geojson_local_field"]
-    try:
-        schema_name, view_name = view_name_param.split(".")
-    except ValueError:
-        raise BadRequest("view_name parameter must be a string with schema dot view_name")
 
     # get list of id synthese from POST
     id_list = request.get_json()
 
-    # Get the SRID for the export
-    local_srid = DB.session.execute(
-        func.Find_SRID("gn_synthese", "synthese", "the_geom_local")
-    ).scalar()
-
-    blurring_permissions, precise_permissions = split_blurring_precise_permissions(permissions)
+    export = ObservationsExport(view_name_param, id_list, permissions)
+    export_view = export.export_view
+    columns_to_serialize = export.columns_to_serialize
 
-    # Get the view for export
-    # Useful to have geom column so that they can be replaced by blurred geoms
-    # (only if the user has sensitive permissions)
-    export_view = GenericTableGeo(
-        tableName=view_name,
-        schemaName=schema_name,
-        engine=DB.engine,
-        geometry_field=None,
-        srid=local_srid,
-    )
-    mandatory_columns = {"id_synthese", geojson_4326_field, geojson_local_field}
-    if not mandatory_columns.issubset(set(map(lambda col: col.name, export_view.db_cols))):
-        print(set(map(lambda col: col.name, export_view.db_cols)))
-        raise BadRequest(
-            f"The view {view_name} miss one of required columns {str(mandatory_columns)}"
-        )
-
-    # If there is no sensitive permissions => same path as before blurring implementation
-    if not blurring_permissions:
-        # Get the CTE for synthese filtered by user permissions
-        synthese_query_class = SyntheseQuery(
-            Synthese,
-            select(Synthese.id_synthese),
-            {},
-        )
-        synthese_query_class.filter_query_all_filters(g.current_user, permissions)
-        cte_synthese_filtered = synthese_query_class.build_query().cte("cte_synthese_filtered")
-        selectable_columns = [export_view.tableDef]
-    else:
-        # Use slightly the same process as for get_observations_for_web()
-        # Add a where_clause to filter the id_synthese provided to reduce the
-        # UNION queries
-        where_clauses = [Synthese.id_synthese.in_(id_list)]
-        blurred_geom_query, precise_geom_query = build_blurred_precise_geom_queries(
-            filters={}, where_clauses=where_clauses
-        )
+    file_name = datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S")
+    file_name = filemanager.removeDisallowedFilenameChars(file_name)
 
-        cte_synthese_filtered = build_allowed_geom_cte(
-            blurring_permissions=blurring_permissions,
-            precise_permissions=precise_permissions,
-            blurred_geom_query=blurred_geom_query,
-            precise_geom_query=precise_geom_query,
-            limit=current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"],
-        )
-
-        # Overwrite geometry columns to compute the blurred geometry from the blurring cte
-        columns_with_geom_excluded = [
-            col
-            for col in export_view.tableDef.columns
-            if col.name
-            not in [
-                "geometrie_wkt_4326",  # FIXME: hardcoded column names?
-                "x_centroid_4326",
-                "y_centroid_4326",
-                geojson_4326_field,
-                geojson_local_field,
-            ]
-        ]
-        # Recomputed the blurred geometries
-        blurred_geom_columns = [
-            func.st_astext(cte_synthese_filtered.c.geom).label("geometrie_wkt_4326"),
-            func.st_x(func.st_centroid(cte_synthese_filtered.c.geom)).label("x_centroid_4326"),
-            func.st_y(func.st_centroid(cte_synthese_filtered.c.geom)).label("y_centroid_4326"),
-            func.st_asgeojson(cte_synthese_filtered.c.geom).label(geojson_4326_field),
-            func.st_asgeojson(func.st_transform(cte_synthese_filtered.c.geom, local_srid)).label(
-                geojson_local_field
-            ),
-        ]
-
-        # Finally provide all the columns to be selected in the export query
-        selectable_columns = columns_with_geom_excluded + blurred_geom_columns
-
-    # Get the query for export
-    export_query = (
-        select(*selectable_columns)
-        .select_from(
-            export_view.tableDef.join(
-                cte_synthese_filtered,
-                cte_synthese_filtered.c.id_synthese == export_view.tableDef.columns["id_synthese"],
-            )
-        )
-        .where(export_view.tableDef.columns["id_synthese"].in_(id_list))
-        .distinct(export_view.tableDef.columns["id_synthese"])
-    )
-    if blurring_permissions:
-        # When blurring permission,to ensure the 'distinct on' priorise entry with higher priority (blurred obs => priority = 2 ; precise obs => priority = 1)
-        # Check https://www.postgresql.org/docs/9.0/sql-select.html#SQL-DISTINCT for more details
-        export_query = export_query.order_by(
-            export_view.tableDef.columns["id_synthese"], cte_synthese_filtered.c.priority.asc()
-        )
+    if export_format == "parquet":
+        dir_name = tempfile.mkdtemp(prefix="export_")
+        _, file_name = export.write(export_format, dir_name, file_name)
+        return send_geo_file(dir_name, file_name)
 
     # Get the results for export
-    results = DB.session.execute(
-        export_query.limit(current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"])
-    )
-
-    db_cols_for_shape = []
-    columns_to_serialize = []
-    # loop over synthese config to exclude columns if its default export
-    for db_col in export_view.db_cols:
-        if view_name_param == "gn_synthese.v_synthese_for_export":
-            if db_col.key in current_app.config["SYNTHESE"]["EXPORT_COLUMNS"]:
-                db_cols_for_shape.append(db_col)
-                columns_to_serialize.append(db_col.key)
-        else:
-            # remove geojson fields of serialization
-            if db_col.key not in [geojson_4326_field, geojson_local_field]:
-                db_cols_for_shape.append(db_col)
-                columns_to_serialize.append(db_col.key)
-
-    file_name = datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S")
-    file_name = filemanager.removeDisallowedFilenameChars(file_name)
+    results = export.execute(stream=True)
 
     if export_format == "csv":
-        formated_data = [export_view.as_dict(d, fields=columns_to_serialize) for d in results]
-        return to_csv_resp(file_name, formated_data, separator=";", columns=columns_to_serialize)
+        formated_data = (export.as_dict(d) for d in results)
+        return stream_csv_resp(
+            file_name, formated_data, separator=";", columns=columns_to_serialize
+        )
     elif export_format == "geojson":
         features = []
         for r in results:
-            geometry = json.loads(getattr(r, geojson_4326_field))
+            geometry = json.loads(getattr(r, export.geojson_4326_field))
             feature = Feature(
                 geometry=geometry,
                 properties=export_view.as_dict(r, fields=columns_to_serialize),
@@ -313,12 +197,12 @@ def export_observations_web(permissions):
             dir_name, file_name = export_as_geo_file(
                 export_format=export_format,
                 export_view=export_view,
-                db_cols=db_cols_for_shape,
-                geojson_col=geojson_local_field,
+                db_cols=export.db_cols_for_shape,
+                geojson_col=export.geojson_local_field,
                 data=results,
                 file_name=file_name,
             )
-            return send_from_directory(dir_name, file_name, as_attachment=True)
+            return send_geo_file(dir_name, file_name)
 
         except GeonatureApiError as e:
             message = str(e)
@@ -330,6 +214,168 @@ def export_observations_web(permissions):
         )
 
 
+@export_routes.route("/export_observations/changes", methods=["GET"])
+@permissions_required("E", module_code="SYNTHESE")
+def export_observations_changes(permissions):
+    """Incremental observations export.
+
+    .. :quickref: Synthese;
+
+    Export as CSV the observations inserted, updated or deleted since a date, or since
+    a previous incremental export. The "last_action" column gives the change
+    ("I", "U" or "D"), only the id_synthese of deleted observations is given.
+
+    The X-Sync-Token header of the response is to be given as sync_token parameter
+    of the next export to get the following changes. At most NB_MAX_OBS_EXPORT changes
+    are returned, X-Sync-Has-More is "true" when others are waiting.
+
+    The dataset of deleted observations is not logged, so deletions are only given
+    to users whose export permissions are not restricted by any filter.
+
+    :query str sync_token: token returned by the previous incremental export
+    :query str since: ISO 8601 date, used when no sync_token is given
+        (all observations when neither is given)
+    :query str view_name: export view, default to gn_synthese.v_synthese_for_export
+    """
+    params = request.args
+    view_name_param = params.get("view_name", DEFAULT_EXPORT_VIEW)
+    since, after_id = None, None
+    if "sync_token" in params:
+        try:
+            since, after_id = decode_cursor(params["sync_token"])
+            since = datetime.datetime.fromisoformat(since)
+            after_id = int(after_id)
+        except (ValueError, TypeError):
+            raise BadRequest("Invalid sync_token")
+    elif "since" in params:
+        try:
+            since = datetime.datetime.fromisoformat(params["since"])
+        except ValueError:
+            raise BadRequest("since must be an ISO 8601 date")
+
+    limit = current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"]
+    changes = get_synthese_changes(
+        since=since,
+        after_id=after_id,
+        limit=limit,
+        with_deletions=any(not permission.filters for permission in permissions),
+    )
+    if changes:
+        sync_token = encode_cursor(changes[-1].action_date, changes[-1].id_synthese)
+    elif "sync_token" in params:
+        sync_token = params["sync_token"]
+    elif since is not None:
+        sync_token = encode_cursor(since, 0)
+    else:
+        sync_token = None
+    upserts = {
+        change.id_synthese: change.last_action for change in changes if change.last_action != "D"
+    }
+    deletions = [change.id_synthese for change in changes if change.last_action == "D"]
+
+    export = ObservationsExport(view_name_param, list(upserts), permissions)
+
+    def rows():
+        if upserts:
+            for row in export.execute(stream=True):
+                yield {
+                    **export.as_dict(row),
+                    "id_synthese": row.id_synthese,
+                    "last_action": upserts[row.id_synthese],
+                }
+        for id_synthese in deletions:
+            yield {"id_synthese": id_synthese, "last_action": "D"}
+
+    file_name = filemanager.removeDisallowedFilenameChars(
+        datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S")
+    )
+    columns = ["last_action", "id_synthese"] + [
+        column for column in export.columns_to_serialize if column != "id_synthese"
+    ]
+    response = stream_csv_resp(file_name, rows(), separator=";", columns=columns)
+    if sync_token:
+        response.headers["X-Sync-Token"] = sync_token
+    response.headers["X-Sync-Has-More"] = "true" if len(changes) == limit else "false"
+    return response
+
+
+@export_routes.route("/export_observations/jobs", methods=["POST"])
+@permissions_required("E", module_code="SYNTHESE")
+def create_export_job(permissions):
+    """Create an asynchronous observations export.
+
+    .. :quickref: Synthese;
+
+    Same parameters as /export_observations. The export file is written by a celery task,
+    its progress is given by /export_observations/jobs/<id_export> and the file
+    can be downloaded from /export_observations/jobs/<id_export>/download once done.
+    The author of the export is notified when the file is ready.
+
+    :query str export_format: str<'csv', 'geojson', 'shapefile', 'gpkg', 'parquet'>
+    :query str view_name: export view, default to gn_synthese.v_synthese_for_export
+    """
+    params = request.args
+    export_format = params.get("export_format", "csv")
+    view_name_param = params.get("view_name", DEFAULT_EXPORT_VIEW)
+    if export_format not in current_app.config["SYNTHESE"]["EXPORT_FORMAT"]:
+        raise BadRequest("Unsupported format")
+    id_list = request.get_json()
+    if not isinstance(id_list, list):
+        raise BadRequest("A list of id_synthese is expected")
+
+    # Check the view and its columns now rather than in the task
+    ObservationsExport(view_name_param, [], permissions)
+
+    job = TExportJob(
+        id_role=g.current_user.id_role,
+        export_format=export_format,
+        view_name=view_name_param,
+    )
+    db.session.add(job)
+    db.session.flush()
+
+    # Run background export
+    sig = export_observations.s(job.id_export, id_list)
+    task = sig.freeze()
+    job.task_id = task.task_id
+    db.session.commit()
+    sig.delay()
+
+    db.session.refresh(job)
+    return jsonify(job.as_dict()), 202
+
+
+def get_export_job(id_export):
+    job = db.get_or_404(TExportJob, id_export)
+    if job.id_role != g.current_user.id_role:
+        raise Forbidden
+    return job
+
+
+@export_routes.route("/export_observations/jobs/<int:id_export>", methods=["GET"])
+@permissions_required("E", module_code="SYNTHESE")
+def get_export_job_status(permissions, id_export):
+    """Get the status and progress (between 0 and 1) of an asynchronous observations export.
+
+    .. :quickref: Synthese;
+    """
+    job = get_export_job(id_export)
+    return jsonify({**job.as_dict(), "progress": job.task_progress})
+
+
+@export_routes.route("/export_observations/jobs/<int:id_export>/download", methods=["GET"])
+@permissions_required("E", module_code="SYNTHESE")
+def download_export_job(permissions, id_export):
+    """Download the file of a finished asynchronous observations export.
+
+    .. :quickref: Synthese;
+    """
+    job = get_export_job(id_export)
+    if job.status != "done":
+        raise Conflict("Export is not done")
+    return send_from_directory(job.dir_path, job.file_name, as_attachment=True)
+
+
 # TODO: Change the following line to set method as "POST" only ?
 @export_routes.route("/export_metadata", methods=["GET", "POST"])
 @permissions_required("E", module_code="SYNTHESE")
@@ -388,20 +434,22 @@ def export_metadata(permissions):
     # Filter query with permissions (scope, sensitivity, ...)
     synthese_query_class.filter_query_all_filters(g.current_user, permissions)
 
-    data = DB.session.execute(synthese_query_class.query)
+    data = DB.session.execute(synthese_query_class.query, execution_options=EXPORT_STREAM_OPTIONS)
 
     # Define the header of the csv file
     columns = [db_col.key for db_col in metadata_view.tableDef.columns]
     columns[columns.index("nombre_obs")] = "nombre_total_obs"
 
     # Retrieve the data to write in the csv file
-    data = [metadata_view.as_dict(d) for d in data]
-    for d in data:
-        d["nombre_total_obs"] = d.pop("nombre_obs")
+    def rows():
+        for d in data:
+            d = metadata_view.as_dict(d)
+            d["nombre_total_obs"] = d.pop("nombre_obs")
+            yield d
 
-    return to_csv_resp(
+    return stream_csv_resp(
         datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S"),
-        data=data,
+        rows=rows(),
         separator=";",
         columns=columns,
     )
@@ -6,10 +6,11 @@ from flask import (
     current_app,
     jsonify,
     g,
+    stream_with_context,
 )
 
 from werkzeug.exceptions import Forbidden, NotFound, BadRequest
-from sqlalchemy import func, select, case, join, and_
+from sqlalchemy import func, select, case, join, and_, cast, literal, Text, JSON
 from sqlalchemy.orm import joinedload, lazyload, selectinload, contains_eager
 from geojson import FeatureCollection, Feature
 
@@ -42,6 +43,32 @@ from ref_geo.models import LAreas, BibAreasTypes
 
 synthese_routes = Blueprint("synthese", __name__)
 
+# Number of rows fetched at once from the server-side cursor in streaming mode
+STREAM_BATCH_SIZE = 5000
+
+
+def stream_feature_collection(results, assembled_in_db=False):
+    """
+    Yield a GeoJSON FeatureCollection chunk by chunk from rows of
+    ``(geometry, properties)`` where both members are JSON strings (as
+    returned by ``st_asgeojson`` and ``json_build_object::text``), or from
+    rows of one whole Feature JSON string if ``assembled_in_db`` is True.
+    Geometries and properties are passed through without being decoded.
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for partition in results.partitions():
+        if assembled_in_db:
+            features = ", ".join(feature for feature, in partition)
+        else:
+            features = ", ".join(
+                f'{{"type": "Feature", "geometry": {geometry or "null"}, "properties": {properties}}}'
+                for geometry, properties in partition
+            )
+        yield separator + features
+        separator = ", "
+    yield "]}"
+
 
 @synthese_routes.route("/for_web", methods=["GET", "POST"])
 @permissions_required("R", module_code="SYNTHESE")
@@ -86,6 +113,10 @@ def get_observations_for_web(permissions):
     :qparam str period_end: *tbd*
     :qparam str area*: Generic filter on area
     :qparam str *: Generic filter, given by colname & value
+    :qparam str stream: if "true", the FeatureCollection is streamed from a server-side
+        cursor, geometries and properties being passed through without being decoded
+    :qparam str assemble_in_db: if "true", the Features (and the FeatureCollection itself
+        when not streaming) are built by PostgreSQL and sent as is to the client
     :>jsonarr array data: Array of synthese with geojson key, see above
     :>jsonarr int nb_total: Number of observations
     :>jsonarr bool nb_obs_limited: Is number of observations capped
@@ -104,6 +135,9 @@ def get_observations_for_web(permissions):
     if output_format not in ["ungrouped_geom", "grouped_geom", "grouped_geom_by_areas"]:
         raise BadRequest(f"Bad format '{output_format}'")
 
+    stream = request.args.get("stream", "false").lower() == "true"
+    assemble_in_db = request.args.get("assemble_in_db", "false").lower() == "true"
+
     # Get Column Frontend parameter to return only the needed columns
     param_column_list = {
         col["prop"]
@@ -225,13 +259,52 @@ def get_observations_for_web(permissions):
         obs_query = obs_query.add_columns(geojson_column.label("geojson")).cte("OBSERVATIONS")
 
     if output_format == "ungrouped_geom":
-        query = select(obs_query.c.geojson, obs_query.c.obs_as_json)
+        properties = obs_query.c.obs_as_json
     else:
         # Group geometries with main query
-        grouped_properties = func.json_build_object(
+        properties = func.json_build_object(
             "observations", func.json_agg(obs_query.c.obs_as_json).label("observations")
         )
-        query = select(obs_query.c.geojson, grouped_properties).group_by(obs_query.c.geojson)
+    if stream and not assemble_in_db:
+        # Properties are serialized by PostgreSQL so that psycopg2 does not decode them
+        properties = properties.cast(Text)
+    query = select(obs_query.c.geojson, properties.label("properties"))
+    if output_format != "ungrouped_geom":
+        query = query.group_by(obs_query.c.geojson)
+
+    if assemble_in_db:
+        features = query.subquery("FEATURES")
+        feature = func.json_build_object(
+            "type",
+            "Feature",
+            "geometry",
+            cast(features.c.geojson, JSON),
+            "properties",
+            features.c.properties,
+        )
+        if stream:
+            query = select(cast(feature, Text))
+        else:
+            feature_collection = func.json_build_object(
+                "type",
+                "FeatureCollection",
+                "features",
+                func.coalesce(func.json_agg(feature), cast(literal("[]"), JSON)),
+            )
+            query = select(cast(feature_collection, Text))
+            return current_app.response_class(
+                DB.session.execute(query).scalar_one(), mimetype="application/json"
+            )
+
+    if stream:
+        results = DB.session.execute(
+            query,
+            execution_options={"stream_results": True, "yield_per": STREAM_BATCH_SIZE},
+        )
+        return current_app.response_class(
+            stream_with_context(stream_feature_collection(results, assemble_in_db)),
+            mimetype="application/json",
+        )
 
     results = DB.session.execute(query)
 
@@ -20,6 +20,9 @@ from geonature.core.imports.checks.dataframe import (
     check_types,
     concat_dates,
 )
+from geonature.core.imports.checks.dataframe.cast import get_column_types
+from geonature.core.imports.checks.dataframe.utils import check_dataframe_batches
+from geonature.core.imports.checks.sql.utils import batch_erroneous_rows
 from geonature.core.imports.checks.sql import (
     check_altitudes,
     check_cd_hab,
@@ -46,7 +49,7 @@ from geonature.core.imports.checks.sql import (
 from geonature.core.imports.models import BibFields, Entity, EntityField, TImports
 from geonature.core.imports.utils import (
     compute_bounding_box,
-    load_transient_data_in_dataframe,
+    iter_transient_data_in_dataframe,
     update_transient_data_from_dataframe,
 )
 from geonature.utils.env import db
@@ -101,7 +104,7 @@ class SyntheseImportActions(ImportActions):
         def update_batch_progress(batch, step):
             start = 0.1
             end = 0.4
-            step_count = 8
+            step_count = 4
             progress = start + ((batch + step / step_count) / batch_count) * (end - start)
             task.update_state(state="PROGRESS", meta={"progress": progress})
 
@@ -111,18 +114,14 @@ class SyntheseImportActions(ImportActions):
             if field.mandatory or (field.source_field is not None and field.mnemonique is None)
         ]
 
-        for batch in range(batch_count):
-            offset = batch * batch_size
-            updated_cols = set()
+        # Checks without database access, which may run in parallel worker processes
+        column_types = get_column_types(entity)
+        default_count = current_app.config["IMPORT"]["DEFAULT_COUNT_VALUE"]
 
-            logger.info(f"[{batch+1}/{batch_count}] Loading import data in dataframe…")
-            with start_sentry_child(op="check.df", description="load dataframe"):
-                df = load_transient_data_in_dataframe(
-                    imprt, entity, source_cols, offset=offset, limit=batch_size
-                )
-            update_batch_progress(batch, 1)
+        def check_batch(df):
+            updated_cols = set()
 
-            logger.info(f"[{batch+1}/{batch_count}] Concat dates…")
+            logger.info("Concat dates…")
             with start_sentry_child(op="check.df", description="concat dates"):
                 updated_cols |= concat_dates(
                     df,
@@ -133,17 +132,31 @@ class SyntheseImportActions(ImportActions):
                     fields["hour_min"].source_field,
                     fields["hour_max"].source_field,
                 )
-            update_batch_progress(batch, 2)
 
-            logger.info(f"[{batch+1}/{batch_count}] Check required values…")
+            logger.info("Check required values…")
             with start_sentry_child(op="check.df", description="check required values"):
                 updated_cols |= check_required_values(imprt, entity, df, fields)
-            update_batch_progress(batch, 3)
 
-            logger.info(f"[{batch+1}/{batch_count}] Check types…")
+            logger.info("Check types…")
             with start_sentry_child(op="check.df", description="check types"):
-                updated_cols |= check_types(imprt, entity, df, fields)
-            update_batch_progress(batch, 4)
+                updated_cols |= check_types(imprt, entity, df, fields, column_types)
+
+            logger.info("Check counts…")
+            with start_sentry_child(op="check.df", description="check count"):
+                updated_cols |= check_counts(
+                    imprt,
+                    entity,
+                    df,
+                    fields["count_min"],
+                    fields["count_max"],
+                    default_count=default_count,
+                )
+            return updated_cols
+
+        batches = iter_transient_data_in_dataframe(imprt, entity, source_cols, batch_size)
+        checked_batches = check_dataframe_batches(imprt, entity, batches, check_batch)
+        for batch, (df, updated_cols) in enumerate(checked_batches):
+            update_batch_progress(batch, 1)
 
             logger.info(f"[{batch+1}/{batch_count}] Check dataset rows")
             with start_sentry_child(op="check.df", description="check datasets rows"):
@@ -155,7 +168,8 @@ class SyntheseImportActions(ImportActions):
                     id_field=fields["id_dataset"],
                     module_code="SYNTHESE",
                 )
-            update_batch_progress(batch, 5)
+            update_batch_progress(batch, 2)
+
             logger.info(f"[{batch+1}/{batch_count}] Check geography…")
             with start_sentry_child(op="check.df", description="set geography"):
                 updated_cols |= check_geometry(
@@ -172,24 +186,12 @@ class SyntheseImportActions(ImportActions):
                     codemaille_field=fields["codemaille"],
                     codedepartement_field=fields["codedepartement"],
                 )
-            update_batch_progress(batch, 6)
-
-            logger.info(f"[{batch+1}/{batch_count}] Check counts…")
-            with start_sentry_child(op="check.df", description="check count"):
-                updated_cols |= check_counts(
-                    imprt,
-                    entity,
-                    df,
-                    fields["count_min"],
-                    fields["count_max"],
-                    default_count=current_app.config["IMPORT"]["DEFAULT_COUNT_VALUE"],
-                )
-            update_batch_progress(batch, 7)
+            update_batch_progress(batch, 3)
 
             logger.info(f"[{batch+1}/{batch_count}] Updating import data from dataframe…")
             with start_sentry_child(op="check.df", description="save dataframe"):
                 update_transient_data_from_dataframe(imprt, entity, updated_cols, df)
-            update_batch_progress(batch, 8)
+            update_batch_progress(batch, 4)
 
         # Checks in SQL
         convert_geom_columns(
@@ -224,49 +226,59 @@ class SyntheseImportActions(ImportActions):
             ],
         )
 
-        if current_app.config["IMPORT"]["CHECK_EXIST_PROOF"]:
-            check_nomenclature_exist_proof(
-                imprt,
-                entity,
-                fields["id_nomenclature_exist_proof"],
-                selected_fields.get("digital_proof"),
-                selected_fields.get("non_digital_proof"),
-            )
-        if current_app.config["IMPORT"]["CHECK_PRIVATE_JDD_BLURING"]:
-            check_nomenclature_blurring(
-                imprt,
-                entity,
-                fields["id_nomenclature_blurring"],
-                fields["id_dataset"],
-                fields["unique_dataset_id"],
-            )
-        if current_app.config["IMPORT"]["CHECK_REF_BIBLIO_LITTERATURE"]:
-            check_nomenclature_source_status(
-                imprt, entity, fields["id_nomenclature_source_status"], fields["reference_biblio"]
-            )
+        # Checks of a batch must not rely on rows validity set by each other
+        with batch_erroneous_rows(imprt):
+            if current_app.config["IMPORT"]["CHECK_EXIST_PROOF"]:
+                check_nomenclature_exist_proof(
+                    imprt,
+                    entity,
+                    fields["id_nomenclature_exist_proof"],
+                    selected_fields.get("digital_proof"),
+                    selected_fields.get("non_digital_proof"),
+                )
+            if current_app.config["IMPORT"]["CHECK_PRIVATE_JDD_BLURING"]:
+                check_nomenclature_blurring(
+                    imprt,
+                    entity,
+                    fields["id_nomenclature_blurring"],
+                    fields["id_dataset"],
+                    fields["unique_dataset_id"],
+                )
+            if current_app.config["IMPORT"]["CHECK_REF_BIBLIO_LITTERATURE"]:
+                check_nomenclature_source_status(
+                    imprt,
+                    entity,
+                    fields["id_nomenclature_source_status"],
+                    fields["reference_biblio"],
+                )
 
-        if "cd_nom" in selected_fields:
-            check_cd_nom(
-                imprt,
-                entity,
-                selected_fields["cd_nom"],
-                list_id=current_app.config["IMPORT"].get("ID_LIST_TAXA_RESTRICTION", None),
-            )
-        if "cd_hab" in selected_fields:
-            check_cd_hab(imprt, entity, selected_fields["cd_hab"])
-        if "entity_source_pk_value" in selected_fields:
-            check_duplicate_source_pk(imprt, entity, selected_fields["entity_source_pk_value"])
+            if "cd_nom" in selected_fields:
+                check_cd_nom(
+                    imprt,
+                    entity,
+                    selected_fields["cd_nom"],
+                    list_id=current_app.config["IMPORT"].get("ID_LIST_TAXA_RESTRICTION", None),
+                )
+            if "cd_hab" in selected_fields:
+                check_cd_hab(imprt, entity, selected_fields["cd_hab"])
+            if "entity_source_pk_value" in selected_fields:
+                check_duplicate_source_pk(imprt, entity, selected_fields["entity_source_pk_value"])
 
         if imprt.fieldmapping.get("altitudes_generate", False):
             generate_altitudes(
                 imprt, fields["the_geom_local"], fields["altitude_min"], fields["altitude_max"]
             )
-        check_altitudes(
-            imprt, entity, selected_fields.get("altitude_min"), selected_fields.get("altitude_max")
-        )
+        with batch_erroneous_rows(imprt):
+            check_altitudes(
+                imprt,
+                entity,
+                selected_fields.get("altitude_min"),
+                selected_fields.get("altitude_max"),
+            )
 
+            if "unique_id_sinp" in selected_fields:
+                check_duplicate_uuid(imprt, entity, selected_fields["unique_id_sinp"])
         if "unique_id_sinp" in selected_fields:
-            check_duplicate_uuid(imprt, entity, selected_fields["unique_id_sinp"])
             if current_app.config["IMPORT"]["PER_DATASET_UUID_CHECK"]:
                 whereclause = Synthese.id_dataset == imprt.id_dataset
             else:
@@ -282,15 +294,19 @@ class SyntheseImportActions(ImportActions):
             current_app.config["IMPORT"]["DEFAULT_GENERATE_MISSING_UUID"],
         ):
             generate_missing_uuid(imprt, entity, fields["unique_id_sinp"])
-        check_dates(imprt, entity, fields["datetime_min"], fields["datetime_max"])
-        check_depths(
-            imprt, entity, selected_fields.get("depth_min"), selected_fields.get("depth_max")
-        )
-        if "digital_proof" in selected_fields:
-            check_digital_proof_urls(imprt, entity, selected_fields["digital_proof"])
+        with batch_erroneous_rows(imprt):
+            check_dates(imprt, entity, fields["datetime_min"], fields["datetime_max"])
+            check_depths(
+                imprt, entity, selected_fields.get("depth_min"), selected_fields.get("depth_max")
+            )
+            if "digital_proof" in selected_fields:
+                check_digital_proof_urls(imprt, entity, selected_fields["digital_proof"])
 
-        if "WKT" in selected_fields:
-            check_is_valid_geometry(imprt, entity, selected_fields["WKT"], fields["the_geom_4326"])
+            if "WKT" in selected_fields:
+                check_is_valid_geometry(
+                    imprt, entity, selected_fields["WKT"], fields["the_geom_4326"]
+                )
+        # Only checks rows which are still valid
         if current_app.config["IMPORT"]["ID_AREA_RESTRICTION"]:
             check_geometry_outside(
                 imprt,
@@ -1,12 +1,15 @@
 from collections import OrderedDict
 from packaging import version
+from pathlib import Path
 from typing import List
+from uuid import uuid4
 
 import sqlalchemy as sa
 import datetime
 from sqlalchemy import ForeignKey, Unicode, and_, DateTime, or_
 from sqlalchemy.orm import (
     relationship,
+    aliased,
     column_property,
     foreign,
     remote,
@@ -21,6 +24,7 @@ from sqlalchemy.dialects.postgresql import UUID, JSONB
 from geoalchemy2 import Geometry
 from geoalchemy2.shape import to_shape
 
+from celery.result import AsyncResult
 from geojson import Feature
 from flask import g, current_app
 import flask_sqlalchemy
@@ -48,12 +52,13 @@ from geonature.core.gn_meta.models import TDatasets, TAcquisitionFramework
 from geonature.core.gn_commons.models import (
     THistoryActions,
     TValidations,
-    last_validation,
+    TLastValidations,
     TMedias,
     TModules,
 )
 from geonature.core.gn_permissions.models import Permission
 from geonature.utils.env import DB, db
+from geonature.utils.celery import celery_app
 
 
 sortable_columns = ["meta_last_action_date"]
@@ -189,16 +194,15 @@ class SyntheseQuery(GeoFeatureCollectionMixin, Query):
         return self.options(*[joinedload(n) for n in Synthese.nomenclature_fields])
 
     def lateraljoin_last_validation(self):
-        # FIXME missing order by!
-        subquery = (
-            select(TValidations)
-            .where(TValidations.uuid_attached_row == Synthese.unique_id_sinp)
-            .limit(1)
-            .subquery()
-            .lateral("last_validation")
-        )
-        return self.outerjoin(subquery, sa.true()).options(
-            contains_eager(Synthese.last_validation, alias=subquery)
+        last_validation = aliased(TValidations, name="last_validation")
+        return (
+            self.outerjoin(
+                TLastValidations, TLastValidations.uuid_attached_row == Synthese.unique_id_sinp
+            )
+            .outerjoin(
+                last_validation, last_validation.id_validation == TLastValidations.id_validation
+            )
+            .options(contains_eager(Synthese.last_validation, alias=last_validation))
         )
 
     def filter_by_scope(self, scope, user=None):
@@ -449,7 +453,14 @@ class Synthese(DB.Model):
     )
     area_attachment = relationship(LAreas, foreign_keys=[id_area_attachment])
     validations = relationship(TValidations, backref="attached_row")
-    last_validation = relationship(last_validation, uselist=False, viewonly=True)
+    last_validation = relationship(
+        TValidations,
+        secondary=TLastValidations.__table__,
+        primaryjoin=lambda: Synthese.unique_id_sinp == foreign(TLastValidations.uuid_attached_row),
+        secondaryjoin=lambda: foreign(TLastValidations.id_validation) == TValidations.id_validation,
+        uselist=False,
+        viewonly=True,
+    )
     medias = relationship(
         TMedias, primaryjoin=(TMedias.uuid_attached_row == foreign(unique_id_sinp)), uselist=True
     )
@@ -514,17 +525,16 @@ class Synthese(DB.Model):
 
     @qfilter(query=True)
     def lateraljoin_last_validation(cls, **kwargs):
-        subquery = (
-            select(TValidations)
-            .where(TValidations.uuid_attached_row == Synthese.unique_id_sinp)
-            .limit(1)
-            .subquery()
-            .lateral("last_validation")
-        )
+        last_validation = aliased(TValidations, name="last_validation")
         return (
             kwargs["query"]
-            .outerjoin(subquery, sa.true())
-            .options(contains_eager(Synthese.last_validation, alias=subquery))
+            .outerjoin(
+                TLastValidations, TLastValidations.uuid_attached_row == Synthese.unique_id_sinp
+            )
+            .outerjoin(
+                last_validation, last_validation.id_validation == TLastValidations.id_validation
+            )
+            .options(contains_eager(Synthese.last_validation, alias=last_validation))
         )
 
     @qfilter(query=True)
@@ -858,6 +868,46 @@ class SyntheseLogEntry(DB.Model):
         return query
 
 
+@serializable(exclude=["uuid_export", "task_id"])
+class TExportJob(DB.Model):
+    """
+    Observations export run asynchronously by a celery task.
+    The exported file is written in a directory named after uuid_export and
+    is removed with the job when the retention period is over.
+    """
+
+    __tablename__ = "t_export_jobs"
+    __table_args__ = {"schema": "gn_synthese"}
+
+    id_export = DB.Column(DB.Integer, primary_key=True)
+    uuid_export = DB.Column(UUID(as_uuid=True), nullable=False, default=uuid4)
+    id_role = DB.Column(DB.Integer, ForeignKey(User.id_role), nullable=False)
+    task_id = DB.Column(DB.String)
+    export_format = DB.Column(DB.Unicode, nullable=False)
+    view_name = DB.Column(DB.Unicode, nullable=False)
+    # pending, running, done or error
+    status = DB.Column(DB.Unicode, nullable=False, default="pending")
+    file_name = DB.Column(DB.Unicode)
+    nb_observations = DB.Column(DB.Integer)
+    creation_date = DB.Column(DB.DateTime, default=datetime.datetime.now)
+    end_date = DB.Column(DB.DateTime)
+
+    role = relationship(User)
+
+    @property
+    def dir_path(self):
+        return Path(current_app.config["MEDIA_FOLDER"]) / "exports" / self.uuid_export.hex
+
+    @property
+    def task_progress(self):
+        if self.task_id is None or self.status != "running":
+            return None
+        result = AsyncResult(self.task_id, app=celery_app)
+        if result.state == "PROGRESS":
+            return result.result["progress"]
+        return 0
+
+
 # defined here to avoid circular dependencies
 source_subquery = (
     select(TSources.id_source, Synthese.id_dataset)
@@ -0,0 +1,130 @@
+import datetime
+import shutil
+
+from celery.schedules import crontab
+from celery.utils.log import get_task_logger
+from flask import current_app, g
+import sqlalchemy as sa
+
+from geonature.core.gn_permissions.tools import get_permissions
+from geonature.core.gn_synthese.models import TExportJob
+from geonature.core.gn_synthese.utils.exports import ObservationsExport
+from geonature.core.notifications.utils import dispatch_notifications
+from geonature.utils import filemanager
+from geonature.utils.celery import celery_app
+from geonature.utils.env import db
+
+logger = get_task_logger(__name__)
+
+
+@celery_app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        crontab(minute=0),
+        clean_export_jobs.s(),
+        name="clean synthese export jobs",
+    )
+
+
+@celery_app.task(bind=True)
+def export_observations(self, id_export, id_list):
+    """
+    Write the observations export file of an export job, then notify its author.
+
+    Parameters
+    ----------
+    id_export : int
+        The ID of the export job.
+    id_list : list of int
+        The id_synthese of the observations to export.
+    """
+    logger.info(f"Starting synthese export {id_export}.")
+    job = db.session.get(TExportJob, id_export)
+    if job is None or job.task_id != self.request.id:
+        logger.warning("Task cancelled, doing nothing.")
+        return
+    job.status = "running"
+    db.session.commit()
+
+    # Permissions are checked as if the author of the export was doing the request
+    g.current_user = job.role
+    permissions = get_permissions(
+        action_code="E", id_role=job.id_role, module_code="SYNTHESE", object_code="ALL"
+    )
+    nb_max = min(len(id_list), current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"]) or 1
+
+    def progress(count):
+        self.update_state(state="PROGRESS", meta={"progress": min(count / nb_max, 1)})
+
+    try:
+        export = ObservationsExport(job.view_name, id_list, permissions)
+        job.dir_path.mkdir(parents=True, exist_ok=True)
+        file_name = filemanager.removeDisallowedFilenameChars(
+            job.creation_date.strftime("%Y_%m_%d_%Hh%Mm%S")
+        )
+        job.nb_observations, job.file_name = export.write(
+            job.export_format, job.dir_path, file_name, progress=progress
+        )
+    except Exception:
+        logger.exception(f"Synthese export {id_export} failed.")
+        db.session.rollback()
+        job = db.session.get(TExportJob, id_export)
+        job.status = "error"
+        job.end_date = datetime.datetime.now()
+        db.session.commit()
+        shutil.rmtree(job.dir_path, ignore_errors=True)
+        return
+
+    logger.info(f"Synthese export {id_export} done.")
+    job.status = "done"
+    job.end_date = datetime.datetime.now()
+
+    # Send element to notification system
+    notify_export_done(job)
+
+    db.session.commit()
+
+
+# Send notification
+def notify_export_done(job: TExportJob):
+    """
+    Notify the author of an export job that its file is ready to be downloaded.
+
+    Parameters
+    ----------
+    job : TExportJob
+        The export job that has finished.
+
+    """
+    dispatch_notifications(
+        code_categories=["SYNTHESE-EXPORT-DONE%"],
+        id_roles=[job.id_role],
+        title="Export terminé",
+        url=(
+            current_app.config["API_ENDPOINT"]
+            + f"/synthese/export_observations/jobs/{job.id_export}/download"
+        ),
+        context={
+            "export": job,
+            "url_notification_rules": current_app.config["URL_APPLICATION"]
+            + "/#/notification/rules",
+        },
+    )
+
+
+@celery_app.task(bind=True)
+def clean_export_jobs(self):
+    """
+    Remove export jobs, and their files, older than SYNTHESE.EXPORT_JOBS_RETENTION days.
+    """
+    retention = current_app.config["SYNTHESE"]["EXPORT_JOBS_RETENTION"]
+    expired_jobs = db.session.scalars(
+        sa.select(TExportJob).where(
+            TExportJob.creation_date < datetime.datetime.now() - datetime.timedelta(days=retention)
+        )
+    ).all()
+    logger.info(f"Cleaning {len(expired_jobs)} synthese export jobs...")
+    for job in expired_jobs:
+        shutil.rmtree(job.dir_path, ignore_errors=True)
+        db.session.delete(job)
+    db.session.commit()
@@ -0,0 +1,378 @@
+"""
+Export of synthese observations, shared by the synchronous export route and the export jobs.
+"""
+
+import datetime
+import decimal
+import json
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from flask import current_app, g
+from sqlalchemy import DateTime, case, func, select, tuple_, union_all
+from werkzeug.exceptions import BadRequest, Forbidden
+
+from geonature.core.gn_synthese.models import Synthese, SyntheseLogEntry
+from geonature.core.gn_synthese.utils.blurring import (
+    build_allowed_geom_cte,
+    build_blurred_precise_geom_queries,
+    split_blurring_precise_permissions,
+)
+from geonature.core.gn_synthese.utils.query_select_sqla import SyntheseQuery
+from geonature.utils.env import DB, db
+from geonature.utils.srid import get_srid
+from geonature.utils.utilscsv import generate_csv_chunks
+from geonature.utils.utilsgeometrytools import (
+    EXPORT_BATCH_SIZE,
+    EXPORT_STREAM_OPTIONS,
+    export_as_geo_file,
+)
+
+from utils_flask_sqla_geo.generic import GenericTableGeo
+
+
+DEFAULT_EXPORT_VIEW = "gn_synthese.v_synthese_for_export"
+
+# Most recent changes are left for the next incremental export, as the transactions
+# which made them (dated from their start) may not be committed yet
+SYNC_MARGIN = datetime.timedelta(minutes=5)
+
+# Parquet type of the columns whose python type is known, other columns are written as strings
+PARQUET_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    decimal.Decimal: pa.float64(),
+    datetime.date: pa.date32(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.time: pa.time64("us"),
+}
+
+
+def parquet_field(column):
+    """
+    Return the parquet field of a column of an export view and the function
+    converting its values to the parquet type.
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    if python_type in PARQUET_TYPES:
+        arrow_type = PARQUET_TYPES[python_type]
+        if isinstance(column.type, DateTime) and column.type.timezone:
+            arrow_type = pa.timestamp("us", tz="UTC")
+        convert = float if python_type is decimal.Decimal else None
+    else:
+        arrow_type = pa.string()
+
+        def convert(value):
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, default=str)
+            return str(value)
+
+    return pa.field(column.key, arrow_type), convert
+
+
+class ObservationsExport:
+    """
+    Query of the observations to export from an export view, filtered with the permissions
+    of the current user (g.current_user), blurring sensitive geometries when needed.
+
+    :param view_name: export view, as "schema.view_name"
+    :param id_list: list of id_synthese to export
+    :param permissions: export ("E") permissions of the current user in the SYNTHESE module
+    """
+
+    def __init__(self, view_name, id_list, permissions):
+        self.view_name = view_name
+        config_view = {
+            "view_name": "gn_synthese.v_synthese_for_web_app",
+            "geojson_4326_field": "geojson_4326",
+            "geojson_local_field": "geojson_local",
+        }
+        # Test export view name is config params for security reason
+        if view_name != DEFAULT_EXPORT_VIEW:
+            try:
+                config_view = next(
+                    _view
+                    for _view in current_app.config["SYNTHESE"]["EXPORT_OBSERVATIONS_CUSTOM_VIEWS"]
+                    if _view["view_name"] == view_name
+                )
+            except StopIteration:
+                raise Forbidden("This view is not available for export")
+
+        self.geojson_4326_field = config_view["geojson_4326_field"]
+        self.geojson_local_field = config_view["geojson_local_field"]
+        try:
+            schema_name, table_name = view_name.split(".")
+        except ValueError:
+            raise BadRequest("view_name parameter must be a string with schema dot view_name")
+
+        # Get the SRID for the export
+        local_srid = get_srid("gn_synthese", "synthese", "the_geom_local")
+
+        blurring_permissions, precise_permissions = split_blurring_precise_permissions(permissions)
+
+        # Get the view for export
+        # Useful to have geom column so that they can be replaced by blurred geoms
+        # (only if the user has sensitive permissions)
+        self.export_view = export_view = GenericTableGeo(
+            tableName=table_name,
+            schemaName=schema_name,
+            engine=DB.engine,
+            geometry_field=None,
+            srid=local_srid,
+        )
+        mandatory_columns = {"id_synthese", self.geojson_4326_field, self.geojson_local_field}
+        if not mandatory_columns.issubset(set(map(lambda col: col.name, export_view.db_cols))):
+            raise BadRequest(
+                f"The view {table_name} miss one of required columns {str(mandatory_columns)}"
+            )
+
+        # If there is no sensitive permissions => same path as before blurring implementation
+        if not blurring_permissions:
+            # Get the CTE for synthese filtered by user permissions
+            synthese_query_class = SyntheseQuery(
+                Synthese,
+                select(Synthese.id_synthese),
+                {},
+            )
+            synthese_query_class.filter_query_all_filters(g.current_user, permissions)
+            cte_synthese_filtered = synthese_query_class.build_query().cte("cte_synthese_filtered")
+            selectable_columns = [export_view.tableDef]
+        else:
+            # Use slightly the same process as for get_observations_for_web()
+            # Add a where_clause to filter the id_synthese provided to reduce the
+            # UNION queries
+            where_clauses = [Synthese.id_synthese.in_(id_list)]
+            blurred_geom_query, precise_geom_query = build_blurred_precise_geom_queries(
+                filters={}, where_clauses=where_clauses
+            )
+
+            cte_synthese_filtered = build_allowed_geom_cte(
+                blurring_permissions=blurring_permissions,
+                precise_permissions=precise_permissions,
+                blurred_geom_query=blurred_geom_query,
+                precise_geom_query=precise_geom_query,
+                limit=current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"],
+            )
+
+            # Overwrite geometry columns to compute the blurred geometry from the blurring cte
+            columns_with_geom_excluded = [
+                col
+                for col in export_view.tableDef.columns
+                if col.name
+                not in [
+                    "geometrie_wkt_4326",  # FIXME: hardcoded column names?
+                    "x_centroid_4326",
+                    "y_centroid_4326",
+                    self.geojson_4326_field,
+                    self.geojson_local_field,
+                ]
+            ]
+            # Recomputed the blurred geometries
+            blurred_geom_columns = [
+                func.st_astext(cte_synthese_filtered.c.geom).label("geometrie_wkt_4326"),
+                func.st_x(func.st_centroid(cte_synthese_filtered.c.geom)).label("x_centroid_4326"),
+                func.st_y(func.st_centroid(cte_synthese_filtered.c.geom)).label("y_centroid_4326"),
+                func.st_asgeojson(cte_synthese_filtered.c.geom).label(self.geojson_4326_field),
+                func.st_asgeojson(
+                    func.st_transform(cte_synthese_filtered.c.geom, local_srid)
+                ).label(self.geojson_local_field),
+            ]
+
+            # Finally provide all the columns to be selected in the export query
+            selectable_columns = columns_with_geom_excluded + blurred_geom_columns
+
+        # Get the query for export
+        export_query = (
+            select(*selectable_columns)
+            .select_from(
+                export_view.tableDef.join(
+                    cte_synthese_filtered,
+                    cte_synthese_filtered.c.id_synthese
+                    == export_view.tableDef.columns["id_synthese"],
+                )
+            )
+            .where(export_view.tableDef.columns["id_synthese"].in_(id_list))
+            .distinct(export_view.tableDef.columns["id_synthese"])
+        )
+        if blurring_permissions:
+            # When blurring permission,to ensure the 'distinct on' priorise entry with higher priority (blurred obs => priority = 2 ; precise obs => priority = 1)
+            # Check https://www.postgresql.org/docs/9.0/sql-select.html#SQL-DISTINCT for more details
+            export_query = export_query.order_by(
+                export_view.tableDef.columns["id_synthese"], cte_synthese_filtered.c.priority.asc()
+            )
+        self.query = export_query.limit(current_app.config["SYNTHESE"]["NB_MAX_OBS_EXPORT"])
+
+        self.db_cols_for_shape = []
+        self.columns_to_serialize = []
+        # loop over synthese config to exclude columns if its default export
+        for db_col in export_view.db_cols:
+            if view_name == DEFAULT_EXPORT_VIEW:
+                if db_col.key in current_app.config["SYNTHESE"]["EXPORT_COLUMNS"]:
+                    self.db_cols_for_shape.append(db_col)
+                    self.columns_to_serialize.append(db_col.key)
+            else:
+                # remove geojson fields of serialization
+                if db_col.key not in [self.geojson_4326_field, self.geojson_local_field]:
+                    self.db_cols_for_shape.append(db_col)
+                    self.columns_to_serialize.append(db_col.key)
+
+    def execute(self, stream=False):
+        """
+        Execute the export query. If stream is True, rows are fetched in batches
+        from a server-side cursor instead of being all loaded in memory.
+        """
+        execution_options = EXPORT_STREAM_OPTIONS if stream else {}
+        return db.session.execute(self.query, execution_options=execution_options)
+
+    def as_dict(self, row):
+        return self.export_view.as_dict(row, fields=self.columns_to_serialize)
+
+    def write(self, export_format, dir_path, file_name, progress=None):
+        """
+        Write the exported observations in a file of dir_path, streaming rows from the database.
+
+        :param export_format: "csv", "geojson", "shapefile", "gpkg" or "parquet"
+        :param dir_path: directory where the file is written
+        :param file_name: file name, without extension
+        :param progress: optional callable receiving the number of rows written so far
+        :returns: the number of exported rows and the name of the written file
+        """
+        dir_path = Path(dir_path)
+        count = 0
+
+        def rows():
+            nonlocal count
+            for row in self.execute(stream=True):
+                yield row
+                count += 1
+                if progress is not None and count % EXPORT_BATCH_SIZE == 0:
+                    progress(count)
+
+        if export_format == "csv":
+            file_name = f"{file_name}.csv"
+            with open(dir_path / file_name, "w", newline="") as f:
+                f.writelines(
+                    generate_csv_chunks(
+                        (self.as_dict(row) for row in rows()), self.columns_to_serialize
+                    )
+                )
+        elif export_format == "geojson":
+            file_name = f"{file_name}.geojson"
+            with open(dir_path / file_name, "w") as f:
+                f.write('{"type": "FeatureCollection", "features": [')
+                for row in rows():
+                    feature = {
+                        "type": "Feature",
+                        "geometry": json.loads(getattr(row, self.geojson_4326_field)),
+                        "properties": self.as_dict(row),
+                    }
+                    f.write(("," if count else "") + current_app.json.dumps(feature))
+                f.write("]}")
+        elif export_format == "parquet":
+            file_name = f"{file_name}.parquet"
+            self.write_parquet(dir_path / file_name, rows())
+        else:
+            _, file_name = export_as_geo_file(
+                export_format=export_format,
+                export_view=self.export_view,
+                db_cols=self.db_cols_for_shape,
+                geojson_col=self.geojson_local_field,
+                data=rows(),
+                file_name=file_name,
+                dir_path=dir_path,
+            )
+        return count, file_name
+
+    def write_parquet(self, file_path, rows):
+        """
+        Write rows in a GeoParquet file, one row group per batch of EXPORT_BATCH_SIZE rows.
+        Columns keep the type of the export view columns, the geometry (in WGS84)
+        is written in WKB in a "geometry" column.
+        """
+        columns = self.export_view.tableDef.columns
+        fields, converters = zip(
+            *(parquet_field(columns[key]) for key in self.columns_to_serialize)
+        )
+        schema = pa.schema([*fields, pa.field("geometry", pa.binary())])
+        # https://geoparquet.org/releases/v1.1.0/ ; no crs means OGC:CRS84 (WGS84 lon/lat)
+        geo_metadata = {
+            "version": "1.1.0",
+            "primary_column": "geometry",
+            "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}},
+        }
+        schema = schema.with_metadata({"geo": json.dumps(geo_metadata)})
+
+        def batches():
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == EXPORT_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        with pq.ParquetWriter(file_path, schema) as writer:
+            for batch in batches():
+                arrays = []
+                for field, convert in zip(fields, converters):
+                    values = [row._mapping[field.name] for row in batch]
+                    if convert is not None:
+                        values = [None if v is None else convert(v) for v in values]
+                    arrays.append(pa.array(values, type=field.type))
+                geometries = shapely.from_geojson(
+                    [getattr(row, self.geojson_4326_field) for row in batch]
+                )
+                arrays.append(pa.array(shapely.to_wkb(geometries), type=pa.binary()))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def get_synthese_changes(since=None, after_id=None, limit=None, with_deletions=True):
+    """
+    Return the observations inserted ("I"), updated ("U") or deleted ("D") after a date,
+    as (id_synthese, last_action, action_date) sorted by action date then id_synthese.
+
+    :param since: only return changes made after this date, all changes if None
+    :param after_id: with since, also return changes made at this date on observations
+        with a greater id_synthese (to resume an export truncated to limit changes)
+    :param limit: maximum number of changes
+    :param with_deletions: also return deleted observations
+    """
+    action_date = func.coalesce(Synthese.meta_update_date, Synthese.meta_create_date)
+    upserts = select(
+        Synthese.id_synthese.label("id_synthese"),
+        case((Synthese.meta_create_date < Synthese.meta_update_date, "U"), else_="I").label(
+            "last_action"
+        ),
+        action_date.label("action_date"),
+    ).where(action_date <= func.now() - SYNC_MARGIN)
+    deletions = select(
+        SyntheseLogEntry.id_synthese,
+        SyntheseLogEntry.last_action,
+        SyntheseLogEntry.meta_last_action_date,
+    ).where(
+        SyntheseLogEntry.last_action == "D",
+        SyntheseLogEntry.meta_last_action_date <= func.now() - SYNC_MARGIN,
+    )
+    if since is not None:
+        # Filter each part of the union so that their indexes are used
+        if after_id is None:
+            upserts = upserts.where(action_date > since)
+            deletions = deletions.where(SyntheseLogEntry.meta_last_action_date > since)
+        else:
+            upserts = upserts.where(
+                tuple_(action_date, Synthese.id_synthese) > tuple_(since, after_id)
+            )
+            deletions = deletions.where(
+                tuple_(SyntheseLogEntry.meta_last_action_date, SyntheseLogEntry.id_synthese)
+                > tuple_(since, after_id)
+            )
+    changes = (union_all(upserts, deletions) if with_deletions else upserts).subquery()
+    query = select(changes).order_by(changes.c.action_date, changes.c.id_synthese).limit(limit)
+    return db.session.execute(query).all()
@@ -17,12 +17,14 @@ import sqlalchemy as sa
 from sqlalchemy import func, or_, and_, select, distinct, inspect
 from sqlalchemy.sql import text
 from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import ARRAY
 from werkzeug.exceptions import BadRequest
 from shapely.geometry import shape
 from geoalchemy2.shape import from_shape
 from geoalchemy2.types import Geography, Geometry
 
 from geonature.utils.env import DB
+from geonature.utils.srid import get_srid
 
 from geonature.core.gn_synthese.models import (
     CorObserverSynthese,
@@ -35,6 +37,7 @@ from geonature.core.gn_meta.models import (
     CorDatasetActor,
     TDatasets,
 )
+from geonature.core.gn_meta.scope_cache import get_allowed_datasets_ids
 from geonature.utils.errors import GeonatureApiError
 from apptax.taxonomie.models import (
     Taxref,
@@ -113,12 +116,8 @@ class SyntheseQuery:
         # For aliased models, we need to use inspect() and the class_ attribute
         # to get the real table
         geom_table = inspect(self.geom_column.class_).mapper.local_table
-        self.srid = DB.session.scalar(
-            select(func.Find_SRID(geom_table.schema, geom_table.name, self.geom_column.key))
-        )
-        self.srid_l_areas = DB.session.scalar(
-            select(func.Find_SRID(LAreas.__table__.schema, LAreas.__table__.name, "geom"))
-        )
+        self.srid = get_srid(geom_table.schema, geom_table.name, self.geom_column.key)
+        self.srid_l_areas = get_srid(LAreas.__table__.schema, LAreas.__table__.name, "geom")
 
     def add_join(
         self, right_table, right_column, left_column, join_type: JoinType = JoinType.INNER
@@ -154,6 +153,16 @@ class SyntheseQuery:
                 # push the joined table in _already_joined_table list
                 self._already_joined_table.append(right_table)
 
+    def filter_allowed_datasets(self, user, scope):
+        """
+        Return a where clause restricting the query to the datasets allowed for the given scope.
+        The list of datasets is passed as a single array parameter rather than an IN list.
+        """
+        allowed_datasets = get_allowed_datasets_ids(scope, user=user)
+        return self.model_id_dataset_column == sa.any_(
+            sa.bindparam("allowed_datasets", allowed_datasets, type_=ARRAY(sa.Integer), unique=True)
+        )
+
     def build_permissions_filter(self, user, permissions):
         """
         Return a where clause for the given permissions set
@@ -164,7 +173,6 @@ class SyntheseQuery:
             .select_from(CorObserverSynthese)
             .where(CorObserverSynthese.id_role == user.id_role)
         )
-        datasets_by_scope = {}  # to avoid fetching datasets several time for same scope
         permissions_filters = []
         excluded_sensitivity = None
         for perm in permissions:
@@ -193,19 +201,11 @@ class SyntheseQuery:
                     )
                 )
             if perm.scope_value:
-                if perm.scope_value not in datasets_by_scope:
-                    datasets_t = (
-                        DB.session.scalars(TDatasets.filter_by_scope(perm.scope_value))
-                        .unique()
-                        .all()
-                    )
-                    datasets_by_scope[perm.scope_value] = [d.id_dataset for d in datasets_t]
-                datasets = datasets_by_scope[perm.scope_value]
                 scope_filters = [
                     self.model_id_syn_col.in_(subquery_observers),  # user is observer
                     self.model_id_digitiser_column == user.id_role,  # user id digitizer
-                    self.model_id_dataset_column.in_(
-                        datasets
+                    self.filter_allowed_datasets(
+                        user, perm.scope_value
                     ),  # user is dataset (or parent af) actor
                 ]
                 perm_filters.append(or_(*scope_filters))
@@ -260,9 +260,7 @@ class SyntheseQuery:
                 self.model_id_syn_col.in_(subquery_observers),
                 self.model_id_digitiser_column == user.id_role,
             ]
-            datasets = DB.session.scalars(TDatasets.filter_by_scope(scope)).unique().all()
-            allowed_datasets = [dataset.id_dataset for dataset in datasets]
-            ors_filters.append(self.model_id_dataset_column.in_(allowed_datasets))
+            ors_filters.append(self.filter_allowed_datasets(user, scope))
 
             self.query = self.query.where(or_(*ors_filters))
 
@@ -5,6 +5,7 @@ from itertools import product
 from datetime import datetime
 
 from geonature.core.imports.checks.errors import ImportCodeError
+import numpy as np
 import pandas as pd
 from sqlalchemy.sql import sqltypes
 from sqlalchemy.dialects.postgresql import UUID as UUIDType
@@ -13,6 +14,27 @@ from geonature.core.imports.models import BibFields, Entity
 from .utils import dataframe_check
 
 
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+]
+TIME_FORMATS = [
+    None,
+    "%H",
+    "%H-%M",
+    "%H-%M-%S",
+    "%H-%M-%S-%f",
+    "%Hh",
+    "%Hh%M",
+    "%Hh%Mm",
+    "%Hh%Mm%Ss",
+]
+DATETIME_FORMATS = [
+    (date_format + " " + time_format) if time_format else date_format
+    for date_format, time_format in product(DATE_FORMATS, TIME_FORMATS)
+]
+
+
 def convert_to_datetime(value_raw):
     """
     Try to convert a date string to a datetime object.
@@ -34,23 +56,7 @@ def convert_to_datetime(value_raw):
     value = value_raw.strip()
     value = re.sub("[ ]+", " ", value)
     value = re.sub("[/.:]", "-", value)
-    date_formats = [
-        "%Y-%m-%d",
-        "%d-%m-%Y",
-    ]
-    time_formats = [
-        None,
-        "%H",
-        "%H-%M",
-        "%H-%M-%S",
-        "%H-%M-%S-%f",
-        "%Hh",
-        "%Hh%M",
-        "%Hh%Mm",
-        "%Hh%Mm%Ss",
-    ]
-    for date_format, time_format in product(date_formats, time_formats):
-        fmt = (date_format + " " + time_format) if time_format else date_format
+    for fmt in DATETIME_FORMATS:
         try:
             converted_date = datetime.strptime(value, fmt)
             break  # If successful conversion, will stop the loop
@@ -66,6 +72,50 @@ def convert_to_datetime(value_raw):
     return converted_date
 
 
+def convert_series_to_datetime(values: pd.Series) -> pd.Series:
+    """
+    Convert a series of date strings to datetime objects, accepting the same values as
+    `convert_to_datetime`.
+
+    Each distinct value is converted once. Values are normalized with pandas string
+    operations, then each format is tried with `pd.to_datetime` on values not yet converted.
+    Remaining values (microseconds, ISO format, dates outside of pandas bounds, …) are
+    converted with `convert_to_datetime`.
+
+    Parameters
+    ----------
+    values : pandas.Series
+        The input strings to convert
+
+    Returns
+    -------
+    pandas.Series
+        The converted datetime objects, null where the conversion failed
+    """
+    uniques = pd.Series(values.dropna().unique(), dtype=object)
+    normalized = (
+        uniques.str.strip()
+        .str.replace("[ ]+", " ", regex=True)
+        .str.replace("[/.:]", "-", regex=True)
+    )
+    converted = np.full(len(uniques) + 1, None, dtype=object)  # last item for null values
+    remaining = normalized.notna()
+    for fmt in DATETIME_FORMATS:
+        # pandas accepts more than 6 digits for %f, leave microseconds to convert_to_datetime
+        if "%f" in fmt:
+            continue
+        if not remaining.any():
+            break
+        parsed = pd.to_datetime(normalized[remaining], format=fmt, errors="coerce")
+        parsed = parsed[parsed.notna()]
+        converted[parsed.index] = parsed.astype(object).to_numpy()
+        remaining[parsed.index] = False
+    remaining = remaining | normalized.isna()
+    converted[remaining[remaining].index] = uniques[remaining].map(convert_to_datetime)
+    positions = pd.Index(uniques).get_indexer(values)
+    return pd.Series(converted[positions], index=values.index, name=values.name)
+
+
 def convert_to_uuid(value):
     try:
         UUID(str(value))
@@ -113,7 +163,7 @@ def check_datetime_field(
     The error codes are:
         - INVALID_DATE: the value is not of datetime type.
     """
-    datetime_col = df[source_field].apply(lambda x: convert_to_datetime(x) if pd.notnull(x) else x)
+    datetime_col = convert_series_to_datetime(df[source_field])
     if required:
         invalid_rows = df[datetime_col.isna()]
     else:
@@ -419,8 +469,36 @@ def check_anytype_field(
     return updated_cols
 
 
+def get_column_types(entity: Entity) -> Dict[str, sqltypes.TypeEngine]:
+    """
+    Return the types of the columns of the destination table of an entity, completed
+    with the columns of the transient table which are unused in the destination table.
+
+    Parameters
+    ----------
+    entity : Entity
+        The entity whose columns types are returned.
+
+    Returns
+    -------
+    Dict[str, sqltypes.TypeEngine]
+        The type of each column, by column name.
+    """
+    transient_table = entity.destination.get_transient_table()
+    destination_table = entity.get_destination_table()
+    return {
+        **{column.name: column.type for column in transient_table.c},
+        **{column.name: column.type for column in destination_table.c},
+    }
+
+
 @dataframe_check
-def check_types(entity: Entity, df: pd.DataFrame, fields: Dict[str, BibFields]) -> Set[str]:
+def check_types(
+    entity: Entity,
+    df: pd.DataFrame,
+    fields: Dict[str, BibFields],
+    column_types: Optional[Dict[str, sqltypes.TypeEngine]] = None,
+) -> Set[str]:
     """
     Check the types of columns in a dataframe based on the provided fields.
 
@@ -432,6 +510,9 @@ def check_types(entity: Entity, df: pd.DataFrame, fields: Dict[str, BibFields])
         The dataframe to check.
     fields : Dict[str, BibFields]
         A dictionary mapping column names to their corresponding BibFields.
+    column_types : Dict[str, sqltypes.TypeEngine], optional
+        The types of the entity columns, as returned by get_column_types. If given,
+        the check does not access the database.
 
     Returns
     -------
@@ -439,8 +520,8 @@ def check_types(entity: Entity, df: pd.DataFrame, fields: Dict[str, BibFields])
         Set containing the names of updated columns.
     """
     updated_cols = set()
-    destination_table = entity.get_destination_table()
-    transient_table = entity.destination.get_transient_table()
+    if column_types is None:
+        column_types = get_column_types(entity)
     for name, field in fields.items():
         if not field.dest_field:
             continue
@@ -449,15 +530,11 @@ def check_types(entity: Entity, df: pd.DataFrame, fields: Dict[str, BibFields])
         if field.mnemonique:  # set from content mapping
             continue
         assert entity in [ef.entity for ef in field.entities]  # FIXME
-        if field.dest_field in destination_table.c:
-            field_type = destination_table.c[field.dest_field].type
-        else:  # we may require to convert some columns unused in final destination
-            field_type = transient_table.c[field.dest_field].type
         updated_cols |= yield from map(
             lambda error: {"column": name, **error},
             check_anytype_field(
                 df,
-                field_type=field_type,
+                field_type=column_types[field.dest_field],
                 source_col=field.source_column,
                 dest_col=field.dest_field,
                 required=False,
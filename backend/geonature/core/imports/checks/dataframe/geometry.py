@@ -1,18 +1,18 @@
-from functools import partial
-
 from geonature.core.imports.checks.errors import ImportCodeError
 from geonature.core.imports.models import BibFields
 import sqlalchemy as sa
-from geoalchemy2.functions import ST_Transform, ST_GeomFromWKB, ST_GeomFromText
+from geoalchemy2.functions import ST_Transform, ST_GeomFromText
+import numpy as np
 import pandas as pd
-from shapely import wkt
-from shapely.geometry import Point, Polygon
+import shapely
+from shapely.geometry import Polygon
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import transform
 from pyproj import CRS, Transformer
 from ref_geo.models import LAreas
 
 from geonature.utils.env import db
+from geonature.utils.srid import get_local_srid
 
 from .utils import dataframe_check
 
@@ -27,22 +27,68 @@ def get_srid_bounding_box(srid):
     return transform(projection.transform, bounding_polygon_4326)
 
 
-def wkt_to_geometry(value):
-    try:
-        return wkt.loads(value)
-    except Exception:
-        return None
+def wkt_to_geometries(values: pd.Series) -> pd.Series:
+    """
+    Parse WKT values into shapely geometries, invalid WKT are converted to None.
+    """
+    return pd.Series(
+        shapely.from_wkt(values.to_numpy(dtype=object), on_invalid="ignore"),
+        index=values.index,
+        dtype="object",
+    )
+
+
+def xy_to_geometries(x: pd.Series, y: pd.Series) -> pd.Series:
+    """
+    Build shapely points from x/y values, with comma or dot as decimal separator.
+    Invalid coordinates are converted to None.
+    """
+
+    def to_float(values):
+        return pd.to_numeric(
+            values.astype("string").str.replace(",", ".", regex=False), errors="coerce"
+        ).to_numpy(dtype=float, na_value=np.nan)
 
+    index = x.index
+    x, y = to_float(x), to_float(y)
+    points = shapely.points(x, y).astype(object)
+    points[np.isnan(x) | np.isnan(y)] = None
+    return pd.Series(points, index=index, dtype="object")
 
-def xy_to_geometry(x, y):
-    try:
-        return Point(float(x.replace(",", ".")), float(y.replace(",", ".")))
-    except Exception:
-        return None
 
+def transform_geometries(geometries: pd.Series, from_srid: int, to_srid: int) -> pd.Series:
+    """
+    Reproject geometries with pyproj. As with ST_Transform, Z coordinates are kept
+    (and transformed) for 3D geometries.
+    """
+    transformer = Transformer.from_crs(CRS(int(from_srid)), CRS(int(to_srid)), always_xy=True)
+
+    def transform_coords(coords):
+        return np.column_stack(transformer.transform(*coords.T))
 
-def check_bound(p, bounding_box: Polygon):
-    return p.within(bounding_box)
+    values = geometries.to_numpy(dtype=object)
+    has_z = shapely.has_z(values)
+    transformed = np.empty(len(values), dtype=object)
+    # 2D and 3D geometries are transformed apart: pyproj returns NaN coordinates for
+    # the NaN Z that shapely gives to 2D geometries with include_z
+    transformed[~has_z] = shapely.transform(values[~has_z], transform_coords)
+    transformed[has_z] = shapely.transform(values[has_z], transform_coords, include_z=True)
+    return pd.Series(transformed, index=geometries.index, dtype="object")
+
+
+def to_ewkb(geometries: pd.Series, srid: int) -> pd.Series:
+    """
+    Convert geometries to hex-encoded EWKB with the given SRID.
+    """
+    return pd.Series(
+        shapely.to_wkb(
+            shapely.set_srid(geometries.to_numpy(dtype=object), srid),
+            hex=True,
+            include_srid=True,
+        ),
+        index=geometries.index,
+        dtype="object",
+    )
 
 
 def check_geometry_inside_l_areas(geometry: BaseGeometry, id_area: int, geom_srid: int):
@@ -66,7 +112,7 @@ def check_wkt_inside_area_id(wkt: str, id_area: int, wkt_srid: int):
     wkt_srid : str
         srid of the provided wkt
     """
-    local_srid = db.session.execute(sa.func.Find_SRID("ref_geo", "l_areas", "geom")).scalar()
+    local_srid = get_local_srid()
 
     return db.session.scalar(
         sa.exists(LAreas)
@@ -136,7 +182,7 @@ def check_geometry(
 
     """
 
-    local_srid = db.session.execute(sa.func.Find_SRID("ref_geo", "l_areas", "geom")).scalar()
+    local_srid = get_local_srid()
     file_srid_bounding_box = get_srid_bounding_box(file_srid)
 
     wkt_col = wkt_field.source_field if wkt_field else None
@@ -151,7 +197,7 @@ def check_geometry(
     if wkt_col and wkt_col in df:
         wkt_mask = df[wkt_col].notnull()
         if wkt_mask.any():
-            geom.loc[wkt_mask] = df[wkt_mask][wkt_col].apply(wkt_to_geometry)
+            geom.loc[wkt_mask] = wkt_to_geometries(df.loc[wkt_mask, wkt_col])
             invalid_wkt = df[wkt_mask & geom.isnull()]
             if not invalid_wkt.empty:
                 yield {
@@ -165,8 +211,8 @@ def check_geometry(
         # take xy when no wkt and xy are not null
         xy_mask = df[latitude_col].notnull() & df[longitude_col].notnull()
         if xy_mask.any():
-            geom.loc[xy_mask] = df[xy_mask].apply(
-                lambda row: xy_to_geometry(row[longitude_col], row[latitude_col]), axis=1
+            geom.loc[xy_mask] = xy_to_geometries(
+                df.loc[xy_mask, longitude_col], df.loc[xy_mask, latitude_col]
             )
             invalid_xy = df[xy_mask & geom.isnull()]
             if not invalid_xy.empty:
@@ -189,13 +235,15 @@ def check_geometry(
         }
 
     # Check out-of-bound geo-referencement
+    bound = pd.Series(
+        shapely.within(geom.to_numpy(dtype=object), file_srid_bounding_box),
+        index=geom.index,
+    )
     for mask, column in [(wkt_mask, "WKT"), (xy_mask, "longitude")]:
-        bound = geom[mask & geom.notnull()].apply(
-            partial(check_bound, bounding_box=file_srid_bounding_box)
-        )
-        out_of_bound = df[mask & ~bound]
+        out_of_bound_mask = mask & geom.notnull() & ~bound
+        out_of_bound = df[out_of_bound_mask]
         if len(out_of_bound):
-            geom.loc[mask & ~bound] = None
+            geom.loc[out_of_bound_mask] = None
             yield {
                 "error_code": ImportCodeError.GEOMETRY_OUT_OF_BOX,
                 "column": column,
@@ -232,27 +280,22 @@ def check_geometry(
             "invalid_rows": multiple_code,
         }
 
+    # Geometries are written back as EWKB, reprojected here when the file SRID
+    # is neither 4326 nor the local SRID
+    geom = geom[geom.notna()]
     if file_srid == 4326:
         geom_4326_col = geom_4326_field.dest_field
-        df[geom_4326_col] = geom[geom.notna()].apply(
-            lambda g: ST_GeomFromWKB(g.wkb, file_srid),
-        )
+        df[geom_4326_col] = to_ewkb(geom, 4326)
         # geom_local will be defined in SQL
         return {geom_4326_col}
     elif file_srid == local_srid:
         geom_local_col = geom_local_field.dest_field
-        df[geom_local_col] = geom[geom.notna()].apply(
-            lambda g: ST_GeomFromWKB(g.wkb, file_srid),
-        )
+        df[geom_local_col] = to_ewkb(geom, local_srid)
         # geom_4326 will be defined in SQL
         return {geom_local_col}
     else:
         geom_4326_col = geom_4326_field.dest_field
         geom_local_col = geom_local_field.dest_field
-        df[geom_4326_col] = geom[geom.notna()].apply(
-            lambda g: ST_Transform(ST_GeomFromWKB(g.wkb, file_srid), 4326),
-        )
-        df[geom_local_col] = geom[geom.notna()].apply(
-            lambda g: ST_Transform(ST_GeomFromWKB(g.wkb, file_srid), local_srid),
-        )
+        df[geom_4326_col] = to_ewkb(transform_geometries(geom, file_srid, 4326), 4326)
+        df[geom_local_col] = to_ewkb(transform_geometries(geom, file_srid, local_srid), local_srid)
         return {geom_4326_col, geom_local_col}
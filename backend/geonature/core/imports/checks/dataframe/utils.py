@@ -1,15 +1,25 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from functools import wraps
 from inspect import signature
+import multiprocessing
 
-from sqlalchemy import func
+from flask import current_app
+from sqlalchemy import event, func
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from geonature.utils.env import db
 
-from geonature.core.imports.models import ImportUserError, ImportUserErrorType
+from geonature.core.imports.models import ImportUserError, get_error_type
 from geonature.core.imports.utils import generated_fields
 
+# In a check worker process, errors are collected here instead of being reported:
+# they are reported by the calling process, see check_dataframe_batches.
+_collected_errors = None
+_check_batch = None
+_parent_state = None
+
 
 def dataframe_check(check_function):
     """
@@ -34,7 +44,10 @@ def dataframe_check(check_function):
         try:
             while True:
                 error = next(errors)
-                updated_cols |= report_error(imprt, entity, df, error) or set()
+                if _collected_errors is not None:
+                    _collected_errors.append(error)
+                else:
+                    updated_cols |= report_error(imprt, entity, df, error) or set()
         except StopIteration as e:
             updated_cols |= e.value or set()
         return updated_cols
@@ -138,7 +151,7 @@ def report_error(imprt, entity, df, error):
     if error["invalid_rows"].empty:
         return
     try:
-        error_type = ImportUserErrorType.query.filter_by(name=error["error_code"]).one()
+        error_type = get_error_type(error["error_code"])
     except NoResultFound:
         raise Exception(f"Error code '{error['error_code']}' not found.")
     invalid_rows = error["invalid_rows"]
@@ -169,3 +182,84 @@ def report_error(imprt, entity, df, error):
     )
     db.session.execute(stmt)
     return {entity.validity_column}
+
+
+def check_dataframe_batches(imprt, entity, batches, check_batch):
+    """
+    Run dataframe checks which do not access the database on each batch of an import.
+
+    If IMPORT.DATAFRAME_CHECK_WORKERS is greater than 1, batches are checked in parallel
+    by a pool of forked processes, which have no database access. Errors found by the
+    workers are reported by the calling process, in its transaction.
+
+    Parameters
+    ----------
+    imprt : TImports
+        The import to check.
+    entity : Entity
+        The entity to check.
+    batches : Iterator[pd.DataFrame]
+        The dataframes to check.
+    check_batch : callable
+        Function running the checks on a dataframe, returning the set of updated columns.
+        Everything it needs from the database must be loaded beforehand.
+
+    Yields
+    ------
+    Tuple[pd.DataFrame, Set[str]]
+        Each checked dataframe with its updated columns, in the order of batches.
+    """
+    workers = current_app.config["IMPORT"]["DATAFRAME_CHECK_WORKERS"]
+    if workers <= 1:
+        for df in batches:
+            yield df, check_batch(df)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_check_worker,
+        initargs=(check_batch,),
+    ) as executor:
+        pending = deque()
+        for df in batches:
+            pending.append(executor.submit(_check_batch_in_worker, df))
+            # Keep every worker busy while the calling process reports errors
+            if len(pending) >= 2 * workers:
+                yield _report_batch_errors(imprt, entity, *pending.popleft().result())
+        while pending:
+            yield _report_batch_errors(imprt, entity, *pending.popleft().result())
+
+
+def _refuse_connection(*args, **kwargs):
+    raise RuntimeError("Dataframe check workers must not access the database")
+
+
+def _init_check_worker(check_batch):
+    global _collected_errors, _check_batch, _parent_state
+    # The forked process shares the connections of the calling process, which must neither
+    # be used nor closed: loaded objects are detached from the session, which is kept
+    # referenced with the connection pool, and new connections are refused.
+    _parent_state = (db.session.registry(), db.engine.pool)
+    _parent_state[0].expunge_all()
+    db.session.registry.clear()
+    db.engine.dispose(close=False)
+    event.listen(db.engine, "do_connect", _refuse_connection)
+    _collected_errors = []
+    _check_batch = check_batch
+
+
+def _check_batch_in_worker(df):
+    _collected_errors.clear()
+    updated_cols = _check_batch(df)
+    # Only the index and line numbers of invalid rows are needed to report errors
+    errors = [
+        {**error, "invalid_rows": error["invalid_rows"][["line_no"]]} for error in _collected_errors
+    ]
+    return df, updated_cols, errors
+
+
+def _report_batch_errors(imprt, entity, df, updated_cols, errors):
+    for error in errors:
+        updated_cols |= report_error(imprt, entity, df, error) or set()
+    return df, updated_cols
@@ -8,6 +8,7 @@ from geoalchemy2.functions import (
     ST_Centroid,
 )
 from geonature.utils.env import db
+from geonature.utils.srid import get_local_srid
 
 from geonature.core.imports.checks.sql.utils import report_erroneous_rows
 
@@ -86,7 +87,7 @@ def convert_geom_columns(
         Field representing the geometry in the transient table in the local SRID.
     """
     file_srid = imprt.srid
-    local_srid = db.session.execute(sa.func.Find_SRID("ref_geo", "l_areas", "geom")).scalar()
+    local_srid = get_local_srid()
     dest_srid = None
     if file_srid == local_srid:
         # dataframe check defined geom_local, we must use it to define geom_4326
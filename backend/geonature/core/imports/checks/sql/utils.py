@@ -1,3 +1,6 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from sqlalchemy import func
 from sqlalchemy.sql.expression import select, update, insert, literal
 import sqlalchemy as sa
@@ -5,15 +8,12 @@ from sqlalchemy.dialects.postgresql import array_agg, aggregate_order_by
 
 from geonature.utils.env import db
 
-from geonature.core.imports.models import (
-    ImportUserError,
-    ImportUserErrorType,
-)
+from geonature.core.imports.models import ImportUserError, get_error_type
 from geonature.core.imports.utils import generated_fields
 import pandas as pd
 
 
-__all__ = ["get_duplicates_query", "report_erroneous_rows"]
+__all__ = ["get_duplicates_query", "report_erroneous_rows", "batch_erroneous_rows"]
 
 
 def get_duplicates_query(imprt, dest_field, whereclause=sa.true()):
@@ -42,6 +42,40 @@ def get_duplicates_query(imprt, dest_field, whereclause=sa.true()):
     return duplicates
 
 
+# Reports of report_erroneous_rows deferred by batch_erroneous_rows
+_erroneous_rows_batch = ContextVar("erroneous_rows_batch", default=None)
+
+
+@contextmanager
+def batch_erroneous_rows(imprt):
+    """
+    Defer the reports of report_erroneous_rows made in this context, and execute them, when
+    leaving it, in a single statement per entity instead of one statement per check.
+
+    All the whereclauses are evaluated before any row validity is updated: the checks run in
+    this context must not rely on the validity set by each other (e.g. by filtering on
+    valid rows). When several reports update the validity of a row, the last one wins, as
+    if they were executed one after the other. Nothing is reported if the context is left
+    with an exception.
+
+    Parameters
+    ----------
+    imprt : TImports
+        The import whose rows are checked.
+    """
+    reports = []
+    token = _erroneous_rows_batch.set(reports)
+    try:
+        yield
+    finally:
+        _erroneous_rows_batch.reset(token)
+    reports_by_entity = {}
+    for report in reports:
+        reports_by_entity.setdefault(report["entity"], []).append(report)
+    for entity, entity_reports in reports_by_entity.items():
+        db.session.execute(_report_erroneous_rows_stmt(imprt, entity, entity_reports))
+
+
 def report_erroneous_rows(
     imprt,
     entity,
@@ -60,58 +94,90 @@ def report_erroneous_rows(
       - level exists in dict: row validity is set accordingly:
         - False: row is marked as erroneous
         - None: row is marked as should not be imported
+
+    Inside batch_erroneous_rows, the report is deferred until the end of the batch.
     """
-    transient_table = imprt.destination.get_transient_table()
-    error_type = ImportUserErrorType.query.filter_by(name=error_type).one()
+    error_type = get_error_type(error_type)
     error_column = generated_fields.get(error_column, error_column)
     error_column = imprt.fieldmapping.get(error_column, error_column)
-    if error_type.level in level_validity_mapping:
+    report = {
+        "entity": entity,
+        "error_type": error_type,
+        "error_column": error_column,
+        "whereclause": whereclause,
+        "update_validity": error_type.level in level_validity_mapping,
+        "validity": level_validity_mapping.get(error_type.level),
+    }
+    if report["update_validity"]:
         assert entity is not None
-        cte = (
-            update(transient_table)
-            .values(
-                {
-                    transient_table.c[entity.validity_column]: level_validity_mapping[
-                        error_type.level
-                    ],
-                }
-            )
-            .where(transient_table.c.id_import == imprt.id_import)
-            .where(whereclause)
-            .returning(transient_table.c.line_no)
-            .cte("cte")
-        )
+    batch = _erroneous_rows_batch.get()
+    if batch is not None:
+        batch.append(report)
     else:
+        db.session.execute(_report_erroneous_rows_stmt(imprt, entity, [report]))
+
+
+def _report_erroneous_rows_stmt(imprt, entity, reports):
+    """
+    Build the statement inserting the errors of several reports of the same entity, and
+    updating the validity of the reported rows.
+    """
+    transient_table = imprt.destination.get_transient_table()
+    error_selects = []
+    validity_whens = []
+    for idx, report in enumerate(reports):
         cte = (
             select(transient_table.c.line_no)
             .where(transient_table.c.id_import == imprt.id_import)
-            .where(whereclause)
-            .cte("cte")
-        )
-
-    insert_args = {
-        ImportUserError.id_import: literal(imprt.id_import).label("id_import"),
-        ImportUserError.id_type: literal(error_type.pk).label("id_type"),
-        ImportUserError.rows: array_agg(aggregate_order_by(cte.c.line_no, cte.c.line_no)).label(
-            "rows"
-        ),
-        ImportUserError.column: literal(error_column).label("error_column"),
-    }
-
-    if entity is not None:
-        insert_args.update(
-            {
-                ImportUserError.id_entity: literal(entity.id_entity).label("id_entity"),
-            }
+            .where(report["whereclause"])
+            .cte(f"cte_{idx}")
         )
+        insert_args = {
+            ImportUserError.id_import: literal(imprt.id_import).label("id_import"),
+            ImportUserError.id_type: literal(report["error_type"].pk).label("id_type"),
+            ImportUserError.rows: array_agg(aggregate_order_by(cte.c.line_no, cte.c.line_no)).label(
+                "rows"
+            ),
+            ImportUserError.column: literal(report["error_column"]).label("error_column"),
+        }
+        if entity is not None:
+            insert_args.update(
+                {
+                    ImportUserError.id_entity: literal(entity.id_entity).label("id_entity"),
+                }
+            )
+        error_selects.append(select(insert_args.values()))
+        if report["update_validity"]:
+            validity_whens.append((cte, report["validity"]))
 
     # Create the final insert statement
-    error_select = select(insert_args.values()).alias("error")
+    error_select = sa.union_all(*error_selects).alias("error")
     stmt = insert(ImportUserError).from_select(
         names=insert_args.keys(),
         select=(select(error_select).where(error_select.c.rows != None)),
     )
-    db.session.execute(stmt)
+    if validity_whens:
+        # The last report wins, as if reports were executed one after the other
+        validity = sa.case(
+            *[
+                (transient_table.c.line_no.in_(select(cte.c.line_no)), literal(value, sa.Boolean))
+                for cte, value in reversed(validity_whens)
+            ]
+        )
+        validity_cte = (
+            update(transient_table)
+            .values({transient_table.c[entity.validity_column]: sa.cast(validity, sa.Boolean)})
+            .where(transient_table.c.id_import == imprt.id_import)
+            .where(
+                transient_table.c.line_no.in_(
+                    sa.union(*[select(cte.c.line_no) for cte, _ in validity_whens])
+                )
+            )
+            .returning(transient_table.c.line_no)
+            .cte("validity")
+        )
+        stmt = stmt.add_cte(validity_cte)
+    return stmt
 
 
 def print_transient_table(imprt, columns=None):
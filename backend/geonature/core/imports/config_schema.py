@@ -3,7 +3,7 @@ Spécification du schéma toml des paramètres de configurations
 """
 
 from marshmallow import Schema, fields
-from marshmallow.validate import OneOf
+from marshmallow.validate import OneOf, Range
 
 DEFAULT_LIST_COLUMN = [
     {
@@ -81,6 +81,8 @@ class ImportConfigSchema(Schema):
     ENCODAGE = fields.List(fields.String, load_default=ENCODAGE)
     MAX_FILE_SIZE = fields.Integer(load_default=MAX_FILE_SIZE)
     MAX_ENCODING_DETECTION_DURATION = fields.Integer(load_default=2.0)
+    FILE_STORE = fields.String(load_default="geonature.core.imports.filestore.LocalFileStore")
+    FILE_STORE_PATH = fields.String(load_default=None, allow_none=True)
     ALLOWED_EXTENSIONS = fields.List(fields.String, load_default=ALLOWED_EXTENSIONS)
     DEFAULT_COUNT_VALUE = fields.Integer(load_default=DEFAULT_COUNT_VALUE)
     ALLOW_VALUE_MAPPING = fields.Boolean(load_default=ALLOW_VALUE_MAPPING)
@@ -119,6 +121,7 @@ class ImportConfigSchema(Schema):
     ID_LIST_TAXA_RESTRICTION = fields.Integer(load_default=None)
     MODULE_URL = fields.String(load_default="/import")
     DATAFRAME_BATCH_SIZE = fields.Integer(load_default=10000)
+    DATAFRAME_CHECK_WORKERS = fields.Integer(load_default=1, validate=Range(min=1))
     EXPORT_REPORT_PDF_FILENAME = fields.String(
         load_default="import_{id_import}_{date_create_import}_report.pdf"
     )
@@ -0,0 +1,133 @@
+"""
+Storage of import source files, outside of the database.
+
+The store used is configured with IMPORT.FILE_STORE, the import path of a FileStore subclass.
+"""
+
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import IO
+
+from flask import current_app
+from werkzeug.utils import import_string
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileStore(ABC):
+    """
+    Base class of import source file stores.
+
+    Files are identified by a key returned by `save`.
+    """
+
+    @abstractmethod
+    def save(self, stream: IO[bytes]) -> str:
+        """
+        Store the content of a binary stream, read by chunks.
+
+        Parameters
+        ----------
+        stream : IO[bytes]
+            The stream to store, read until its end.
+
+        Returns
+        -------
+        str
+            The key of the stored file.
+        """
+
+    @abstractmethod
+    def open(self, key: str) -> IO[bytes]:
+        """
+        Open a stored file for reading, in binary mode.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+
+        Returns
+        -------
+        IO[bytes]
+            A file object, which must be closed by the caller.
+        """
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """
+        Tell whether a file is stored.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Delete a stored file, if it exists.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        """
+
+
+class LocalFileStore(FileStore):
+    """
+    Store files in a local directory, IMPORT.FILE_STORE_PATH or ROOT_PATH/imports by default.
+    This directory must not be served by the web server (as MEDIA_FOLDER is), source files
+    may contain sensitive data.
+
+    Files are content-addressed: the key of a file is the path, relative to the store directory,
+    built from the SHA-256 of its content. Uploading the same file twice stores it once.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = current_app.config["IMPORT"]["FILE_STORE_PATH"] or (
+                Path(current_app.config["ROOT_PATH"]) / "imports"
+            )
+        self.path = Path(path)
+
+    def save(self, stream):
+        self.path.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.path, delete=False) as tmp:
+            try:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        key = digest.hexdigest()
+        key = f"{key[:2]}/{key[2:4]}/{key}"
+        file_path = self.path / key
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic, and harmless if the same content is already stored
+        os.replace(tmp.name, file_path)
+        return key
+
+    def open(self, key):
+        return open(self.path / key, "rb")
+
+    def exists(self, key):
+        return (self.path / key).is_file()
+
+    def delete(self, key):
+        (self.path / key).unlink(missing_ok=True)
+
+
+def get_file_store() -> FileStore:
+    """
+    Return the file store configured with IMPORT.FILE_STORE.
+    """
+    return import_string(current_app.config["IMPORT"]["FILE_STORE"])()
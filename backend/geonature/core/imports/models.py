@@ -1,9 +1,11 @@
 from datetime import datetime
 from collections.abc import Mapping
+from io import BytesIO
 import re
-from typing import Any, Iterable, List, Optional
+from typing import IO, Any, Iterable, List, Optional
 from packaging import version
 
+from alembic.migration import MigrationContext
 from flask import g
 import sqlalchemy as sa
 from sqlalchemy import func, ForeignKey, Table
@@ -12,6 +14,7 @@ from sqlalchemy.types import ARRAY
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import column_property
+from sqlalchemy.orm.exc import NoResultFound
 from jsonschema.exceptions import ValidationError as JSONValidationError
 from jsonschema import validate as validate_json
 from celery.result import AsyncResult
@@ -30,6 +33,7 @@ from geonature.utils.celery import celery_app
 from geonature.core.gn_permissions.tools import get_scopes_by_action
 from geonature.core.gn_commons.models import TModules
 from geonature.core.gn_meta.models import TDatasets
+from geonature.core.imports.filestore import get_file_store
 from pypnnomenclature.models import BibNomenclaturesTypes
 from pypnusershub.db.models import User
 
@@ -76,6 +80,50 @@ class ImportUserErrorType(db.Model):
         return f"<ImportErrorType {self.name}>"
 
 
+# Error types by name, loaded once per process and database schema version
+_error_types = {}
+
+
+def get_error_type(name):
+    """
+    Return the error type of the given name.
+
+    Parameters
+    ----------
+    name : str
+        The name of the error type.
+
+    Returns
+    -------
+    Row
+        The columns of the ImportUserErrorType (pk, category, name, description, level).
+
+    Raises
+    ------
+    NoResultFound
+        If there is no error type with this name.
+    """
+    schema_version = get_schema_version()
+    if schema_version not in _error_types:
+        _error_types.clear()
+        _error_types[schema_version] = {
+            error_type.name: error_type
+            for error_type in db.session.execute(
+                sa.select(
+                    ImportUserErrorType.pk,
+                    ImportUserErrorType.category,
+                    ImportUserErrorType.name,
+                    ImportUserErrorType.description,
+                    ImportUserErrorType.level,
+                )
+            )
+        }
+    try:
+        return _error_types[schema_version][name]
+    except KeyError:
+        raise NoResultFound(f"Error code '{name}' not found.")
+
+
 @serializable
 class ImportUserError(db.Model):
     __tablename__ = "t_user_errors"
@@ -106,6 +154,16 @@ class ImportUserError(db.Model):
         return f"<ImportError import={self.id_import},type={self.type.name},rows={self.rows}>"
 
 
+def get_schema_version():
+    """
+    Return the alembic revisions of the database, queried once per session.
+    """
+    if "alembic_heads" not in db.session.info:
+        migration_context = MigrationContext.configure(db.session.connection())
+        db.session.info["alembic_heads"] = tuple(sorted(migration_context.get_current_heads()))
+    return db.session.info["alembic_heads"]
+
+
 @serializable
 class Destination(db.Model):
     __tablename__ = "bib_destinations"
@@ -121,13 +179,25 @@ class Destination(db.Model):
     entities = relationship("Entity", back_populates="destination")
 
     def get_transient_table(self):
-        return Table(
-            self.table_name,
-            db.metadata,
-            autoload=True,
-            autoload_with=db.session.connection(),
-            schema="gn_imports",
-        )
+        """
+        Return the transient table of the destination, reflected once per process
+        and database schema version.
+        """
+        schema_version = get_schema_version()
+        table = db.metadata.tables.get(f"gn_imports.{self.table_name}")
+        if table is not None and table.info.get("schema_version", schema_version) != schema_version:
+            # A migration has been applied since the table was reflected
+            db.metadata.remove(table)
+            table = None
+        if table is None:
+            table = Table(
+                self.table_name,
+                db.metadata,
+                autoload_with=db.session.connection(),
+                schema="gn_imports",
+            )
+            table.info["schema_version"] = schema_version
+        return table
 
     @property
     def validity_columns(self):
@@ -373,8 +443,12 @@ class TImports(InstancePermissionMixin, db.Model):
     loaded = db.Column(db.Boolean, nullable=False, default=False)
     processed = db.Column(db.Boolean, nullable=False, default=False)
     dataset = db.relationship(TDatasets, lazy="joined")
+    # Imports uploaded before the file store have their file in source_file
     source_file = deferred(db.Column(db.LargeBinary))
+    source_file_key = deferred(db.Column(db.Unicode))
     columns = db.Column(ARRAY(db.Unicode))
+    # distinct values of each column (None if too many), collected when decoding the file
+    columns_values = deferred(db.Column(JSON))
     # keys are target names, values are source names
     fieldmapping = db.Column(MutableDict.as_mutable(JSON))
     contentmapping = db.Column(MutableDict.as_mutable(JSON))
@@ -398,6 +472,23 @@ class TImports(InstancePermissionMixin, db.Model):
 
     errors_count = column_property(func.array_length(erroneous_rows, 1))
 
+    @property
+    def has_source_file(self):
+        return self.source_file_key is not None or self.source_file is not None
+
+    def open_source_file(self) -> IO[bytes]:
+        """
+        Open the source file of the import, in binary mode.
+
+        Returns
+        -------
+        IO[bytes]
+            A file object, which must be closed by the caller.
+        """
+        if self.source_file_key is not None:
+            return get_file_store().open(self.source_file_key)
+        return BytesIO(self.source_file)
+
     @property
     def task_progress(self):
         if self.task_id is None:
@@ -1,6 +1,7 @@
 import codecs
 from io import BytesIO, StringIO, TextIOWrapper
 import csv
+from itertools import chain
 import json
 import unicodedata
 
@@ -19,6 +20,7 @@ from sqlalchemy.sql.expression import collate, exists
 
 from geonature.utils.env import db
 from geonature.utils.sentry import start_sentry_child
+from geonature.utils.utilscsv import CSV_CHUNK_SIZE
 from geonature.core.gn_commons.models import TModules
 from geonature.core.gn_permissions import decorators as permissions
 from geonature.core.gn_permissions.decorators import login_required
@@ -47,6 +49,11 @@ from geonature.core.imports.utils import (
     get_file_size,
     clean_import,
     generate_pdf_from_template,
+    remove_unused_source_file,
+    store_source_file,
+    decode_source_file,
+    filter_rows_by_line_no,
+    sort_column_values,
 )
 from geonature.core.imports.tasks import do_import_checks, do_import_in_destination
 
@@ -207,6 +214,7 @@ def upload_file(scope, imprt, destination=None):  # destination is set when impr
         db.session.add(imprt)
     else:
         clean_import(imprt, ImportStep.UPLOAD)
+    previous_source_file_key = imprt.source_file_key
     with start_sentry_child(op="task", description="detect encoding"):
         imprt.detected_encoding = detect_encoding(f)
     with start_sentry_child(op="task", description="detect separator"):
@@ -214,10 +222,15 @@ def upload_file(scope, imprt, destination=None):  # destination is set when impr
             f,
             encoding=imprt.encoding or imprt.detected_encoding,
         )
-    imprt.source_file = f.read()
+    with start_sentry_child(op="task", description="store source file"):
+        f.seek(0)
+        imprt.source_file_key = store_source_file(f)
+    imprt.source_file = None
     imprt.full_file_name = f.filename
 
     db.session.commit()
+    if previous_source_file_key != imprt.source_file_key:
+        remove_unused_source_file(previous_source_file_key)
     return jsonify(imprt.as_dict())
 
 
@@ -228,7 +241,7 @@ def decode_file(scope, imprt):
         raise Forbidden
     if not imprt.dataset.active:
         raise Forbidden("Le jeu de données est fermé.")
-    if imprt.source_file is None:
+    if not imprt.has_source_file:
         raise BadRequest(description="A file must be first uploaded.")
     if "encoding" not in request.json:
         raise BadRequest(description="Missing encoding.")
@@ -265,23 +278,21 @@ def decode_file(scope, imprt):
     except ValueError:
         raise BadRequest(description="decode parameter must but an int")
     if decode:
-        csvfile = TextIOWrapper(BytesIO(imprt.source_file), encoding=imprt.encoding)
-        csvreader = csv.reader(csvfile, delimiter=imprt.separator)
         try:
-            columns = next(csvreader)
-            while True:  # read full file to ensure that no encoding errors occur
-                next(csvreader)
+            # read full file to ensure that no encoding errors occur
+            with start_sentry_child(op="task", description="decode file"):
+                columns, row_count, columns_values = decode_source_file(imprt)
         except UnicodeError:
             raise BadRequest(
                 description="Erreur d’encodage lors de la lecture du fichier source. "
                 "Avez-vous sélectionné le bon encodage de votre fichier ?"
             )
-        except StopIteration:
-            pass
         duplicates = set([col for col in columns if columns.count(col) > 1])
         if duplicates:
             raise BadRequest(f"Duplicates column names: {duplicates}")
         imprt.columns = columns
+        imprt.source_count = row_count
+        imprt.columns_values = columns_values
         db.session.commit()
 
     return jsonify(imprt.as_dict())
@@ -311,7 +322,7 @@ def load_import(scope, imprt):
         raise Forbidden
     if not imprt.dataset.active:
         raise Forbidden("Le jeu de données est fermé.")
-    if imprt.source_file is None:
+    if not imprt.has_source_file:
         raise BadRequest(description="A file must be first uploaded.")
     if imprt.fieldmapping is None:
         raise BadRequest(description="File fields must be first mapped.")
@@ -371,16 +382,18 @@ def get_import_values(scope, imprt):
         if source not in imprt.columns:
             # the file do not contain this field expected by the mapping
             continue
-        # TODO: vérifier que l’on a pas trop de valeurs différentes ?
-        column = field.source_column
-        values = [
-            value
-            for value, in db.session.execute(
-                select(transient_table.c[column])
-                .where(transient_table.c.id_import == imprt.id_import)
-                .distinct(transient_table.c[column])
-            ).fetchall()
-        ]
+        # Values collected when decoding the file, unless they were too many or too long
+        values = (imprt.columns_values or {}).get(source)
+        if values is None:
+            column = field.source_column
+            # Sorted as the collected values rather than with the database collation
+            values = sort_column_values(
+                db.session.scalars(
+                    select(transient_table.c[column])
+                    .where(transient_table.c.id_import == imprt.id_import)
+                    .distinct()
+                )
+            )
         set_committed_value(
             field.nomenclature_type,
             "nomenclatures",
@@ -562,10 +575,10 @@ def get_import_errors(scope, imprt):
 def get_import_source_file(scope, imprt):
     if not imprt.has_instance_permission(scope, action_code="C"):
         raise Forbidden
-    if imprt.source_file is None:
+    if not imprt.has_source_file:
         raise Gone
     return send_file(
-        BytesIO(imprt.source_file),
+        imprt.open_source_file(),
         download_name=imprt.full_file_name,
         as_attachment=True,
         mimetype=f"text/csv; charset={imprt.encoding}; header=present",
@@ -590,20 +603,19 @@ def get_import_invalid_rows_as_csv(scope, imprt):
 
     @stream_with_context
     def generate_invalid_rows_csv():
-        sourcefile = TextIOWrapper(BytesIO(imprt.source_file), encoding=imprt.encoding)
-        destfile = StringIO()
-        csvreader = csv.reader(sourcefile, delimiter=imprt.separator)
-        csvwriter = csv.writer(destfile, dialect=csvreader.dialect, lineterminator="\n")
-        line_no = 1
-        for row in csvreader:
-            # line_no == 1 → csv header
-            if line_no == 1 or line_no in imprt.erroneous_rows:
+        with TextIOWrapper(imprt.open_source_file(), encoding=imprt.encoding) as sourcefile:
+            destfile = StringIO()
+            csvreader = csv.reader(sourcefile, delimiter=imprt.separator)
+            csvwriter = csv.writer(destfile, dialect=csvreader.dialect, lineterminator="\n")
+            # line 1 → csv header
+            line_numbers = chain([1], imprt.erroneous_rows or [])
+            for row in filter_rows_by_line_no(csvreader, line_numbers):
                 csvwriter.writerow(row)
-                destfile.seek(0)
-                yield destfile.read().encode(imprt.encoding)
-                destfile.seek(0)
-                destfile.truncate()
-            line_no += 1
+                if destfile.tell() >= CSV_CHUNK_SIZE:
+                    yield destfile.getvalue().encode(imprt.encoding)
+                    destfile.seek(0)
+                    destfile.truncate()
+            yield destfile.getvalue().encode(imprt.encoding)
 
     response = current_app.response_class(
         generate_invalid_rows_csv(),
@@ -675,8 +687,10 @@ def delete_import(scope, imprt):
         delete(transient_table).where(transient_table.c.id_import == imprt.id_import)
     )
     imprt.destination.actions.remove_data_from_destination(imprt)
+    source_file_key = imprt.source_file_key
     db.session.delete(imprt)
     db.session.commit()
+    remove_unused_source_file(source_file_key)
     return jsonify()
 
 
@@ -1,24 +1,27 @@
 import os
-from io import BytesIO, TextIOWrapper
+from io import StringIO, TextIOWrapper
 import csv
 import json
 from enum import IntEnum
 from datetime import datetime, timedelta
-from typing import IO, Any, Dict, Iterable, List, Optional, Set, Tuple
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from flask import current_app, render_template
 import sqlalchemy as sa
 from sqlalchemy import func, select, delete
 from chardet.universaldetector import UniversalDetector
-from sqlalchemy.sql.expression import select, insert
+from sqlalchemy.sql.expression import select
 import pandas as pd
 import numpy as np
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.postgresql import HSTORE
 from werkzeug.exceptions import BadRequest
+from geoalchemy2 import Geometry
 from geonature.utils.env import db
+from geonature.utils.srid import get_local_srid
 from weasyprint import HTML
 
 from geonature.utils.sentry import start_sentry_child
+from geonature.core.imports.filestore import get_file_store
 from geonature.core.imports.models import Entity, ImportUserError, BibFields, TImports
 
 
@@ -30,6 +33,12 @@ class ImportStep(IntEnum):
     IMPORT = 5
 
 
+# Distinct values of each column are kept when decoding the source file, to list the values
+# of nomenclated fields, unless the column has more than COLUMN_VALUES_SKETCH_SIZE distinct values
+# or a value longer than COLUMN_VALUES_MAX_LENGTH (free text, identifiers, geometries…)
+COLUMN_VALUES_SKETCH_SIZE = 100
+COLUMN_VALUES_MAX_LENGTH = 100
+
 generated_fields = {
     "datetime_min": "date_min",
     "datetime_max": "date_max",
@@ -55,12 +64,13 @@ def clean_import(imprt: TImports, step: ImportStep) -> None:
         pass
     if step <= ImportStep.DECODE:
         imprt.columns = None
+        imprt.columns_values = None
+        imprt.source_count = None
     if step <= ImportStep.LOAD:
         transient_table = imprt.destination.get_transient_table()
         stmt = delete(transient_table).where(transient_table.c.id_import == imprt.id_import)
         with start_sentry_child(op="task", description="clean transient data"):
             db.session.execute(stmt)
-        imprt.source_count = None
         imprt.loaded = False
     if step <= ImportStep.PREPARE:
         with start_sentry_child(op="task", description="clean errors"):
@@ -74,6 +84,98 @@ def clean_import(imprt: TImports, step: ImportStep) -> None:
         imprt.destination.actions.remove_data_from_destination(imprt)
 
 
+def lock_source_file(key: str) -> None:
+    """
+    Lock a file of the file store until the end of the current transaction.
+
+    As the file store is content-addressed, a file may be shared by several imports: adding
+    and removing references to a file are serialized with this lock.
+
+    Parameters
+    ----------
+    key : str
+        The key of the file in the file store.
+    """
+    db.session.execute(sa.select(func.pg_advisory_xact_lock(func.hashtext(key))))
+
+
+def store_source_file(stream: IO[bytes]) -> str:
+    """
+    Save a source file in the file store.
+
+    The file is locked until the end of the current transaction, which must commit the
+    reference to the file.
+
+    Parameters
+    ----------
+    stream : IO[bytes]
+        The content of the file.
+
+    Returns
+    -------
+    str
+        The key of the file in the file store.
+    """
+    file_store = get_file_store()
+    key = file_store.save(stream)
+    lock_source_file(key)
+    # A concurrent remove_unused_source_file may have deleted the file before it was locked
+    if not file_store.exists(key):
+        stream.seek(0)
+        file_store.save(stream)
+    return key
+
+
+def remove_unused_source_file(key: Optional[str]) -> None:
+    """
+    Delete a file of the file store, unless it is the source file of an import.
+
+    It must be called after the commit removing the reference to the file, and commits
+    the current transaction to release the lock on the file.
+
+    Parameters
+    ----------
+    key : str, optional
+        The key of the file in the file store.
+    """
+    if key is None:
+        return
+    lock_source_file(key)
+    if not db.session.scalar(sa.exists().where(TImports.source_file_key == key).select()):
+        get_file_store().delete(key)
+    db.session.commit()
+
+
+def filter_rows_by_line_no(rows: Iterable, line_numbers: Iterable[int]) -> Iterator:
+    """
+    Yield the rows of a file whose line number is in line_numbers.
+
+    Rows and line numbers are scanned once, side by side, instead of looking up each line
+    number of the file in the list. Reading stops after the last selected row.
+
+    Parameters
+    ----------
+    rows : Iterable
+        The rows of the file, numbered from 1.
+    line_numbers : Iterable[int]
+        The line numbers of the rows to yield, sorted in increasing order without duplicates
+        (as TImports.erroneous_rows).
+
+    Yields
+    ------
+    Any
+        The selected rows.
+    """
+    line_numbers = iter(line_numbers)
+    next_line_no = next(line_numbers, None)
+    for line_no, row in enumerate(rows, start=1):
+        if next_line_no is None:
+            return
+        if line_no == next_line_no:
+            yield row
+            next_line_no = next(line_numbers, None)
+
+
 def get_file_size(file_: IO) -> int:
     """
     Get the size of a file in bytes.
@@ -163,6 +265,71 @@ def detect_separator(file_: IO, encoding: str) -> Optional[str]:
     return dialect.delimiter
 
 
+def sort_column_values(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Sort distinct values of a column, None last.
+
+    Parameters
+    ----------
+    values : iterable of str or None
+        The values of the column.
+
+    Returns
+    -------
+    list
+        The distinct values, sorted by code point.
+    """
+    return sorted(set(values), key=lambda v: (v is None, v or ""))
+
+
+def decode_source_file(
+    imprt: TImports,
+) -> Tuple[List[str], int, Dict[str, Optional[List[Optional[str]]]]]:
+    """
+    Read the whole source file of an import once, with its encoding and separator.
+
+    Parameters
+    ----------
+    imprt : TImports
+        The import whose source file is read.
+
+    Returns
+    -------
+    tuple
+        The columns of the file header, the number of data rows, and for each column
+        the list of its distinct values sorted with sort_column_values (empty cells are None),
+        or None if the column has more than COLUMN_VALUES_SKETCH_SIZE distinct values
+        or a value longer than COLUMN_VALUES_MAX_LENGTH.
+
+    Raises
+    ------
+    UnicodeError
+        If the file can not be decoded with the import encoding.
+    """
+    with TextIOWrapper(imprt.open_source_file(), encoding=imprt.encoding) as csvfile:
+        csvreader = csv.reader(csvfile, delimiter=imprt.separator)
+        columns = next(csvreader, [])
+        sketches = {idx: set() for idx in range(len(columns))}
+        row_count = 0
+        for row in csvreader:
+            if not row:  # blank lines are skipped when loading data
+                continue
+            row_count += 1
+            for idx in list(sketches):
+                value = row[idx] if idx < len(row) else ""
+                values = sketches[idx]
+                values.add(value)
+                if len(values) > COLUMN_VALUES_SKETCH_SIZE or len(value) > COLUMN_VALUES_MAX_LENGTH:
+                    del sketches[idx]
+    columns_values = {}
+    for idx, column in enumerate(columns):
+        if idx in sketches:
+            columns_values[column] = sort_column_values(value or None for value in sketches[idx])
+        else:
+            columns_values[column] = None
+    return columns, row_count, columns_values
+
+
 def preprocess_value(dataframe: pd.DataFrame, field: BibFields, source_col: str) -> pd.Series:
     """
     Preprocesses values in a DataFrame depending if the field contains multiple values (e.g. additional_data) or not.
@@ -224,49 +391,99 @@ def insert_import_data_in_transient_table(imprt: TImports) -> int:
     fieldmapping, used_columns = build_fieldmapping(imprt, columns)
     extra_columns = set(columns) - set(used_columns)
 
-    csvfile = TextIOWrapper(BytesIO(imprt.source_file), encoding=imprt.encoding)
-    reader = pd.read_csv(
-        csvfile,
-        delimiter=imprt.separator,
-        header=0,
-        names=imprt.columns,
-        index_col=False,
-        dtype="str",
-        na_filter=False,
-        iterator=True,
-        chunksize=10000,
-    )
-    for chunk in reader:
-        chunk.replace({"": None}, inplace=True)
-        data = {
-            "id_import": np.full(len(chunk), imprt.id_import),
-            "line_no": 1 + 1 + chunk.index,  # header + start line_no at 1 instead of 0
-        }
-        data.update(
-            {
-                dest_field: preprocess_value(chunk, source_field["field"], source_field["value"])
-                for dest_field, source_field in fieldmapping.items()
-            }
+    with TextIOWrapper(imprt.open_source_file(), encoding=imprt.encoding) as csvfile:
+        reader = pd.read_csv(
+            csvfile,
+            delimiter=imprt.separator,
+            header=0,
+            names=imprt.columns,
+            index_col=False,
+            dtype="str",
+            na_filter=False,
+            iterator=True,
+            chunksize=10000,
         )
-        # XXX keep extra_fields in t_imports_synthese? or add config argument?
-        if extra_columns and "extra_fields" in transient_table.c:
+        for chunk in reader:
+            chunk.replace({"": None}, inplace=True)
+            data = {
+                "id_import": np.full(len(chunk), imprt.id_import),
+                "line_no": 1 + 1 + chunk.index,  # header + start line_no at 1 instead of 0
+            }
             data.update(
                 {
-                    "extra_fields": chunk[list(extra_columns)].apply(
-                        lambda cols: {k: v for k, v in cols.items()}, axis=1
-                    ),
+                    dest_field: preprocess_value(
+                        chunk, source_field["field"], source_field["value"]
+                    )
+                    for dest_field, source_field in fieldmapping.items()
                 }
             )
-        df = pd.DataFrame(data)
+            # XXX keep extra_fields in t_imports_synthese? or add config argument?
+            if extra_columns and "extra_fields" in transient_table.c:
+                data.update(
+                    {
+                        "extra_fields": chunk[list(extra_columns)].apply(
+                            lambda cols: {k: v for k, v in cols.items()}, axis=1
+                        ),
+                    }
+                )
+            df = pd.DataFrame(data)
 
-        imprt.destination.actions.preprocess_transient_data(imprt, df)
+            imprt.destination.actions.preprocess_transient_data(imprt, df)
 
-        records = df.to_dict(orient="records")
-        db.session.execute(insert(transient_table).values(records))
+            copy_dataframe_in_transient_table(transient_table, df)
 
     return 1 + chunk.index[-1]  # +1 because chunk.index start at 0
 
 
+def serialize_hstore(value: dict) -> str:
+    """
+    Serialize a dict to the text representation of a hstore value.
+    """
+
+    def quote(s):
+        return '"' + str(s).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    return ", ".join(f"{quote(k)}=>{'NULL' if v is None else quote(v)}" for k, v in value.items())
+
+
+def copy_dataframe_in_transient_table(transient_table: sa.Table, df: pd.DataFrame) -> None:
+    """
+    Load the rows of a dataframe into the transient table with a COPY FROM STDIN,
+    much faster than a multi-row INSERT on large files.
+
+    Parameters
+    ----------
+    transient_table : sa.Table
+        The transient table of the import destination.
+    df : pd.DataFrame
+        The rows to load, whose columns are columns of the transient table.
+        None and NaN values are loaded as NULL, JSON and hstore columns values are serialized.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        col_type = transient_table.c[col].type
+        if isinstance(col_type, sa.JSON):
+            df[col] = df[col].map(json.dumps, na_action="ignore")
+        elif isinstance(col_type, HSTORE):
+            df[col] = df[col].map(serialize_hstore, na_action="ignore")
+        elif isinstance(col_type, sa.Integer):
+            # integer columns with NULL values are float columns in pandas
+            df[col] = df[col].astype("Int64")
+    buffer = StringIO()
+    # NULL values are written as quoted empty strings, loaded as NULL by FORCE_NULL
+    df.to_csv(buffer, header=False, index=False, quoting=csv.QUOTE_ALL)
+    buffer.seek(0)
+
+    preparer = db.session.get_bind().dialect.identifier_preparer
+    columns = ", ".join(preparer.quote(col) for col in df.columns)
+    copy_stmt = (
+        f"COPY {preparer.format_table(transient_table)} ({columns}) "
+        f"FROM STDIN WITH (FORMAT csv, FORCE_NULL ({columns}))"
+    )
+    with db.session.connection().connection.cursor() as cursor:
+        cursor.copy_expert(copy_stmt, buffer)
+
+
 def build_fieldmapping(
     imprt: TImports, columns: Iterable[Any]
 ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
@@ -312,7 +529,12 @@ def build_fieldmapping(
 
 
 def load_transient_data_in_dataframe(
-    imprt: TImports, entity: Entity, source_cols: list, offset: int = None, limit: int = None
+    imprt: TImports,
+    entity: Entity,
+    source_cols: list,
+    offset: int = None,
+    limit: int = None,
+    after_line_no: int = None,
 ):
     """
     Load data from the transient table into a pandas dataframe.
@@ -329,6 +551,8 @@ def load_transient_data_in_dataframe(
         The number of rows to skip.
     limit : int, optional
         The maximum number of rows to load.
+    after_line_no : int, optional
+        Only load rows whose line number is greater than this one.
 
     Returns
     -------
@@ -345,6 +569,8 @@ def load_transient_data_in_dataframe(
         )
         .order_by(transient_table.c.line_no)
     )
+    if after_line_no is not None:
+        stmt = stmt.where(transient_table.c.line_no > after_line_no)
     if offset is not None:
         stmt = stmt.offset(offset)
     if limit is not None:
@@ -357,6 +583,44 @@ def load_transient_data_in_dataframe(
     return df
 
 
+def iter_transient_data_in_dataframe(
+    imprt: TImports, entity: Entity, source_cols: list, batch_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Load data from the transient table into pandas dataframes of at most batch_size rows.
+
+    Batches are selected on line numbers, following the last line of the previous batch,
+    rather than with an OFFSET which would scan all the rows of the previous batches.
+
+    Parameters
+    ----------
+    imprt : TImports
+        The import to load.
+    entity : Entity
+        The entity to load.
+    source_cols : list
+        The columns to load from the transient table.
+    batch_size : int
+        The maximum number of rows of each dataframe.
+
+    Yields
+    ------
+    pandas.DataFrame
+        The dataframes containing the loaded data, in line number order.
+    """
+    last_line_no = None
+    while True:
+        df = load_transient_data_in_dataframe(
+            imprt, entity, source_cols, limit=batch_size, after_line_no=last_line_no
+        )
+        if df.empty:
+            return
+        last_line_no = df["line_no"].iloc[-1]
+        yield df
+        if len(df) < batch_size:
+            return
+
+
 def update_transient_data_from_dataframe(
     imprt: TImports, entity: Entity, updated_cols: Set[str], dataframe: pd.DataFrame
 ):
@@ -376,22 +640,60 @@ def update_transient_data_from_dataframe(
 
     Notes
     -----
-    The dataframe must have the columns 'id_import' and 'line_no'.
+    The dataframe must have the column 'line_no'.
+    Values of geometry columns must be hex-encoded EWKB.
     """
-    if not updated_cols:
+    if not updated_cols or dataframe.empty:
         return
     transient_table = imprt.destination.get_transient_table()
-    updated_cols = ["id_import", "line_no"] + list(updated_cols)
-    dataframe.replace({np.nan: None}, inplace=True)
-    records = dataframe[updated_cols].to_dict(orient="records")
-    if not records:
-        return
-    insert_stmt = pg_insert(transient_table)
-    insert_stmt = insert_stmt.values(records).on_conflict_do_update(
-        index_elements=updated_cols[:2],
-        set_={col: insert_stmt.excluded[col] for col in updated_cols[2:]},
+    updated_cols = list(updated_cols)
+    preparer = db.session.get_bind().dialect.identifier_preparer
+
+    # Updated values are loaded with a COPY in a staging table, then applied with a single UPDATE.
+    # The staging table may be left over by a previous call which failed in the same transaction:
+    # it is dropped before being created, and anyway at the end of the transaction.
+    staging_table = sa.Table(
+        f"tmp_{transient_table.name}_update",
+        sa.MetaData(),
+        *[sa.Column(col, transient_table.c[col].type) for col in ["line_no", *updated_cols]],
+        schema="pg_temp",
+    )
+    columns = ", ".join(preparer.quote(col) for col in staging_table.c.keys())
+    db.session.execute(sa.text(f"DROP TABLE IF EXISTS {preparer.format_table(staging_table)}"))
+    db.session.execute(
+        sa.text(
+            f"CREATE TEMPORARY TABLE {preparer.format_table(staging_table)} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {preparer.format_table(transient_table)} WITH NO DATA"
+        )
+    )
+    values = {}
+    for col in updated_cols:
+        if isinstance(transient_table.c[col].type, Geometry):
+            # Geometries are given as EWKB, already reprojected by check_geometry to the SRID
+            # of their column (the local SRID if the column has none): ST_Transform is a no-op
+            # then, it only guards against a geometry given in another SRID
+            db.session.execute(
+                sa.text(
+                    f"ALTER TABLE {preparer.format_table(staging_table)} "
+                    f"ALTER COLUMN {preparer.quote(col)} TYPE geometry"
+                )
+            )
+            srid = transient_table.c[col].type.srid
+            values[col] = func.ST_Transform(
+                staging_table.c[col], srid if srid > 0 else get_local_srid()
+            )
+        else:
+            values[col] = staging_table.c[col]
+    copy_dataframe_in_transient_table(staging_table, dataframe[["line_no", *updated_cols]])
+    db.session.execute(
+        sa.update(transient_table)
+        .where(
+            transient_table.c.id_import == imprt.id_import,
+            transient_table.c.line_no == staging_table.c.line_no,
+        )
+        .values(values)
     )
-    db.session.execute(insert_stmt)
+    db.session.execute(sa.text(f"DROP TABLE {preparer.format_table(staging_table)}"))
 
 
 def generate_pdf_from_template(template: str, data: Any) -> bytes:
@@ -486,7 +788,7 @@ def compute_bounding_box(
     *,
     child_entity_code: str = None,
     transient_where_clause=None,
-    destination_where_clause=None
+    destination_where_clause=None,
 ):
     """
     Compute the bounding box of an entity with a geometry in the given import, based on its
@@ -0,0 +1,78 @@
+"""add synthese export jobs
+
+Revision ID: 3f64dab7bc9a
+Revises: 7cc3f0598266
+Create Date: 2025-10-22 14:37:05.118920
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "3f64dab7bc9a"
+down_revision = "7cc3f0598266"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "t_export_jobs",
+        sa.Column("id_export", sa.Integer, primary_key=True),
+        sa.Column("uuid_export", UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "id_role",
+            sa.Integer,
+            sa.ForeignKey("utilisateurs.t_roles.id_role", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("task_id", sa.String),
+        sa.Column("export_format", sa.Unicode, nullable=False),
+        sa.Column("view_name", sa.Unicode, nullable=False),
+        sa.Column("status", sa.Unicode, nullable=False, server_default="pending"),
+        sa.Column("file_name", sa.Unicode),
+        sa.Column("nb_observations", sa.Integer),
+        sa.Column("creation_date", sa.DateTime, server_default=sa.func.now()),
+        sa.Column("end_date", sa.DateTime),
+        schema="gn_synthese",
+    )
+    op.execute(
+        """
+    INSERT INTO gn_notifications.bib_notifications_categories
+    VALUES  ('SYNTHESE-EXPORT-DONE', 'Export de la synthèse terminé', 'Se déclenche lorsqu’un de vos exports d’observations de la synthèse est prêt à être téléchargé')
+    """
+    )
+    op.execute(
+        """
+    INSERT INTO gn_notifications.bib_notifications_templates
+    VALUES  ('SYNTHESE-EXPORT-DONE', 'DB', '<b>Export n° {{ export.id_export }}</b> terminé : {{ export.nb_observations }} observations prêtes à être téléchargées')
+    """
+    )
+    op.execute(
+        """
+    INSERT INTO gn_notifications.bib_notifications_templates
+    VALUES  ('SYNTHESE-EXPORT-DONE', 'EMAIL', '<p>Bonjour <i>{{ role.nom_complet }}</i> !</p> <p>Votre <a href="{{ url }}">export <b>n°{{ export.id_export }}</b></a> de {{ export.nb_observations }} observations de la synthèse est prêt à être téléchargé.</p><hr><p><i>Vous recevez cet email automatiquement via le service de notification de GeoNature. <a href="{{url_notification_rules}}">Gestion de vos règles de notification</a>.</i></p>')
+    """
+    )
+    op.execute(
+        """
+        INSERT INTO
+            gn_notifications.t_notifications_rules (code_category, code_method)
+        VALUES
+            ('SYNTHESE-EXPORT-DONE', 'DB')
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+    DELETE FROM gn_notifications.t_notifications_rules WHERE code_category = 'SYNTHESE-EXPORT-DONE';
+    DELETE FROM gn_notifications.bib_notifications_templates WHERE code_category = 'SYNTHESE-EXPORT-DONE';
+    DELETE FROM gn_notifications.bib_notifications_categories WHERE code = 'SYNTHESE-EXPORT-DONE';
+    """
+    )
+    op.drop_table("t_export_jobs", schema="gn_synthese")
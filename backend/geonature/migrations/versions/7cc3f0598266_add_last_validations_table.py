@@ -0,0 +1,160 @@
+"""add last validations table
+
+Revision ID: 7cc3f0598266
+Revises: cad98c048b5e
+Create Date: 2025-10-20 10:12:41.204318
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "7cc3f0598266"
+down_revision = "cad98c048b5e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "t_last_validations",
+        sa.Column("uuid_attached_row", UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "id_validation",
+            sa.Integer,
+            sa.ForeignKey("gn_commons.t_validations.id_validation", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("validation_date", sa.TIMESTAMP),
+        schema="gn_commons",
+    )
+    op.create_index(
+        "i_t_validations_uuid_attached_row_validation_date",
+        table_name="t_validations",
+        columns=[
+            "uuid_attached_row",
+            sa.text("validation_date DESC NULLS LAST"),
+            sa.text("id_validation DESC"),
+        ],
+        schema="gn_commons",
+    )
+    op.execute(
+        """
+    CREATE FUNCTION gn_commons.fct_refresh_last_validations(uuids uuid[] DEFAULT NULL)
+    RETURNS void AS
+    $BODY$
+    -- Update the last validation of given rows, or of every row if uuids is NULL
+    BEGIN
+        IF uuids IS NULL THEN
+            TRUNCATE gn_commons.t_last_validations;
+            INSERT INTO gn_commons.t_last_validations (uuid_attached_row, id_validation, validation_date)
+            SELECT DISTINCT ON (uuid_attached_row) uuid_attached_row, id_validation, validation_date
+            FROM gn_commons.t_validations
+            WHERE uuid_attached_row IS NOT NULL
+            ORDER BY uuid_attached_row, validation_date DESC NULLS LAST, id_validation DESC;
+            RETURN;
+        END IF;
+        INSERT INTO gn_commons.t_last_validations (uuid_attached_row, id_validation, validation_date)
+        SELECT DISTINCT ON (uuid_attached_row) uuid_attached_row, id_validation, validation_date
+        FROM gn_commons.t_validations
+        WHERE uuid_attached_row = ANY(uuids)
+        ORDER BY uuid_attached_row, validation_date DESC NULLS LAST, id_validation DESC
+        ON CONFLICT (uuid_attached_row) DO UPDATE
+        SET id_validation = EXCLUDED.id_validation,
+            validation_date = EXCLUDED.validation_date;
+        DELETE FROM gn_commons.t_last_validations lv
+        WHERE lv.uuid_attached_row = ANY(uuids)
+        AND NOT EXISTS (
+            SELECT 1 FROM gn_commons.t_validations v
+            WHERE v.uuid_attached_row = lv.uuid_attached_row
+        );
+    END;
+    $BODY$
+        LANGUAGE plpgsql VOLATILE
+        COST 100;
+
+    CREATE FUNCTION gn_commons.fct_tri_refresh_last_validations() RETURNS TRIGGER AS
+    $BODY$
+    -- Update the last validation of rows whose validations have been inserted, updated or deleted
+    BEGIN
+        IF (TG_OP = 'INSERT') THEN
+            PERFORM gn_commons.fct_refresh_last_validations(
+                ARRAY(SELECT DISTINCT uuid_attached_row FROM new_table)
+            );
+        ELSIF (TG_OP = 'UPDATE') THEN
+            PERFORM gn_commons.fct_refresh_last_validations(
+                ARRAY(
+                    SELECT uuid_attached_row FROM new_table
+                    UNION
+                    SELECT uuid_attached_row FROM old_table
+                )
+            );
+        ELSIF (TG_OP = 'DELETE') THEN
+            PERFORM gn_commons.fct_refresh_last_validations(
+                ARRAY(SELECT DISTINCT uuid_attached_row FROM old_table)
+            );
+        END IF;
+        RETURN NULL;
+    END;
+    $BODY$ LANGUAGE plpgsql COST 100
+    ;
+    CREATE TRIGGER tri_insert_refresh_last_validations
+        AFTER INSERT
+        ON gn_commons.t_validations
+        REFERENCING NEW TABLE AS new_table
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION gn_commons.fct_tri_refresh_last_validations()
+    ;
+    CREATE TRIGGER tri_update_refresh_last_validations
+        AFTER UPDATE
+        ON gn_commons.t_validations
+        REFERENCING OLD TABLE AS old_table NEW TABLE AS new_table
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION gn_commons.fct_tri_refresh_last_validations()
+    ;
+    CREATE TRIGGER tri_delete_refresh_last_validations
+        AFTER DELETE
+        ON gn_commons.t_validations
+        REFERENCING OLD TABLE AS old_table
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION gn_commons.fct_tri_refresh_last_validations()
+    ;
+    SELECT gn_commons.fct_refresh_last_validations();
+
+    CREATE OR REPLACE VIEW gn_commons.v_latest_validation AS
+    SELECT v.*
+    FROM gn_commons.t_last_validations lv
+    JOIN gn_commons.t_validations v ON v.id_validation = lv.id_validation;
+    """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+    CREATE OR REPLACE VIEW gn_commons.v_latest_validation AS
+    SELECT v.*
+    FROM gn_commons.t_validations v
+    INNER JOIN (
+    SELECT uuid_attached_row, max(validation_date) as max_date
+    FROM gn_commons.t_validations
+    GROUP BY uuid_attached_row
+    ) last_val
+    ON v.uuid_attached_row = last_val.uuid_attached_row AND v.validation_date = last_val.max_date;
+
+    DROP TRIGGER tri_insert_refresh_last_validations ON gn_commons.t_validations;
+    DROP TRIGGER tri_update_refresh_last_validations ON gn_commons.t_validations;
+    DROP TRIGGER tri_delete_refresh_last_validations ON gn_commons.t_validations;
+    DROP FUNCTION gn_commons.fct_tri_refresh_last_validations();
+    DROP FUNCTION gn_commons.fct_refresh_last_validations(uuid[]);
+    """
+    )
+    op.drop_index(
+        "i_t_validations_uuid_attached_row_validation_date",
+        table_name="t_validations",
+        schema="gn_commons",
+    )
+    op.drop_table("t_last_validations", schema="gn_commons")
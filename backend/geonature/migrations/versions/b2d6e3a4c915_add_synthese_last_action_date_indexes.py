@@ -0,0 +1,42 @@
+"""add synthese last action date indexes
+
+Revision ID: b2d6e3a4c915
+Revises: 3f64dab7bc9a
+Create Date: 2025-10-24 09:51:12.604318
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b2d6e3a4c915"
+down_revision = "3f64dab7bc9a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Used by incremental exports (/synthese/export_observations/changes)
+    op.create_index(
+        "i_synthese_last_action_date",
+        table_name="synthese",
+        columns=[sa.text("(COALESCE(meta_update_date, meta_create_date))"), "id_synthese"],
+        schema="gn_synthese",
+    )
+    op.create_index(
+        "i_t_log_synthese_meta_last_action_date",
+        table_name="t_log_synthese",
+        columns=["meta_last_action_date", "id_synthese"],
+        schema="gn_synthese",
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "i_t_log_synthese_meta_last_action_date",
+        table_name="t_log_synthese",
+        schema="gn_synthese",
+    )
+    op.drop_index("i_synthese_last_action_date", table_name="synthese", schema="gn_synthese")
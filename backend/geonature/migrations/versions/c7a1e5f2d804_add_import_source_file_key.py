@@ -0,0 +1,29 @@
+"""add import source file key
+
+Revision ID: c7a1e5f2d804
+Revises: b2d6e3a4c915
+Create Date: 2025-10-27 10:18:33.470215
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7a1e5f2d804"
+down_revision = "b2d6e3a4c915"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        schema="gn_imports",
+        table_name="t_imports",
+        column=sa.Column("source_file_key", sa.Unicode),
+    )
+
+
+def downgrade():
+    op.drop_column(schema="gn_imports", table_name="t_imports", column_name="source_file_key")
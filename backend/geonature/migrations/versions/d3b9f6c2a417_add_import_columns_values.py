@@ -0,0 +1,30 @@
+"""add import columns values
+
+Revision ID: d3b9f6c2a417
+Revises: c7a1e5f2d804
+Create Date: 2025-10-28 15:42:07.918350
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSON
+
+
+# revision identifiers, used by Alembic.
+revision = "d3b9f6c2a417"
+down_revision = "c7a1e5f2d804"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        schema="gn_imports",
+        table_name="t_imports",
+        column=sa.Column("columns_values", JSON),
+    )
+
+
+def downgrade():
+    op.drop_column(schema="gn_imports", table_name="t_imports", column_name="columns_values")
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from geonature.core.imports.models import TImports
+from geonature.core.imports.utils import copy_dataframe_in_transient_table
+from geonature.utils.env import db
+
+from geonature.tests.fixtures import datasets
+from geonature.tests.imports.fixtures import synthese_destination
+
+
+def insert_dataframe_in_transient_table(transient_table, df):
+    """
+    Previous loading of the transient table, with a multi-row INSERT.
+    """
+    db.session.execute(sa.insert(transient_table).values(df.to_dict(orient="records")))
+
+
+@pytest.fixture()
+def transient_import(synthese_destination, users, datasets):
+    with db.session.begin_nested():
+        imprt = TImports(
+            destination=synthese_destination,
+            authors=[users["user"]],
+            id_dataset=datasets["own_dataset"].id_dataset,
+        )
+        db.session.add(imprt)
+    return imprt
+
+
+def generate_transient_data(imprt, count):
+    """
+    Generate rows as loaded from an import file, with mapped and extra columns.
+    """
+    line_no = np.arange(2, count + 2)
+    return pd.DataFrame(
+        {
+            "id_import": np.full(count, imprt.id_import),
+            "line_no": line_no,
+            "src_unique_id_sinp": [None] * count,
+            "src_cd_nom": (line_no % 1000 + 60000).astype(str),
+            "nom_cite": [f'Espèce n°{i}; "citée"' for i in line_no],
+            "src_date_min": ["2024-05-13"] * count,
+            "src_altitude_min": [None if i % 3 else str(i) for i in line_no],
+            "extra_fields": [{"remarque": f"ligne {i}"} for i in line_no],
+        }
+    )
+
+
+@pytest.mark.benchmark(group="imports-load")
+@pytest.mark.parametrize(
+    "load", [insert_dataframe_in_transient_table, copy_dataframe_in_transient_table]
+)
+@pytest.mark.parametrize("count", [1000, 10000])
+@pytest.mark.usefixtures("temporary_transaction")
+def test_load_transient_table(benchmark, transient_import, load, count):
+    transient_table = transient_import.destination.get_transient_table()
+    df = generate_transient_data(transient_import, count)
+    delete_stmt = sa.delete(transient_table).where(
+        transient_table.c.id_import == transient_import.id_import
+    )
+
+    benchmark.pedantic(
+        load,
+        args=(transient_table, df),
+        setup=lambda: db.session.execute(delete_stmt),
+        rounds=5,
+    )
+
+    assert (
+        db.session.scalar(
+            sa.select(sa.func.count()).where(
+                transient_table.c.id_import == transient_import.id_import,
+                transient_table.c.extra_fields["remarque"].like("ligne %"),
+            )
+        )
+        == count
+    )
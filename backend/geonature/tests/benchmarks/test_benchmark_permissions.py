@@ -0,0 +1,29 @@
+import pytest
+
+from geonature.core.gn_permissions.models import Permission
+from geonature.core.gn_permissions.tools import _remove_superseded_permissions
+from ref_geo.models import LAreas
+
+
+def generate_permissions(count):
+    """
+    Generate permissions as found on admin-heavy instances: group-level permissions
+    filtered on areas, with various scopes and sensitivity filters.
+    """
+    areas = [LAreas(id_area=id_area) for id_area in range(count // 2 + 1)]
+    return [
+        Permission(
+            scope_value=[1, 2, None][i % 3],
+            sensitivity_filter=bool(i % 2),
+            areas_filter=[areas[i // 2]],
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.benchmark(group="permissions")
+@pytest.mark.parametrize("count", [10, 100, 1000, 5000])
+def test_remove_superseded_permissions(benchmark, count):
+    permissions = generate_permissions(count)
+    remaining = benchmark(_remove_superseded_permissions, permissions)
+    assert 0 < len(remaining) <= count
@@ -1,5 +1,5 @@
 import pytest
-from flask import g
+from flask import current_app, g
 import sqlalchemy as sa
 
 from geonature.core.gn_commons.models import TModules
@@ -24,6 +24,16 @@ def default_destination(app):
             values["destination"] = g.default_destination.code
 
 
+@pytest.fixture(autouse=True)
+def file_store_path(monkeypatch, tmp_path):
+    """
+    Store the source files of imports in a temporary directory.
+    """
+    path = tmp_path / "imports"
+    monkeypatch.setitem(current_app.config["IMPORT"], "FILE_STORE_PATH", str(path))
+    return path
+
+
 @pytest.fixture(scope="session")
 def synthese_destination():
     return Destination.query.filter(
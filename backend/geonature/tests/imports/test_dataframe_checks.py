@@ -14,13 +14,18 @@ from shapely.geometry import Point
 
 from geonature.core.imports.models import TImports, Destination, BibFields
 from geonature.core.imports.checks.dataframe import *
-from geonature.core.imports.checks.dataframe.cast import convert_to_datetime
+from geonature.core.imports.checks.dataframe.cast import (
+    convert_to_datetime,
+    convert_series_to_datetime,
+)
 from geonature.core.imports.checks.dataframe.geometry import (
     check_wkt_inside_area_id,
     check_geometry_inside_l_areas,
+    xy_to_geometries,
 )
 from ref_geo.models import LAreas
 from geonature.utils.env import db
+from geonature.utils.srid import get_local_srid
 import sqlalchemy as sa
 
 
@@ -324,6 +329,44 @@ class TestChecks:
             ],
         )
 
+    def test_check_geography_reprojection(self, imprt):
+        fields = get_fields(imprt, ["the_geom_4326", "the_geom_local", "WKT"])
+        file_srid = 32631  # neither 4326 nor the local SRID
+        wkts = [
+            "POINT(600000 4800000)",
+            "LINESTRING(600000 4800000, 610000 4810000)",
+            "POINT Z(600000 4800000 150)",
+        ]
+        df = pd.DataFrame({fields["WKT"].source_field: wkts})
+        errors = check_geometry.__wrapped__(
+            df,
+            file_srid=file_srid,
+            geom_4326_field=fields["the_geom_4326"],
+            geom_local_field=fields["the_geom_local"],
+            wkt_field=fields["WKT"],
+        )
+        assert list(errors) == []
+        for field, srid, tolerance in [
+            (fields["the_geom_4326"], 4326, 1e-8),
+            (fields["the_geom_local"], get_local_srid(), 1e-3),
+        ]:
+            for ewkb, wkt in zip(df[field.dest_field], wkts):
+                geom = sa.func.ST_GeomFromEWKB(sa.func.decode(ewkb, "hex"))
+                # Same geometry as transformed in SQL by PostGIS
+                expected = sa.func.ST_Transform(sa.func.ST_GeomFromText(wkt, file_srid), srid)
+                same_srid, same_dimension, same_z, distance = db.session.execute(
+                    sa.select(
+                        sa.func.ST_SRID(geom) == sa.func.ST_SRID(expected),
+                        sa.func.ST_CoordDim(geom) == sa.func.ST_CoordDim(expected),
+                        sa.func.ST_ZMax(geom) == sa.func.ST_ZMax(expected),
+                        sa.func.ST_HausdorffDistance(geom, expected),
+                    )
+                ).one()
+                assert same_srid
+                assert same_dimension
+                assert same_z
+                assert distance < tolerance
+
     def test_check_types(self, imprt):
         entity = imprt.destination.entities[0]
         uuid = "82ff094c-c3b3-11eb-9804-bfdc95e73f38"
@@ -478,6 +521,29 @@ class TestChecks:
         for date in dates:
             assert convert_to_datetime(date[0]) == date[1]
 
+    def test_convert_series_to_datetime(self):
+        values = pd.Series(
+            [
+                "01/02/2020",
+                "2020:02:01",
+                "01/02/2020                          12:00:54",
+                "01/02/2020 12:00:54:987654",
+                "2020-02-01T12:00:54.987654",
+                "01/02/2020 12h30m",
+                "1500-01-01",
+                "2020-02-01 12:00:54:9876541",
+                "2020-02-30",
+                "abc",
+                None,
+                "01/02/2020",
+            ]
+        )
+        converted = convert_series_to_datetime(values)
+        assert list(converted.index) == list(values.index)
+        for value, date in zip(values, converted):
+            expected = convert_to_datetime(value) if value is not None else None
+            assert date == expected or (pd.isna(date) and expected is None)
+
     def test_dates_parsing(self, imprt):
         entity = imprt.destination.entities[0]
         fields = get_fields(imprt, ["date_min", "hour_min", "datetime_min", "datetime_max"])
@@ -695,3 +761,12 @@ class TestChecks:
         )
 
         assert not check
+
+    def test_xy_to_geometries(self):
+        x = pd.Series(["1,5", " 2 ", "a", None], index=[3, 5, 7, 9])
+        y = pd.Series(["43", "44.1", "1", "2"], index=[3, 5, 7, 9])
+
+        geometries = xy_to_geometries(x, y)
+
+        assert list(geometries.index) == [3, 5, 7, 9]
+        assert geometries.tolist() == [Point(1.5, 43), Point(2, 44.1), None, None]
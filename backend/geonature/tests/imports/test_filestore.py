@@ -0,0 +1,58 @@
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from flask import current_app
+
+from geonature.core.imports.filestore import FileStore, LocalFileStore, get_file_store
+from geonature.core.imports.models import TImports
+
+
+class TestLocalFileStore:
+    def test_file_store(self, file_store_path):
+        file_store = get_file_store()
+        assert isinstance(file_store, LocalFileStore)
+        assert file_store.path == file_store_path
+
+    def test_default_path(self, monkeypatch):
+        monkeypatch.setitem(current_app.config["IMPORT"], "FILE_STORE_PATH", None)
+        path = LocalFileStore().path
+        assert path == Path(current_app.config["ROOT_PATH"]) / "imports"
+        # source files must not be served
+        assert Path(current_app.config["MEDIA_FOLDER"]) not in path.parents
+
+    def test_abstract_file_store(self):
+        with pytest.raises(TypeError):
+            FileStore()
+
+    def test_save(self, tmp_path):
+        file_store = LocalFileStore(tmp_path)
+        key = file_store.save(BytesIO(b"a;b\n1;2\n"))
+        assert file_store.exists(key)
+        with file_store.open(key) as f:
+            assert f.read() == b"a;b\n1;2\n"
+        # content-addressed: the same content is stored once
+        assert file_store.save(BytesIO(b"a;b\n1;2\n")) == key
+        other_key = file_store.save(BytesIO(b"a;b\n3;4\n"))
+        assert other_key != key
+        assert {p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*") if p.is_file()} == {
+            key,
+            other_key,
+        }
+
+    def test_delete(self, tmp_path):
+        file_store = LocalFileStore(tmp_path)
+        key = file_store.save(BytesIO(b"a;b\n1;2\n"))
+        file_store.delete(key)
+        assert not file_store.exists(key)
+        with pytest.raises(FileNotFoundError):
+            file_store.open(key)
+        file_store.delete(key)  # deleting a missing file is harmless
+
+    def test_open_source_file(self, tmp_path):
+        key = get_file_store().save(BytesIO(b"stored"))
+        with TImports(source_file_key=key).open_source_file() as f:
+            assert f.read() == b"stored"
+        # imports uploaded before the file store keep their file in database
+        with TImports(source_file=b"legacy").open_source_file() as f:
+            assert f.read() == b"legacy"
@@ -1,7 +1,8 @@
 from pathlib import Path
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.orm.exc import NoResultFound
 from flask import url_for
 from werkzeug.exceptions import Unauthorized, Forbidden
 from jsonschema import validate as validate_json
@@ -9,7 +10,8 @@ from jsonschema import validate as validate_json
 from geonature.utils.env import db
 from geonature.tests.utils import set_logged_user
 
-from geonature.core.imports.models import TImports
+from geonature.core.imports.models import ImportUserErrorType, TImports, get_error_type
+from geonature.core.imports.utils import filter_rows_by_line_no
 
 from .jsonschema_definitions import jsonschema_definitions
 
@@ -71,3 +73,35 @@ class TestImportsRoute:
             assert (a["destination"] is None) or (
                 a["destination"]["code"] <= b["destination"]["code"]
             )
+
+    def test_get_transient_table_cache(self, all_modules_destination):
+        statements = []
+
+        def log_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for destination in all_modules_destination.values():
+            transient_table = destination.get_transient_table()
+            event.listen(db.engine, "before_cursor_execute", log_statement)
+            try:
+                assert destination.get_transient_table() is transient_table
+            finally:
+                event.remove(db.engine, "before_cursor_execute", log_statement)
+            assert statements == []
+
+            # the table is reflected again after a migration
+            db.session.info["alembic_heads"] = ("unknown",)
+            assert destination.get_transient_table() is not transient_table
+            del db.session.info["alembic_heads"]
+
+    def test_get_error_type(self):
+        error_type = db.session.execute(select(ImportUserErrorType).limit(1)).scalar_one()
+        assert get_error_type(error_type.name).pk == error_type.pk
+        with pytest.raises(NoResultFound):
+            get_error_type("NOT_AN_ERROR_TYPE")
+
+    def test_filter_rows_by_line_no(self):
+        rows = ["header", "a", "b", "c", "d"]
+        assert list(filter_rows_by_line_no(rows, [1, 3, 5])) == ["header", "b", "d"]
+        assert list(filter_rows_by_line_no(rows, [])) == []
+        assert list(filter_rows_by_line_no(rows, [2, 8])) == ["a"]
@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 from io import StringIO
 from pathlib import Path
 from functools import partial
@@ -7,6 +8,7 @@ import csv
 
 from geonature.core.imports.checks.errors import ImportCodeError
 import pytest
+import pandas as pd
 from flask import g, url_for, current_app
 from werkzeug.datastructures import Headers
 from werkzeug.exceptions import Unauthorized, Forbidden, BadRequest
@@ -14,6 +16,7 @@ from jsonschema import validate as validate_json
 from sqlalchemy import func
 import sqlalchemy as sa
 from sqlalchemy.sql.expression import select
+from shapely.geometry import Point
 
 from apptax.taxonomie.models import BibListes, Taxref
 from geonature.utils.env import db
@@ -37,8 +40,23 @@ from geonature.core.imports.models import (
     FieldMapping,
     ContentMapping,
     BibFields,
+    Entity,
 )
-from geonature.core.imports.utils import insert_import_data_in_transient_table
+from geonature.core.imports.checks.sql import init_rows_validity
+from geonature.core.imports.checks.dataframe.geometry import to_ewkb
+from geonature.core.imports.checks.dataframe.utils import check_dataframe_batches
+from geonature.core.imports.filestore import get_file_store
+from geonature.core.imports.checks.sql.utils import batch_erroneous_rows, report_erroneous_rows
+from geonature.core.imports import utils as imports_utils
+from geonature.core.imports.utils import (
+    decode_source_file,
+    insert_import_data_in_transient_table,
+    iter_transient_data_in_dataframe,
+    load_transient_data_in_dataframe,
+    sort_column_values,
+    update_transient_data_from_dataframe,
+)
+from geonature.utils.srid import get_local_srid
 
 from .jsonschema_definitions import jsonschema_definitions
 from .utils import assert_import_errors as _assert_import_errors
@@ -96,6 +114,11 @@ def small_batch(monkeypatch):
     monkeypatch.setitem(current_app.config["IMPORT"], "DATAFRAME_BATCH_SIZE", 3)
 
 
+@pytest.fixture(params=[1, 2], ids=["sequential_checks", "parallel_checks"])
+def dataframe_check_workers(request, monkeypatch):
+    monkeypatch.setitem(current_app.config["IMPORT"], "DATAFRAME_CHECK_WORKERS", request.param)
+
+
 @pytest.fixture
 def check_private_jdd(monkeypatch):
     monkeypatch.setitem(current_app.config["IMPORT"], "CHECK_PRIVATE_JDD_BLURING", True)
@@ -576,9 +599,60 @@ class TestImportsSynthese:
             assert r.status_code == 200, r.data
 
         imprt = db.session.get(TImports, r.json["id_import"])
-        assert imprt.source_file is not None
+        assert imprt.source_file_key is not None
+        with imprt.open_source_file() as source_file:
+            assert (
+                source_file.read()
+                == (tests_path / "files" / "synthese" / "simple_file.csv").read_bytes()
+            )
         assert imprt.full_file_name == "simple_file.csv"
 
+    def test_import_source_file_store(self, users, datasets):
+        def upload(file_name, imprt=None):
+            with open(tests_path / "files" / "synthese" / file_name, "rb") as f:
+                data = {
+                    "file": (f, file_name),
+                    "datasetId": datasets["own_dataset"].id_dataset,
+                }
+                headers = Headers({"Content-Type": "multipart/form-data"})
+                if imprt is None:
+                    r = self.client.post(url_for("import.upload_file"), data=data, headers=headers)
+                else:
+                    r = self.client.put(
+                        url_for("import.upload_file", import_id=imprt.id_import),
+                        data=data,
+                        headers=headers,
+                    )
+            assert r.status_code == 200, r.data
+            return db.session.get(TImports, r.json["id_import"])
+
+        file_store = get_file_store()
+        set_logged_user(self.client, users["user"])
+        imprt = upload("simple_file.csv")
+        # same content, the file is shared between both imports
+        other_imprt = upload("simple_file.csv")
+        simple_file_key = imprt.source_file_key
+        assert other_imprt.source_file_key == simple_file_key
+        assert file_store.exists(simple_file_key)
+
+        imprt = upload("utf8_file.csv", imprt)
+        assert imprt.source_file_key != simple_file_key
+        assert file_store.exists(imprt.source_file_key)
+        assert file_store.exists(simple_file_key)  # still used by other_imprt
+
+        other_imprt = upload("utf8_file.csv", other_imprt)
+        assert other_imprt.source_file_key == imprt.source_file_key
+        assert not file_store.exists(simple_file_key)
+
+        set_logged_user(self.client, users["admin_user"])
+        utf8_file_key = imprt.source_file_key
+        r = self.client.delete(url_for("import.delete_import", import_id=imprt.id_import))
+        assert r.status_code == 200, r.data
+        assert file_store.exists(utf8_file_key)  # still used by other_imprt
+        r = self.client.delete(url_for("import.delete_import", import_id=other_imprt.id_import))
+        assert r.status_code == 200, r.data
+        assert not file_store.exists(utf8_file_key)
+
     def test_import_error(self, users, datasets):
         set_logged_user(self.client, users["user"])
         with open(tests_path / "files" / "synthese" / "empty.csv", "rb") as f:
@@ -623,7 +697,7 @@ class TestImportsSynthese:
             )
             assert r.status_code == 200, r.data
         db.session.refresh(imprt)
-        assert imprt.source_file is not None
+        assert imprt.source_file_key is not None
         assert imprt.source_count == None
         assert imprt.loaded == False
         assert imprt.processed == False
@@ -690,6 +764,24 @@ class TestImportsSynthese:
             imprt.source_file = f.read()
         r = self.client.post(url_for("import.decode_file", import_id=imprt.id_import), data=data)
         assert r.status_code == 200, r.data
+        db.session.refresh(imprt)
+        with open(tests_path / "files" / "synthese" / "utf8_file.csv", encoding="utf-8") as f:
+            rows = [row for row in csv.reader(f, delimiter=";") if row]
+        assert imprt.source_count == len(rows) - 1
+        assert set(imprt.columns_values) == set(rows[0])
+        assert imprt.columns_values[rows[0][0]] == sort_column_values(
+            row[0] or None for row in rows[1:]
+        )
+
+    def test_decode_source_file_columns_values(self, monkeypatch):
+        monkeypatch.setattr(imports_utils, "COLUMN_VALUES_SKETCH_SIZE", 2)
+        imprt = TImports(encoding="utf-8", separator=";")
+        imprt.source_file = f"code;comment;id\n2;a;1\n1;{'b' * 200};2\n2;;3\n".encode()
+        columns, row_count, columns_values = decode_source_file(imprt)
+        assert columns == ["code", "comment", "id"]
+        assert row_count == 3
+        # Too long values or too many distinct values are not kept
+        assert columns_values == {"code": ["1", "2"], "comment": None, "id": None}
 
     def test_import_decode_after_preparation(self, users, prepared_import):
         imprt = prepared_import
@@ -749,6 +841,160 @@ class TestImportsSynthese:
         ).scalar()
         assert transient_rows_count == r.json["source_count"]
 
+    def test_iter_transient_data_in_dataframe(self, loaded_import):
+        imprt = loaded_import
+        entity = db.session.execute(
+            select(Entity).where(Entity.destination == imprt.destination)
+        ).scalar_one()
+        with db.session.begin_nested():
+            init_rows_validity(imprt)
+        source_cols = ["src_cd_nom", "nom_cite"]
+        df = load_transient_data_in_dataframe(imprt, entity, source_cols)
+
+        batches = list(iter_transient_data_in_dataframe(imprt, entity, source_cols, 3))
+        assert all(len(batch) <= 3 for batch in batches)
+        assert len(batches) == -(-len(df) // 3)
+        assert pd.concat(batches, ignore_index=True).equals(df)
+
+    def test_update_transient_data_from_dataframe(self, loaded_import):
+        imprt = loaded_import
+        entity = db.session.execute(
+            select(Entity).where(Entity.destination == imprt.destination)
+        ).scalar_one()
+        transient_table = imprt.destination.get_transient_table()
+        line_nos = db.session.scalars(
+            select(transient_table.c.line_no)
+            .where(transient_table.c.id_import == imprt.id_import)
+            .order_by(transient_table.c.line_no)
+            .limit(3)
+        ).all()
+        point = Point(3, 45)
+        geometries = pd.Series([point, None, point])
+        df = pd.DataFrame(
+            {
+                "line_no": line_nos,
+                "the_geom_4326": to_ewkb(geometries, 4326),
+                # given in 4326, reprojected to the local SRID of the column
+                "the_geom_local": to_ewkb(geometries, 4326),
+                # integer column with NULL values, a float column in pandas
+                "count_min": [1, float("nan"), 3],
+                "additional_data": [{"a": 1}, None, {"b": [1, "2"]}],
+                "extra_fields": [{"k": 'v "q"'}, None, {"x": None}],
+            }
+        )
+        update_transient_data_from_dataframe(imprt, entity, set(df.columns) - {"line_no"}, df)
+        # The staging table is created again, with other columns, in the same transaction
+        update_transient_data_from_dataframe(
+            imprt,
+            entity,
+            {"count_max"},
+            pd.DataFrame({"line_no": line_nos, "count_max": [10, 20, None]}),
+        )
+
+        local_srid = get_local_srid()
+        expected_geom_local = func.ST_Transform(func.ST_GeomFromText(point.wkt, 4326), local_srid)
+        rows = db.session.execute(
+            select(
+                transient_table.c.line_no,
+                func.ST_AsText(transient_table.c.the_geom_4326),
+                func.ST_SRID(transient_table.c.the_geom_local),
+                func.ST_HausdorffDistance(transient_table.c.the_geom_local, expected_geom_local)
+                < 1e-6,
+                transient_table.c.count_min,
+                transient_table.c.count_max,
+                transient_table.c.additional_data,
+                transient_table.c.extra_fields,
+            )
+            .where(transient_table.c.id_import == imprt.id_import)
+            .where(transient_table.c.line_no.in_(line_nos))
+            .order_by(transient_table.c.line_no)
+        ).all()
+        assert [tuple(row) for row in rows] == [
+            (line_nos[0], "POINT(3 45)", local_srid, True, 1, 10, {"a": 1}, {"k": 'v "q"'}),
+            (line_nos[1], None, None, None, None, 20, None, None),
+            (line_nos[2], "POINT(3 45)", local_srid, True, 3, None, {"b": [1, "2"]}, {"x": None}),
+        ]
+
+    def test_check_dataframe_batches_database_access(self, monkeypatch, loaded_import):
+        imprt = loaded_import
+        entity = db.session.execute(
+            select(Entity).where(Entity.destination == imprt.destination)
+        ).scalar_one()
+        monkeypatch.setitem(current_app.config["IMPORT"], "DATAFRAME_CHECK_WORKERS", 2)
+
+        def check_batch(df):
+            db.session.execute(select(func.count()).select_from(Entity))
+            return set()
+
+        batches = iter([pd.DataFrame({"line_no": [2, 3]})])
+        with pytest.raises(RuntimeError, match="must not access the database"):
+            list(check_dataframe_batches(imprt, entity, batches, check_batch))
+        # The connection of the calling process, with its uncommitted data, is left untouched
+        transient_table = imprt.destination.get_transient_table()
+        assert db.session.scalar(
+            select(func.count())
+            .select_from(transient_table)
+            .where(transient_table.c.id_import == imprt.id_import)
+        )
+
+    @pytest.mark.parametrize("batch", [False, True])
+    def test_report_erroneous_rows(self, loaded_import, batch):
+        imprt = loaded_import
+        entity = db.session.execute(
+            select(Entity).where(Entity.destination == imprt.destination)
+        ).scalar_one()
+        transient_table = imprt.destination.get_transient_table()
+        line_no = transient_table.c.line_no
+        with db.session.begin_nested():
+            init_rows_validity(imprt)
+        reports = [
+            dict(
+                error_type=ImportCodeError.SKIP_EXISTING_UUID,
+                error_column="unique_id_sinp",
+                whereclause=line_no.in_([3, 4]),
+                level_validity_mapping={"ERROR": False, "WARNING": None},
+            ),
+            # overlap the previous report: the last report wins, rows are erroneous
+            dict(
+                error_type=ImportCodeError.INVALID_DATE,
+                error_column="date_min",
+                whereclause=line_no.in_([2, 3]),
+            ),
+            dict(
+                error_type=ImportCodeError.DATE_MIN_SUP_DATE_MAX,
+                error_column="date_min",
+                whereclause=line_no == 4,
+            ),
+            # no erroneous row, no error reported
+            dict(
+                error_type=ImportCodeError.INVALID_UUID,
+                error_column="unique_id_sinp",
+                whereclause=sa.false(),
+            ),
+        ]
+        with db.session.begin_nested():
+            with batch_erroneous_rows(imprt) if batch else nullcontext():
+                for report in reports:
+                    report_erroneous_rows(imprt, entity, **report)
+
+        # Same result as reports executed one after the other, whether batched or not
+        assert_import_errors(
+            imprt,
+            {
+                (ImportCodeError.INVALID_DATE, "date_min", frozenset([2, 3])),
+                (ImportCodeError.SKIP_EXISTING_UUID, "unique_id_sinp", frozenset([3, 4])),
+                (ImportCodeError.DATE_MIN_SUP_DATE_MAX, "date_min", frozenset([4])),
+            },
+        )
+        validity = dict(
+            db.session.execute(
+                select(line_no, transient_table.c[entity.validity_column])
+                .where(transient_table.c.id_import == imprt.id_import)
+                .where(line_no.in_([2, 3, 4, 5]))
+            ).all()
+        )
+        assert validity == {2: False, 3: False, 4: False, 5: True}
+
     def test_import_values(self, users, loaded_import):
         imprt = loaded_import
 
@@ -835,7 +1081,7 @@ class TestImportsSynthese:
         invalid_rows = reduce(or_, [rows for _, _, rows in valid_file_expected_errors])
         assert len(csvfile.readlines()) == 1 + len(invalid_rows)  # 1 = header
 
-    def test_import_errors(self, users, prepared_import):
+    def test_import_errors(self, users, dataframe_check_workers, prepared_import):
         imprt = prepared_import
 
         r = self.client.get(url_for("import.get_import_errors", import_id=imprt.id_import))
@@ -1135,7 +1381,7 @@ class TestImportsSynthese:
         assert unique_id_sinp != None
 
     @pytest.mark.parametrize("import_file_name", ["dates.csv"])
-    def test_import_dates_file(self, prepared_import):
+    def test_import_dates_file(self, dataframe_check_workers, prepared_import):
         assert_import_errors(
             prepared_import,
             {
@@ -15,6 +15,7 @@ from geonature.core.gn_meta.repositories import (
 )
 from geonature.core.gn_meta.routes import get_af_from_id
 from geonature.core.gn_meta.schemas import DatasetSchema
+from geonature.core.gn_meta.scope_cache import get_allowed_datasets_ids
 from geonature.core.gn_synthese.models import Synthese
 from geonature.utils.env import db
 from pypnusershub.schemas import UserSchema
@@ -645,6 +646,33 @@ class TestGNMeta:
                 datasets.values()
             )
 
+    def test_allowed_datasets_cache(self, app, monkeypatch, datasets, users):
+        monkeypatch.setitem(app.config["PERMISSIONS"], "DATASETS_SCOPE_CACHE_TTL", 60)
+        user = users["stranger_user"]
+        with app.test_request_context(headers=logged_user_headers(user)):
+            app.preprocess_request()
+            ds = datasets["own_dataset"]
+            expected = db.session.scalars(
+                TDatasets.filter_by_scope(1, query=select(TDatasets.id_dataset))
+            ).all()
+            assert get_allowed_datasets_ids(1) == expected
+            assert ds.id_dataset not in get_allowed_datasets_ids(1)
+            # Adding an actor invalidates the cache
+            with db.session.begin_nested():
+                ds.cor_dataset_actor.append(
+                    CorDatasetActor(
+                        role=user,
+                        nomenclature_actor_role=ds.cor_dataset_actor[0].nomenclature_actor_role,
+                    )
+                )
+            assert ds.id_dataset in get_allowed_datasets_ids(1)
+            # Changing the organism of the user invalidates the cache
+            ds = datasets["associate_dataset"]
+            assert ds.id_dataset not in get_allowed_datasets_ids(2, user=user)
+            with db.session.begin_nested():
+                user.id_organisme = users["associate_user"].id_organisme
+            assert ds.id_dataset in get_allowed_datasets_ids(2, user=user)
+
     def test_dataset_is_deletable(self, app, synthese_data, datasets):
         assert (
             datasets["own_dataset"].is_deletable() == False
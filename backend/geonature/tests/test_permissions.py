@@ -1,8 +1,11 @@
 from collections import ChainMap
+import json
+import random
 from datetime import datetime, timedelta
-from itertools import product
+from itertools import combinations, permutations, product
 from copy import deepcopy
 
+from click.testing import CliRunner
 from marshmallow.exceptions import ValidationError
 import pytest
 from flask import g
@@ -19,13 +22,19 @@ from geonature.core.gn_permissions.models import (
 from geonature.core.gn_permissions.tools import (
     get_permissions,
     get_scopes_by_action,
+    get_scopes_by_module_object,
+    get_user_permissions,
     has_any_permissions_by_action,
+    _remove_superseded_permissions,
 )
 from geonature.core.gn_permissions.schemas import PermissionSchema
+from geonature.core.gn_permissions import commands as permissions_commands
+from geonature.core.gn_permissions import models as permissions_models
+from geonature.core.gn_permissions.cache import permissions_cache
 from geonature.utils.env import db
 
 from pypnusershub.db.models import User
-from apptax.taxonomie.models import Taxref
+from apptax.taxonomie.models import Taxref, TaxrefTree
 
 from ref_geo.models import BibAreasTypes, LAreas
 from sqlalchemy import select, null
@@ -318,6 +327,23 @@ class TestPermissions:
         assert_cruved("r1", "001000", module_b, object_a)
         assert_cruved("r1", "000100", module_a, object_b)
 
+    def test_scopes_by_module_object(
+        self, permissions, roles, module_gn, module_a, module_b, object_all, object_a
+    ):
+        permissions("g1", "-123--", module=module_a)
+        permissions("g1_r1", "1-21--", module=module_a)
+        permissions("g1_r1", "-1---1", module=module_a, object=object_a)
+        permissions("g1_r1", "--1---", module=module_b, object=object_a)
+
+        id_role = roles["g1_r1"].id_role
+        scopes = get_scopes_by_module_object(id_role=id_role)
+        for module in (module_gn, module_a, module_b):
+            for obj in (object_all, object_a):
+                assert scopes[(module.module_code, obj.code_object)] == get_scopes_by_action(
+                    id_role=id_role, module_code=module.module_code, object_code=obj.code_object
+                )
+        assert scopes[(module_a.module_code, object_all.code_object)] == cruved_dict("112300")
+
     def test_multiple_scope_with_permissions_available(
         self, permissions, permissions_available, assert_cruved, module_a
     ):
@@ -510,8 +536,190 @@ class TestPermissionsFilters:
         )
 
 
+def remove_superseded_permissions_pairwise(permissions):
+    """
+    Reference implementation comparing every pair of permissions.
+    """
+    permissions = set(permissions)
+    for p1, p2 in permutations(list(permissions), 2):
+        if p1 in permissions and p2 in permissions and p1 <= p2:
+            permissions.remove(p1)
+    return permissions
+
+
+class TestRemoveSupersededPermissions:
+    # Taxonomic tree: 1 > 2 > (3, 4 > 5), 6 > 7
+    taxons = {
+        cd_nom: Taxref(cd_nom=cd_nom, tree=TaxrefTree(cd_nom=cd_nom, path=path))
+        for cd_nom, path in [
+            (1, "1"),
+            (2, "1.2"),
+            (3, "1.2.3"),
+            (4, "1.2.4"),
+            (5, "1.2.4.5"),
+            (6, "6"),
+            (7, "6.7"),
+        ]
+    }
+    areas = [LAreas(id_area=id_area) for id_area in range(1, 5)]
+
+    @staticmethod
+    def equivalent(p1, p2):
+        # A permission filtered on several taxons is not <= itself
+        return (p1 <= p2 and p2 <= p1) or all(
+            (
+                {*getattr(p1, field)} == {*getattr(p2, field)}
+                if isinstance(getattr(p1, field), list)
+                else getattr(p1, field) == getattr(p2, field)
+            )
+            for field in Permission.filters_fields.values()
+        )
+
+    def random_permission(self, rng):
+        return Permission(
+            scope_value=rng.choice([None, 1, 2]),
+            sensitivity_filter=rng.random() < 0.3,
+            areas_filter=rng.sample(self.areas, rng.choice([0, 0, 1, 1, 2, 3])),
+            taxons_filter=rng.sample(list(self.taxons.values()), rng.choice([0, 0, 1, 1, 2])),
+        )
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_remove_superseded_permissions(self, seed):
+        rng = random.Random(seed)
+        permissions = [self.random_permission(rng) for _ in range(rng.randint(1, 40))]
+        # Duplicated permissions, e.g. at user and group levels
+        permissions += [
+            Permission(
+                scope_value=p.scope_value,
+                sensitivity_filter=p.sensitivity_filter,
+                areas_filter=list(p.areas_filter),
+                taxons_filter=list(p.taxons_filter),
+            )
+            for p in rng.sample(permissions, len(permissions) // 4)
+        ]
+
+        remaining = _remove_superseded_permissions(permissions)
+        expected = remove_superseded_permissions_pairwise(permissions)
+
+        assert remaining <= set(permissions)
+        # No remaining permission is superseded by another one, nor is a duplicate
+        assert not any(p1 <= p2 for p1, p2 in permutations(remaining, 2))
+        assert not any(self.equivalent(p1, p2) for p1, p2 in combinations(remaining, 2))
+        # Same permissions as the pairwise elimination, up to equivalent permissions
+        # (e.g. duplicates), of which only one is kept
+        for p1, p2 in [(remaining, expected), (expected, remaining)]:
+            for permission in p1:
+                assert any(self.equivalent(permission, other) for other in p2)
+
+
 @pytest.mark.usefixtures("temporary_transaction")
 class TestPermissionSchema:
+    def test_permissions_cache(
+        self, app, monkeypatch, roles, groups, permissions, assert_cruved, module_a
+    ):
+        monkeypatch.setitem(app.config["PERMISSIONS_CACHE"], "BACKEND", "memory")
+        permissions("r1", "1-----", module=module_a)
+        permissions("g1", "-2----", module=module_a)
+
+        assert_cruved("r1", "100000", module_a)
+        assert permissions_cache.get(roles["r1"].id_role)[1] is not None
+        assert_cruved("r1", "100000", module_a)  # from cache
+
+        # Adding a permission invalidates the cache
+        permissions("r1", "--1---", module=module_a)
+        assert permissions_cache.get(roles["r1"].id_role)[1] is None
+        assert_cruved("r1", "101000", module_a)
+
+        # Adding the role to a group invalidates the cache
+        with db.session.begin_nested():
+            roles["r1"].groups.append(groups["g1"])
+        assert_cruved("r1", "121000", module_a)
+
+    def test_permissions_cache_expiration(
+        self, app, monkeypatch, roles, permissions, assert_cruved, module_a
+    ):
+        monkeypatch.setitem(app.config["PERMISSIONS_CACHE"], "BACKEND", "memory")
+        permissions("r1", "1-----", module=module_a)
+        permissions("r1", "-1----", module=module_a, expire_on=datetime.now() + timedelta(days=1))
+        assert_cruved("r1", "110000", module_a)
+        assert permissions_cache.get(roles["r1"].id_role)[1] is not None
+
+        class later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.now(tz) + timedelta(days=2)
+
+        # Permissions which expired since they were cached are dropped
+        monkeypatch.setattr(permissions_models, "datetime", later)
+        assert_cruved("r1", "100000", module_a)
+
+    def test_invalidate_cache_command(self, app, monkeypatch):
+        bumps = []
+        monkeypatch.setattr(
+            permissions_commands, "bump_permissions_version", lambda: bumps.append(True)
+        )
+        monkeypatch.setitem(app.config["PERMISSIONS_CACHE"], "BACKEND", "memory")
+        result = CliRunner().invoke(permissions_commands.invalidate_cache)
+        assert result.exit_code == 0
+        assert bumps == []
+        monkeypatch.setitem(app.config["PERMISSIONS_CACHE"], "BACKEND", "redis")
+        result = CliRunner().invoke(permissions_commands.invalidate_cache)
+        assert result.exit_code == 0
+        assert bumps == [True]
+
+    def test_permissions_cache_round_trip(self, app, monkeypatch, roles, permissions, module_a):
+        monkeypatch.setitem(app.config["PERMISSIONS_CACHE"], "BACKEND", "memory")
+        grenoble = db.session.execute(
+            sa.select(LAreas).where(
+                LAreas.area_type.has(BibAreasTypes.type_code == "COM"),
+                LAreas.area_name == "Grenoble",
+            )
+        ).scalar_one()
+        animalia = db.session.execute(sa.select(Taxref).where(Taxref.cd_nom == 183716)).scalar_one()
+        permissions("r1", "12----", module=module_a, areas_filter=[grenoble])
+        permissions("r1", "--1---", module=module_a, taxons_filter=[animalia])
+        permissions("r1", "---2--", module=module_a, sensitivity_filter=True)
+
+        def signature(permissions):
+            return {
+                (
+                    p.id_permission,
+                    p.module.module_code,
+                    p.object.code_object,
+                    p.action.code_action,
+                    p.scope_value,
+                    p.sensitivity_filter,
+                    frozenset(a.id_area for a in p.areas_filter),
+                    frozenset((t.cd_nom, t.cd_ref, t.tree.path) for t in p.taxons_filter),
+                )
+                for p in permissions
+            }
+
+        id_role = roles["r1"].id_role
+        expected = signature(get_user_permissions(id_role))
+        # Only plain values are cached, not ORM objects nor geometries
+        _, cached = permissions_cache.get(id_role)
+        assert json.loads(json.dumps(cached)) == cached
+
+        statements = []
+
+        def log_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.expire(grenoble)
+        sa.event.listen(db.engine, "before_cursor_execute", log_statement)
+        try:
+            permissions = get_user_permissions(id_role)
+            assert signature(permissions) == expected
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", log_statement)
+        assert statements == []
+        # Cached objects are merged into the session, other attributes are loaded on access
+        area = next(area for p in permissions for area in p.areas_filter)
+        assert area is grenoble
+        assert area.area_name == "Grenoble"
+        assert area.geom is not None
+
     def test_permission_schema(self, roles, actions, module_a):
         gap = db.session.execute(
             sa.select(LAreas).where(
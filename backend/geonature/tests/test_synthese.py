@@ -1,4 +1,5 @@
-from io import StringIO
+import json
+from io import BytesIO, StringIO
 import sys
 import csv
 import datetime
@@ -9,6 +10,9 @@ import pytest
 from flask import url_for, current_app
 import sqlalchemy as sa
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
 from sqlalchemy import func, select
 from werkzeug.exceptions import Forbidden, BadRequest, Unauthorized
 from jsonschema import validate as validate_json
@@ -24,6 +28,7 @@ from geonature.utils.config import config
 from geonature.core.gn_permissions.tools import get_permissions
 from geonature.core.gn_synthese.utils.blurring import split_blurring_precise_permissions
 from geonature.core.gn_synthese.schemas import SyntheseSchema
+from geonature.core.gn_synthese.utils import exports as exports_utils
 from geonature.core.gn_synthese.utils.query_select_sqla import remove_accents
 from geonature.core.sensitivity.models import cor_sensitivity_area_type
 from geonature.core.gn_meta.models import TDatasets
@@ -501,6 +506,32 @@ class TestSynthese:
         assert len(features) == 2
         assert Counter([len(f["properties"]["observations"]) for f in features]) == Counter([1, 2])
 
+    @pytest.mark.parametrize("output_format", ["ungrouped_geom", "grouped_geom"])
+    @pytest.mark.parametrize(
+        "mode",
+        [
+            {"stream": "true"},
+            {"assemble_in_db": "true"},
+            {"stream": "true", "assemble_in_db": "true"},
+        ],
+    )
+    def test_get_observations_for_web_stream(self, users, synthese_data, output_format, mode):
+        set_logged_user(self.client, users["admin_user"])
+        url = url_for("gn_synthese.synthese.get_observations_for_web")
+        filters = {"id_dataset": [synthese_data["p1_af1"].id_dataset]}
+        response = self.client.post(url, query_string={"format": output_format}, json=filters)
+        assert response.status_code == 200, response.text
+        streamed_response = self.client.post(
+            url, query_string={"format": output_format, **mode}, json=filters
+        )
+        assert streamed_response.status_code == 200, streamed_response.text
+        features = response.get_json()["features"]
+        streamed_features = streamed_response.get_json()["features"]
+        assert len(streamed_features) == len(features)
+        assert Counter(json.dumps(f["geometry"]) for f in streamed_features) == Counter(
+            json.dumps(f["geometry"]) for f in features
+        )
+
     def test_filter_cor_observers(self, users, synthese_data):
         """
         Test avec un cruved R2 qui join sur cor_synthese_observers
@@ -566,6 +597,127 @@ class TestSynthese:
         )
         assert response.status_code == 200
 
+    @pytest.mark.parametrize("export_format", ["csv", "geojson", "shapefile"])
+    def test_export_job(
+        self, app, users, synthese_data, celery_eager, monkeypatch, tmp_path, export_format
+    ):
+        monkeypatch.setitem(app.config, "MEDIA_FOLDER", str(tmp_path))
+        id_list = [obs.id_synthese for obs in synthese_data.values()]
+
+        set_logged_user(self.client, users["self_user"])
+        response = self.client.post(
+            url_for("gn_synthese.exports.create_export_job"),
+            json=id_list,
+            query_string={"export_format": export_format},
+        )
+        assert response.status_code == 202, response.json
+        id_export = response.json["id_export"]
+
+        response = self.client.get(
+            url_for("gn_synthese.exports.get_export_job_status", id_export=id_export)
+        )
+        assert response.status_code == 200
+        assert response.json["status"] == "done"
+        assert response.json["nb_observations"] > 0
+
+        response = self.client.get(
+            url_for("gn_synthese.exports.download_export_job", id_export=id_export)
+        )
+        assert response.status_code == 200
+        if export_format == "csv":
+            rows = list(csv.DictReader(StringIO(response.data.decode()), delimiter=";"))
+            assert {int(row["id_synthese"]) for row in rows} <= set(id_list)
+        elif export_format == "geojson":
+            assert len(response.json["features"]) == len(
+                {feature["properties"]["id_synthese"] for feature in response.json["features"]}
+            )
+
+        # Only the author of an export can access it
+        set_logged_user(self.client, users["admin_user"])
+        response = self.client.get(
+            url_for("gn_synthese.exports.download_export_job", id_export=id_export)
+        )
+        assert response.status_code == Forbidden.code
+
+    def test_export_observations_parquet(self, app, users, synthese_data, monkeypatch):
+        monkeypatch.setitem(app.config["SYNTHESE"], "EXPORT_FORMAT", ["parquet"])
+        id_list = [obs.id_synthese for obs in synthese_data.values()]
+
+        set_logged_user(self.client, users["self_user"])
+        response = self.client.post(
+            url_for("gn_synthese.exports.export_observations_web"),
+            json=id_list,
+            query_string={"export_format": "parquet"},
+        )
+        assert response.status_code == 200
+
+        table = pq.read_table(BytesIO(response.data))
+        geo_metadata = json.loads(table.schema.metadata[b"geo"])
+        assert geo_metadata["primary_column"] == "geometry"
+        assert pa.types.is_int64(table.schema.field("id_synthese").type)
+        ids = table.column("id_synthese").to_pylist()
+        assert len(ids) == len(set(ids))
+        assert set(ids) <= set(id_list)
+        geometries = shapely.from_wkb(table.column("geometry").to_pylist())
+        expected = {obs.id_synthese: to_shape(obs.the_geom_4326) for obs in synthese_data.values()}
+        for id_synthese, geometry in zip(ids, geometries):
+            assert_geometries_equal(geometry, expected[id_synthese], tolerance=1e-6)
+
+    def test_export_observations_changes(self, users, synthese_data, monkeypatch):
+        monkeypatch.setattr(exports_utils, "SYNC_MARGIN", datetime.timedelta(0))
+        observations = list(synthese_data.values())
+        deleted = observations.pop()
+        with db.session.begin_nested():
+            db.session.delete(deleted)
+        since = db.session.scalar(select(func.localtimestamp())) - datetime.timedelta(seconds=1)
+
+        set_logged_user(self.client, users["admin_user"])
+        response = self.client.get(
+            url_for("gn_synthese.exports.export_observations_changes"),
+            query_string={"since": since.isoformat()},
+        )
+        assert response.status_code == 200
+        rows = list(csv.DictReader(StringIO(response.data.decode()), delimiter=";"))
+        actions = {int(row["id_synthese"]): row["last_action"] for row in rows}
+        assert all(actions[obs.id_synthese] in ("I", "U") for obs in observations)
+        assert actions[deleted.id_synthese] == "D"
+        sync_token = response.headers["X-Sync-Token"]
+
+        # Nothing changed since the previous export
+        response = self.client.get(
+            url_for("gn_synthese.exports.export_observations_changes"),
+            query_string={"sync_token": sync_token},
+        )
+        assert response.status_code == 200
+        rows = list(csv.DictReader(StringIO(response.data.decode()), delimiter=";"))
+        assert rows == []
+        assert response.headers["X-Sync-Token"] == sync_token
+
+        response = self.client.get(
+            url_for("gn_synthese.exports.export_observations_changes"),
+            query_string={"sync_token": "invalid"},
+        )
+        assert response.status_code == BadRequest.code
+
+    def test_export_observations_changes_deletions_scope(self, users, synthese_data, monkeypatch):
+        monkeypatch.setattr(exports_utils, "SYNC_MARGIN", datetime.timedelta(0))
+        deleted = synthese_data["obs1"]
+        with db.session.begin_nested():
+            db.session.delete(deleted)
+        since = db.session.scalar(select(func.localtimestamp())) - datetime.timedelta(seconds=1)
+
+        # The dataset of deleted observations is not logged, a user with a restricted
+        # export scope does not receive deletions
+        set_logged_user(self.client, users["self_user"])
+        response = self.client.get(
+            url_for("gn_synthese.exports.export_observations_changes"),
+            query_string={"since": since.isoformat()},
+        )
+        assert response.status_code == 200
+        rows = list(csv.DictReader(StringIO(response.data.decode()), delimiter=";"))
+        assert all(row["last_action"] != "D" for row in rows)
+        assert deleted.id_synthese not in {int(row["id_synthese"]) for row in rows}
+
     @pytest.mark.parametrize(
         "view_name,response_status_code",
         [
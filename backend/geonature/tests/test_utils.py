@@ -1,4 +1,5 @@
 import tempfile
+from unittest.mock import patch
 
 import pytest
 import sqlalchemy as sa
@@ -10,6 +11,10 @@ from geonature.utils.env import db
 from geonature.utils.config_schema import GnPySchemaConf
 from geonature.utils.utilstoml import *
 from geonature.utils.errors import GeoNatureError, ConfigError
+from geonature.utils import srid
+from geonature.utils.srid import get_srid, get_local_srid, clear_srid_cache
+from geonature.utils import utilscsv
+from geonature.utils.utilscsv import generate_csv_chunks
 from jsonschema import validate
 from json import loads
 
@@ -166,3 +171,37 @@ class TestJSONProvider:
         g.pagination_schema = ModuleSchema()
         json_data = app.json.dumps(db.paginate(query))
         validate(loads(json_data), pagination_schema)
+
+
+@pytest.mark.usefixtures("temporary_transaction")
+class TestSRID:
+    def test_get_srid(self):
+        clear_srid_cache()
+        local_srid = db.session.scalar(sa.select(sa.func.Find_SRID("ref_geo", "l_areas", "geom")))
+        assert get_local_srid() == local_srid
+        assert srid._srids == {("ref_geo", "l_areas", "geom"): local_srid}
+        with patch.object(db.session, "scalar") as scalar:
+            assert get_srid("ref_geo", "l_areas", "geom") == local_srid
+        scalar.assert_not_called()
+        clear_srid_cache()
+        assert srid._srids == {}
+
+    def test_get_srid_not_found(self):
+        clear_srid_cache()
+        with patch.object(db.session, "scalar", return_value=None):
+            assert get_srid("ref_geo", "l_areas", "geom") is None
+        # A missing SRID is not cached
+        assert srid._srids == {}
+        assert get_srid("ref_geo", "l_areas", "geom") is not None
+
+
+class TestCSV:
+    def test_generate_csv_chunks(self, monkeypatch):
+        monkeypatch.setattr(utilscsv, "CSV_CHUNK_SIZE", 20)
+        rows = ({"a": i, "b": f"b;{i}", "c": "ignored"} for i in range(10))
+        chunks = list(generate_csv_chunks(rows, ["a", "b"]))
+        assert len(chunks) > 1
+        lines = "".join(chunks).split("\r\n")
+        assert lines[0] == '"a";"b"'
+        assert lines[1:-1] == [f'"{i}";"b;{i}"' for i in range(10)]
+        assert lines[-1] == ""
@@ -5,7 +5,7 @@ from flask import url_for
 from werkzeug.exceptions import Unauthorized, BadRequest
 
 from geonature.core.gn_synthese.models import Synthese
-from geonature.core.gn_commons.models import TValidations, VLatestValidations
+from geonature.core.gn_commons.models import TValidations, TLastValidations, VLatestValidations
 from geonature.core.gn_profiles.models import VConsistancyData
 from geonature.utils.env import db
 from geonature.utils.config import config
@@ -63,6 +63,75 @@ class TestValidation:
         assert response.status_code == 200
         assert len(response.json["features"]) >= len(synthese_data)
 
+    @pytest.mark.parametrize("sort", ["asc", "desc"])
+    def test_get_synthese_data_cursor(self, users, synthese_data, sort):
+        set_logged_user(self.client, users["self_user"])
+        url = url_for("validation.get_synthese_data")
+        params = {"format": "json", "per_page": 2, "sort": sort}
+
+        # Keyset pagination must return the same items as offset pagination
+        offset_ids, cursor_ids = [], []
+        cursor = None
+        for page in range(1, 4):
+            response = self.client.get(url, query_string={**params, "page": page})
+            assert response.status_code == 200, response.json
+            offset_ids += [item["id_synthese"] for item in response.json["items"]]
+            cursor_params = {**params, "cursor": cursor} if cursor else {**params, "page": 1}
+            response = self.client.get(url, query_string=cursor_params)
+            assert response.status_code == 200, response.json
+            cursor_ids += [item["id_synthese"] for item in response.json["items"]]
+            cursor = response.json["cursor"]
+            if cursor is None:
+                break
+        assert cursor_ids == offset_ids
+
+        response = self.client.get(url, query_string={**params, "page": 1, "count": "estimate"})
+        assert response.status_code == 200, response.json
+        assert response.json["total_is_estimate"]
+        assert isinstance(response.json["total"], int)
+
+        response = self.client.get(url, query_string={**params, "cursor": "invalid"})
+        assert response.status_code == BadRequest.code
+
+    def test_last_validations(self, users, synthese_data):
+        uuid = synthese_data["obs1"].unique_id_sinp
+        id_nomenclature_valid_status = db.session.scalar(
+            sa.select(TNomenclatures.id_nomenclature).where(
+                TNomenclatures.cd_nomenclature == "1",
+                TNomenclatures.nomenclature_type.has(mnemonique="STATUT_VALID"),
+            )
+        )
+
+        def get_last_validation():
+            db.session.expire_all()
+            return db.session.get(TLastValidations, uuid)
+
+        with db.session.begin_nested():
+            old, new = (
+                TValidations(
+                    uuid_attached_row=uuid,
+                    id_nomenclature_valid_status=id_nomenclature_valid_status,
+                    validation_date=datetime.now() + timedelta(days=days),
+                )
+                for days in (1, 2)
+            )
+            db.session.add_all([new, old])
+        assert get_last_validation().id_validation == new.id_validation
+
+        with db.session.begin_nested():
+            db.session.delete(new)
+        assert get_last_validation().id_validation == old.id_validation
+
+        with db.session.begin_nested():
+            db.session.delete(old)
+        assert get_last_validation() is None
+
+        # Rebuilding the whole table gives the same result as incremental updates
+        query = sa.select(TLastValidations.uuid_attached_row, TLastValidations.id_validation)
+        last_validations = set(db.session.execute(query).all())
+        db.session.execute(sa.func.gn_commons.fct_refresh_last_validations())
+        assert set(db.session.execute(query).all()) == last_validations
+
     def test_get_status_names(self, users, synthese_data):
         response = self.client.get(url_for("validation.get_statusNames"))
         assert response.status_code == Unauthorized.code
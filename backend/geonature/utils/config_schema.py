@@ -158,6 +158,17 @@ class MetadataConfig(Schema):
     ENABLE_UUID_EDITION_FIELD = fields.Boolean(load_default=False)
 
 
+class PermissionsCacheConfig(Schema):
+    # None (désactivé), "memory" (cache propre à chaque processus) ou "redis" (cache partagé)
+    BACKEND = fields.String(load_default=None, allow_none=True, validate=OneOf(["memory", "redis"]))
+    # Durée de vie (en secondes) des permissions en cache
+    TTL = fields.Integer(load_default=300)
+    # Nombre maximal d'utilisateurs dont les permissions sont gardées en mémoire (backend "memory")
+    SIZE = fields.Integer(load_default=1000)
+    # URL du serveur Redis, par défaut celle du broker Celery
+    REDIS_URL = fields.String(load_default=None, allow_none=True)
+
+
 class AuthenticationConfig(Schema):
     PROVIDERS = fields.List(
         fields.Dict(),
@@ -219,6 +230,9 @@ class GnPySchemaConf(Schema):
     SERVER = fields.Nested(ServerConfig, load_default=ServerConfig().load({}))
     MEDIAS = fields.Nested(MediasConfig, load_default=MediasConfig().load({}))
     ALEMBIC = fields.Nested(AlembicConfig, load_default=AlembicConfig().load({}))
+    PERMISSIONS_CACHE = fields.Nested(
+        PermissionsCacheConfig, load_default=PermissionsCacheConfig().load({})
+    )
     AUTHENTICATION = fields.Nested(
         AuthenticationConfig, load_default=AuthenticationConfig().load({}), unknown=INCLUDE
     )
@@ -383,10 +397,12 @@ class Synthese(Schema):
     EXPORT_GEOJSON_LOCAL_COL = fields.String(load_default="geojson_local")
     EXPORT_METADATA_ID_DATASET_COL = fields.String(load_default="jdd_id")
     EXPORT_METADATA_ACTOR_COL = fields.String(load_default="acteurs")
-    # Formats d'export disponibles ["csv", "geojson", "shapefile", "gpkg"]
+    # Formats d'export disponibles ["csv", "geojson", "shapefile", "gpkg", "parquet"]
     EXPORT_FORMAT = fields.List(fields.String(), load_default=["csv", "geojson", "shapefile"])
     # Nombre max d'observation dans les exports
     NB_MAX_OBS_EXPORT = fields.Integer(load_default=50000)
+    # Durée de conservation (en jours) des fichiers des exports asynchrones
+    EXPORT_JOBS_RETENTION = fields.Integer(load_default=7)
 
     # --------------------------------------------------------------------
     # SYNTHESE - OBSERVATION DETAILS
@@ -469,6 +485,9 @@ class Synthese(Schema):
 
 class PermissionConfig(Schema):
     GEOGRAPHIC_FILTER_AREA_TYPES = fields.List(fields.String(), load_default=["COM", "DEP", "REG"])
+    # Durée (en secondes) de mise en cache des jeux de données accessibles par utilisateur et portée
+    # (0 : désactivé)
+    DATASETS_SCOPE_CACHE_TTL = fields.Integer(load_default=0)
 
 
 # Map configuration
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 import sys
 
@@ -154,15 +155,20 @@ def module_db_upgrade(module_dist, directory=None, sql=False, tag=None, x_arg=[]
     return True
 
 
+@lru_cache(maxsize=None)
+def get_modules_versions():
+    """
+    Get the versions of the installed modules, by module code.
+    As installing a module requires to restart GeoNature, it is computed once per process.
+    """
+    return {dist.entry_points["code"].load(): dist.version for dist in iter_modules_dist()}
+
+
 def get_module_version(module_code: str):
     """
     Get the module version from the module_code. We check what python package is installed.
     If no package is found, we return None.
     """
-    try:
-        if module_code:
-            dist = get_dist_from_code(module_code)
-            return dist.version
-    except PackageNotFoundError:
-        return None
+    if module_code:
+        return get_modules_versions().get(module_code)
     return None
@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Instead of skipping the rows of the previous pages with an OFFSET, keyset
+pagination filters out the rows which are sorted before the last row of the
+previous page. The client receives this last row sort key as an opaque cursor.
+"""
+
+import base64
+import json
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from werkzeug.exceptions import BadRequest
+
+from geonature.utils.env import db
+
+
+def encode_cursor(*values):
+    """
+    Encode values (sort key of the last row of a page) as an opaque string.
+    Values that are not JSON serializable (dates, uuid…) are stringified.
+    """
+    data = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor built with encode_cursor, raise BadRequest if it is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+    if not isinstance(values, list):
+        raise BadRequest("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_column, id_column, value, id_value, descending=False):
+    """
+    Return the condition selecting rows sorted after (value, id_value) when ordering by
+    (sort_column, id_column), both in the same direction.
+    As PostgreSQL sorts NULLs as greater than any value, they come last when sorting in
+    ascending order and first when sorting in descending order.
+    """
+    if descending:
+        if value is None:
+            return sa.or_(
+                sa.and_(sort_column.is_(None), id_column < id_value),
+                sort_column.isnot(None),
+            )
+        return sa.or_(
+            sort_column < value,
+            sa.and_(sort_column == value, id_column < id_value),
+        )
+    else:
+        if value is None:
+            return sa.and_(sort_column.is_(None), id_column > id_value)
+        return sa.or_(
+            sort_column > value,
+            sa.and_(sort_column == value, id_column > id_value),
+            sort_column.is_(None),
+        )
+
+
+class explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_count(query):
+    """
+    Return the number of rows returned by the query as estimated by the PostgreSQL planner.
+    Much faster than an exact count on large tables, its accuracy depends on statistics.
+    """
+    plan = db.session.execute(explain(query.order_by(None))).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
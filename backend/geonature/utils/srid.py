@@ -0,0 +1,55 @@
+"""
+Process-wide registry of the SRID of geometry columns.
+
+The SRID of a geometry column never changes at runtime: it is queried once
+per process with ``Find_SRID`` then kept in memory.
+"""
+
+import sqlalchemy as sa
+
+from geonature.utils.env import db
+
+# SRID of geometry columns, by (schema, table, column)
+_srids = {}
+
+
+def get_srid(schema: str, table: str, column: str) -> int:
+    """
+    Return the SRID of the geometry column ``schema.table.column``.
+
+    Parameters
+    ----------
+    schema : str
+        schema of the table
+    table : str
+        name of the table
+    column : str
+        name of the geometry column
+
+    Returns
+    -------
+    int
+        SRID of the column, None if it is not found
+    """
+    key = (schema, table, column)
+    srid = _srids.get(key)
+    if srid is None:
+        srid = db.session.scalar(sa.select(sa.func.Find_SRID(schema, table, column)))
+        # A missing column may be created later, it is looked up again next time
+        if srid is not None:
+            _srids[key] = srid
+    return srid
+
+
+def get_local_srid() -> int:
+    """
+    Return the local SRID, i.e. the SRID of ``ref_geo.l_areas.geom``.
+    """
+    return get_srid("ref_geo", "l_areas", "geom")
+
+
+def clear_srid_cache():
+    """
+    Forget every SRID resolved by the current process.
+    """
+    _srids.clear()
@@ -0,0 +1,59 @@
+"""
+Écriture de fichiers CSV par morceaux, pour exporter de gros volumes de données
+sans les charger entièrement en mémoire
+"""
+
+import csv
+from io import StringIO
+
+from flask import current_app, stream_with_context
+from werkzeug.datastructures import Headers
+
+# Taille (en caractères) à partir de laquelle le tampon est envoyé au client
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def generate_csv_chunks(rows, columns, separator=";"):
+    """
+    Génère le contenu d'un fichier CSV par morceaux
+
+    Les lignes sont écrites dans un même tampon, vidé à chaque fois qu'il
+    dépasse CSV_CHUNK_SIZE : la mémoire utilisée ne dépend pas du nombre de lignes.
+
+    :param rows: lignes à écrire, chacune sous forme de dictionnaire (ou de mapping)
+    :type rows: iterable
+    :param columns: colonnes du fichier, les autres clés des lignes sont ignorées
+    :type columns: list
+    :param separator: séparateur des colonnes
+    :type separator: str
+    """
+    buffer = StringIO()
+    writer = csv.DictWriter(
+        buffer, columns, delimiter=separator, quoting=csv.QUOTE_ALL, extrasaction="ignore"
+    )
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_csv_resp(filename, rows, columns, separator=";"):
+    """
+    Réponse renvoyant un fichier CSV écrit au fur et à mesure de sa lecture
+
+    Même réponse que utils_flask_sqla.response.to_csv_resp, mais les lignes
+    (idéalement lues par lots depuis un curseur côté serveur, voir
+    geonature.utils.utilsgeometrytools.EXPORT_STREAM_OPTIONS) ne sont lues
+    qu'au moment de leur envoi : le téléchargement démarre immédiatement.
+    """
+    headers = Headers()
+    headers.add("Content-Type", "text/plain")
+    headers.add("Content-Disposition", "attachment", filename="export_%s.csv" % filename)
+    return current_app.response_class(
+        stream_with_context(generate_csv_chunks(rows, columns, separator)),
+        headers=headers,
+    )
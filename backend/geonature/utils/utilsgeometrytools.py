@@ -3,20 +3,31 @@ Fonctions permettant de manipuler de façon génériques
 les fonctions de flask_sqla_geo
 """
 
+import shutil
+import tempfile
 from pathlib import Path
 
-from flask import current_app
+from flask import current_app, send_from_directory
 
 from geonature.utils import filemanager
 
+# Nombre de lignes récupérées à la fois depuis un curseur côté serveur lors des exports
+EXPORT_BATCH_SIZE = 5000
+EXPORT_STREAM_OPTIONS = {"stream_results": True, "yield_per": EXPORT_BATCH_SIZE}
 
-def export_as_geo_file(export_format, export_view, db_cols, geojson_col, data, file_name):
+
+def export_as_geo_file(
+    export_format, export_view, db_cols, geojson_col, data, file_name, dir_path=None
+):
     """Fonction générant un fixhier export au format shp ou gpkg
 
     .. :quickref: Utils;
 
     Fonction générant un fixhier export au format shp ou gpkg
 
+    Chaque export est écrit dans son propre répertoire, pour que des exports simultanés
+    ne se gênent pas. Ce répertoire doit être supprimé une fois le fichier envoyé
+    (voir send_geo_file).
 
     :param export_format: format d'export
     :type export_format: str() gpkg ou shapefile
@@ -30,26 +41,34 @@ def export_as_geo_file(export_format, export_view, db_cols, geojson_col, data, f
     :param geojson_col: Nom de la colonne contenant le geojson
     :type geojson_col: str
 
-    :param data: Résulats
-    :type data: list
+    :param data: Résulats, idéalement lus par lots depuis un curseur côté serveur
+        (voir EXPORT_STREAM_OPTIONS)
+    :type data: iterable
 
     :param file_name: Résulats
     :type file_name: str
 
+    :param dir_path: Répertoire où écrire le fichier, par défaut un nouveau répertoire
+        temporaire dans le dossier des exports du format
+    :type dir_path: str
+
     :returns: Répertoire où sont stockées les données et nom du fichier avec son extension
     """
     if export_format == "gpkg":
         geo_format = "gpkg"
-        dir_path = Path(current_app.config["MEDIA_FOLDER"]) / "geopackages"
+        base_dir_path = Path(current_app.config["MEDIA_FOLDER"]) / "geopackages"
         dwn_extension = "gpkg"
     elif export_format == "shapefile":
         geo_format = "shp"
-        dir_path = Path(current_app.config["MEDIA_FOLDER"]) / "shapefiles"
+        base_dir_path = Path(current_app.config["MEDIA_FOLDER"]) / "shapefiles"
         dwn_extension = "zip"
-    dir_path.mkdir(parents=True, exist_ok=True)
+    if dir_path is None:
+        base_dir_path.mkdir(parents=True, exist_ok=True)
+        # Remove exports directories left behind (e.g. by a worker crash)
+        filemanager.delete_recursively(base_dir_path, excluded_files=[".gitkeep"])
+        dir_path = tempfile.mkdtemp(prefix="export_", dir=base_dir_path)
     dir_path = str(dir_path)
 
-    filemanager.delete_recursively(dir_path, excluded_files=[".gitkeep"])
     export_view.as_geofile(
         export_format=geo_format,
         db_cols=db_cols,
@@ -59,3 +78,13 @@ def export_as_geo_file(export_format, export_view, db_cols, geojson_col, data, f
         file_name=file_name,
     )
     return dir_path, file_name + "." + dwn_extension
+
+
+def send_geo_file(dir_path, file_name):
+    """
+    Envoie un fichier généré par export_as_geo_file et supprime son répertoire
+    une fois la réponse envoyée.
+    """
+    response = send_from_directory(dir_path, file_name, as_attachment=True)
+    response.call_on_close(lambda: shutil.rmtree(dir_path, ignore_errors=True))
+    return response
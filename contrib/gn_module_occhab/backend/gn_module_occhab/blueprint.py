@@ -10,7 +10,6 @@ from flask import (
     Blueprint,
     current_app,
     session,
-    send_from_directory,
     request,
     render_template,
     jsonify,
@@ -26,11 +25,10 @@ from sqlalchemy.orm import raiseload, joinedload
 
 
 from pypnnomenclature.models import TNomenclatures
-from utils_flask_sqla.response import json_resp, to_csv_resp, to_json_resp
+from utils_flask_sqla.response import json_resp, to_json_resp
 from utils_flask_sqla_geo.utilsgeometry import remove_third_dimension
 from utils_flask_sqla_geo.utils import geojsonify
 from utils_flask_sqla_geo.generic import GenericTableGeo
-from ref_geo.utils import get_local_srid
 
 from geonature.core.gn_permissions import decorators as permissions
 from geonature.core.gn_permissions.decorators import login_required
@@ -39,7 +37,13 @@ from geonature.core.gn_meta.models import TDatasets as Dataset
 from geonature.utils.env import db
 from geonature.utils.errors import GeonatureApiError
 from geonature.utils import filemanager
-from geonature.utils.utilsgeometrytools import export_as_geo_file
+from geonature.utils.srid import get_local_srid
+from geonature.utils.utilscsv import stream_csv_resp
+from geonature.utils.utilsgeometrytools import (
+    EXPORT_STREAM_OPTIONS,
+    export_as_geo_file,
+    send_geo_file,
+)
 
 from .module import OcchabModule
 from .models import (
@@ -248,7 +252,7 @@ def export_all_habitats(
         schemaName="pr_occhab",
         engine=db.engine,
         geometry_field="geom_local",
-        srid=get_local_srid(db.session),
+        srid=get_local_srid(),
     )
 
     file_name = datetime.datetime.now().strftime("%Y_%m_%d_%Hh%Mm%S")
@@ -263,11 +267,14 @@ def export_all_habitats(
     results = db.session.execute(
         select(export_view.tableDef)
         .where(export_view.tableDef.columns.id_station.in_(data["idsStation"]))
-        .limit(blueprint.config["NB_MAX_EXPORT"])
-    ).all()
+        .limit(blueprint.config["NB_MAX_EXPORT"]),
+        execution_options=EXPORT_STREAM_OPTIONS,
+    )
     if export_format == "csv":
-        formated_data = [export_view.as_dict(d, fields=[]) for d in results]
-        return to_csv_resp(file_name, formated_data, separator=";", columns=columns_to_serialize)
+        formated_data = (export_view.as_dict(d, fields=[]) for d in results)
+        return stream_csv_resp(
+            file_name, formated_data, separator=";", columns=columns_to_serialize
+        )
     elif export_format == "geojson":
         features = []
         for r in results:
@@ -287,7 +294,7 @@ def export_all_habitats(
             data=results,
             file_name=file_name,
         )
-        return send_from_directory(dir_name, file_name, as_attachment=True)
+        return send_geo_file(dir_name, file_name)
 
 
 @blueprint.route("/defaultNomenclatures", methods=["GET"])
@@ -22,7 +22,7 @@ from .plot import distribution_plot
 
 from geonature.core.imports.utils import (
     get_mapping_data,
-    load_transient_data_in_dataframe,
+    iter_transient_data_in_dataframe,
     update_transient_data_from_dataframe,
     compute_bounding_box,
 )
@@ -133,14 +133,14 @@ class OcchabImportActions(ImportActions):
         _, entity_habitat = get_occhab_entities()
         fields, selected_fields, source_cols = get_mapping_data(imprt, entity_habitat)
 
-        updated_cols = set()
-
         ### Dataframe checks
-        df = load_transient_data_in_dataframe(imprt, entity_habitat, source_cols)
-        updated_cols |= OcchabImportActions.dataframe_checks(
-            imprt, df, entity_habitat, fields, selected_fields
-        )
-        update_transient_data_from_dataframe(imprt, entity_habitat, updated_cols, df)
+        batch_size = current_app.config["IMPORT"]["DATAFRAME_BATCH_SIZE"]
+        for df in iter_transient_data_in_dataframe(imprt, entity_habitat, source_cols, batch_size):
+            updated_cols = set()
+            updated_cols |= OcchabImportActions.dataframe_checks(
+                imprt, df, entity_habitat, fields, selected_fields
+            )
+            update_transient_data_from_dataframe(imprt, entity_habitat, updated_cols, df)
 
     @staticmethod
     def check_habitat_sql(imprt):
@@ -272,37 +272,37 @@ class OcchabImportActions(ImportActions):
 
         fields, selected_fields, source_cols = get_mapping_data(imprt, entity_station)
 
-        # Save column names where the data was changed in the dataframe
-        updated_cols = set()
-
         ### Dataframe checks
-        df = load_transient_data_in_dataframe(imprt, entity_station, source_cols)
+        batch_size = current_app.config["IMPORT"]["DATAFRAME_BATCH_SIZE"]
+        for df in iter_transient_data_in_dataframe(imprt, entity_station, source_cols, batch_size):
+            # Save column names where the data was changed in the dataframe
+            updated_cols = set()
 
-        updated_cols |= OcchabImportActions.dataframe_checks(
-            imprt, df, entity_station, fields, selected_fields
-        )
-        updated_cols |= check_datasets(
-            imprt,
-            entity_station,
-            df,
-            uuid_field=fields["unique_dataset_id"],
-            id_field=fields["id_dataset"],
-            module_code="OCCHAB",
-        )
+            updated_cols |= OcchabImportActions.dataframe_checks(
+                imprt, df, entity_station, fields, selected_fields
+            )
+            updated_cols |= check_datasets(
+                imprt,
+                entity_station,
+                df,
+                uuid_field=fields["unique_dataset_id"],
+                id_field=fields["id_dataset"],
+                module_code="OCCHAB",
+            )
 
-        updated_cols |= check_geometry(
-            imprt,
-            entity_station,
-            df,
-            file_srid=imprt.srid,
-            geom_4326_field=fields["geom_4326"],
-            geom_local_field=fields["geom_local"],
-            wkt_field=fields["WKT"],
-            latitude_field=fields["latitude"],
-            longitude_field=fields["longitude"],
-        )
+            updated_cols |= check_geometry(
+                imprt,
+                entity_station,
+                df,
+                file_srid=imprt.srid,
+                geom_4326_field=fields["geom_4326"],
+                geom_local_field=fields["geom_local"],
+                wkt_field=fields["WKT"],
+                latitude_field=fields["latitude"],
+                longitude_field=fields["longitude"],
+            )
 
-        update_transient_data_from_dataframe(imprt, entity_station, updated_cols, df)
+            update_transient_data_from_dataframe(imprt, entity_station, updated_cols, df)
 
     @staticmethod
     def check_station_sql(imprt):
@@ -12,6 +12,12 @@ from marshmallow import ValidationError
 from pypnnomenclature.models import TNomenclatures, BibNomenclaturesTypes
 
 from geonature.utils.env import DB, db
+from geonature.utils.pagination import (
+    decode_cursor,
+    encode_cursor,
+    estimate_count,
+    keyset_filter,
+)
 from geonature.core.gn_synthese.models import Synthese, TReport
 from geonature.core.gn_profiles.models import VConsistancyData
 from geonature.core.gn_synthese.utils.query_select_sqla import SyntheseQuery
@@ -20,7 +26,7 @@ from geonature.core.gn_commons.schemas import TValidationSchema
 from geonature.core.gn_commons.models.base import TValidations
 
 from werkzeug.exceptions import BadRequest
-from geonature.core.gn_commons.models import TValidations
+from geonature.core.gn_commons.models import TValidations, TLastValidations
 from geonature.core.notifications.utils import dispatch_notifications
 import gn_module_validation.tasks
 
@@ -68,6 +74,9 @@ def get_synthese_data(permissions):
     :query str order_by: champs sur lequel appliquer le tri de données (optionnel. lié à 'sort')
     :query int page: numéro de page (optionnel, lié à 'per_page')
     :query int per_page: nombre d'élément par page (optionnel, lié à 'page')
+    :query str cursor: curseur de la page suivante renvoyé par la page précédente, à utiliser
+        à la place de 'page' (optionnel, lié à 'per_page', 'sort' et 'order_by')
+    :query str count: str<'exact', 'estimate'> calcul exact ou estimé du nombre total d'éléments
     :query str format: str<'json', 'geojson'> format de la sortie
     Returns
     -------
@@ -80,12 +89,15 @@ def get_synthese_data(permissions):
 
     # Sorting parameter
     sort = params.get("sort", "desc")
-    order_by = sa.text(request.args.get("order_by", "last_validation.validation_date", str))
-    sorting_active = sort != "" and order_by != ""
+    order_by_as_str = request.args.get("order_by", "last_validation.validation_date", str)
+    order_by = sa.text(order_by_as_str)
+    sorting_active = sort != "" and order_by_as_str != ""
     # Pagination parameter
     page = int(params.get("page", 0))
     per_page = int(params.get("per_page", 0))
-    pagination_active = page > 0 and per_page > 0
+    cursor = params.pop("cursor", None)
+    count_mode = params.pop("count", "exact")
+    pagination_active = (page > 0 or cursor is not None) and per_page > 0
     limit = params.pop("limit", blueprint.config["NB_MAX_OBS_MAP"])
 
     # Profile parameters
@@ -104,6 +116,9 @@ def get_synthese_data(permissions):
     if format not in ["json", "geojson"]:
         raise BadRequest("Invalid format parameter")
 
+    if count_mode not in ["exact", "estimate"]:
+        raise BadRequest("Invalid count parameter")
+
     # Check pagination is active for json
     if format == "json" and not pagination_active:
         raise BadRequest("Pagination must be active when requesting json object")
@@ -136,15 +151,7 @@ def get_synthese_data(permissions):
     and given to contains_eager at step 3 to correctly identify columns
     to use to populate relationships models.
     """
-    last_validation_subquery = (
-        sa.select(TValidations)
-        .where(TValidations.uuid_attached_row == Synthese.unique_id_sinp)
-        .order_by(TValidations.validation_date.desc())
-        .limit(1)
-        .subquery()
-        .lateral("last_validation")
-    )
-    last_validation = aliased(TValidations, last_validation_subquery)
+    last_validation = aliased(TValidations, name="last_validation")
     lateral_join = {last_validation: Synthese.last_validation}
 
     if enable_profile and use_profile_filter:
@@ -179,8 +186,14 @@ def get_synthese_data(permissions):
     for rel, alias in zip(relationships, aliases):
         query = query.outerjoin(rel.of_type(alias))
 
+    # Last validations are maintained in t_last_validations, no need for a lateral subquery
+    query = query.outerjoin(
+        TLastValidations, TLastValidations.uuid_attached_row == Synthese.unique_id_sinp
+    ).outerjoin(last_validation, last_validation.id_validation == TLastValidations.id_validation)
+
     for alias in lateral_join.keys():
-        query = query.outerjoin(alias, sa.true())
+        if alias is not last_validation:
+            query = query.outerjoin(alias, sa.true())
 
     if format == "geojson":
         query = query.where(Synthese.the_geom_4326.isnot(None)).order_by(Synthese.date_min.desc())
@@ -237,14 +250,47 @@ def get_synthese_data(permissions):
         )
     query = selectable
 
+    # Columns allowed as keyset pagination sort key, the id_synthese breaking ties
+    sortable_entities = {"synthese": Synthese, "last_validation": last_validation}
+    if enable_profile and use_profile_filter:
+        sortable_entities["profile"] = profile
+    sort_path = order_by_as_str.split(".")
+    if len(sort_path) == 1:
+        sort_path.insert(0, "synthese")
+    sort_column = None
+    if len(sort_path) == 2 and sort_path[0] in sortable_entities:
+        entity = sortable_entities[sort_path[0]]
+        if sort_path[1] in sa.inspect(entity).mapper.columns:
+            sort_column = getattr(entity, sort_path[1])
+            order_by = sort_column
+    keyset_active = sorting_active and sort_column is not None
+    descending = sort != "asc"
+
     # Sort
     if sorting_active:
         if sort == "asc":
             query = query.order_by(sa.asc(order_by))
         else:
             query = query.order_by(sa.desc(order_by))
+        if keyset_active:
+            query = query.order_by(
+                sa.desc(Synthese.id_synthese) if descending else sa.asc(Synthese.id_synthese)
+            )
 
-    if pagination_active:
+    if cursor is not None:
+        if not keyset_active:
+            raise BadRequest("Cursor pagination requires sorting on a column")
+        cursor_values = decode_cursor(cursor)
+        if len(cursor_values) != 4:
+            raise BadRequest("Invalid cursor")
+        cursor_order_by, cursor_sort, value, id_synthese = cursor_values
+        if cursor_order_by != order_by_as_str or cursor_sort != sort:
+            raise BadRequest("Cursor does not match sorting parameters")
+        query = query.where(
+            keyset_filter(sort_column, Synthese.id_synthese, value, id_synthese, descending)
+        )
+        query = syntheseQueryStatement.from_statement(query.limit(per_page))
+    elif pagination_active:
         offset = (page - 1) * per_page
         query = syntheseQueryStatement.from_statement(query.limit(per_page).offset(offset))
     else:
@@ -254,13 +300,28 @@ def get_synthese_data(permissions):
     if format == "geojson":
         return jsonify(query.as_geofeaturecollection(fields=fields))
     elif format == "json":
-        count = db.session.scalar(selectable.with_only_columns([sa.func.count()]).order_by(None))
+        if count_mode == "estimate":
+            count = estimate_count(selectable)
+        else:
+            count = db.session.scalar(
+                selectable.with_only_columns([sa.func.count()]).order_by(None)
+            )
+        items = query.all()
+        next_cursor = None
+        if keyset_active and len(items) == per_page:
+            # Sort key of the last item, read through the loaded relationships
+            value = items[-1]
+            for attr in sort_path[1:] if sort_path[0] == "synthese" else sort_path:
+                value = getattr(value, attr) if value is not None else None
+            next_cursor = encode_cursor(order_by_as_str, sort, value, items[-1].id_synthese)
         return jsonify(
             {
-                "items": [item.as_dict(fields=fields) for item in query.all()],
+                "items": [item.as_dict(fields=fields) for item in items],
                 "total": count,
+                "total_is_estimate": count_mode == "estimate",
                 "per_page": per_page,
                 "page": page,
+                "cursor": next_cursor,
             }
         )
 
@@ -6,7 +6,6 @@ from flask import (
     request,
     current_app,
     session,
-    send_from_directory,
     render_template,
     jsonify,
     g,
@@ -41,7 +40,12 @@ from .repositories import (
 from .schemas import OccurrenceSchema, ReleveCruvedSchema, ReleveSchema
 from .utils import as_dict_with_add_cols
 from geonature.utils.errors import GeonatureApiError
-from geonature.utils.utilsgeometrytools import export_as_geo_file
+from geonature.utils.utilscsv import stream_csv_resp
+from geonature.utils.utilsgeometrytools import (
+    EXPORT_STREAM_OPTIONS,
+    export_as_geo_file,
+    send_geo_file,
+)
 
 from geonature.core.users.models import UserRigth
 from geonature.core.gn_permissions import decorators as permissions
@@ -50,7 +54,7 @@ from geonature.core.gn_permissions.tools import get_scopes_by_action
 from pypnusershub.db.models import User, Organisme
 from utils_flask_sqla_geo.generic import GenericTableGeo
 from utils_flask_sqla_geo.utilsgeometry import remove_third_dimension
-from utils_flask_sqla.response import to_csv_resp, to_json_resp, json_resp
+from utils_flask_sqla.response import to_json_resp, json_resp
 
 from occtax.commands import add_submodule_permissions
 
@@ -607,7 +611,7 @@ def export(scope):
     if current_app.config["OCCTAX"]["ADD_MEDIA_IN_EXPORT"]:
         q, columns = releve_repository.add_media_in_export(q, columns)
 
-    data = db.session.execute(q)
+    data = db.session.execute(q, execution_options=EXPORT_STREAM_OPTIONS)
 
     print(data)
 
@@ -640,15 +644,15 @@ def export(scope):
         columns = columns + additional_col_names
         columns.append(export_col_name_additional_data)
         if additional_col_names:
-            serialize_result = [
+            serialize_result = (
                 as_dict_with_add_cols(
                     export_view, row, export_col_name_additional_data, additional_col_names
                 )
                 for row in data
-            ]
+            )
         else:
-            serialize_result = [export_view.as_dict(row) for row in data]
-        return to_csv_resp(file_name, serialize_result, columns, ";")
+            serialize_result = (export_view.as_dict(row) for row in data)
+        return stream_csv_resp(file_name, serialize_result, columns, ";")
     elif export_format == "geojson":
         if additional_col_names:
             features = []
@@ -679,6 +683,4 @@ def export(scope):
             data=data,
             file_name=file_name,
         )
-        db_cols = [db_col for db_col in export_view.db_cols if db_col.key in export_columns]
-
-        return send_from_directory(dir_name, file_name, as_attachment=True)
+        return send_geo_file(dir_name, file_name)